@@ -0,0 +1,286 @@
+"""Running enrollment and finance aggregates for the admin analytics page
+
+Analytics listens to EnrollmentSystem and updates its totals as each change
+happens: seats filled per course, instructor and weekly hour, enrollments
+and drops per day, fees charged and paid, and enrollments refused because
+the course was full. A report reads these totals and never walks the
+students or their transactions, so it costs the same for any number of
+students.
+"""
+import datetime
+import heapq
+import threading
+
+from models import COURSE_FULL, EPOCH
+from schedule import parse_schedule
+
+ENROLLMENT_FEE = "Enrollment fee for "
+SECONDS_PER_DAY = 86400
+DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Days of history and courses per list a report shows by default
+REPORT_DAYS = 30
+REPORT_COURSES = 10
+
+
+class Fill:
+    """Seats taken and offered by a group of courses"""
+    __slots__ = ('courses', 'enrolled', 'capacity', 'refused')
+    
+    def __init__(self):
+        self.courses = 0
+        self.enrolled = 0
+        self.capacity = 0
+        # Enrollments refused because a course was full
+        self.refused = 0
+    
+    def add(self, courses, enrolled, capacity):
+        self.courses += courses
+        self.enrolled += enrolled
+        self.capacity += capacity
+    
+    @property
+    def ratio(self):
+        return self.enrolled / self.capacity if self.capacity else 0.0
+    
+    def to_dict(self):
+        return {'courses': self.courses, 'enrolled': self.enrolled, 'capacity': self.capacity,
+                'fill': round(self.ratio, 4), 'refused_full': self.refused}
+
+
+class _CourseEntry:
+    """What a course last contributed to the totals"""
+    __slots__ = ('course', 'hours', 'enrolled', 'fill')
+    
+    def __init__(self, course, hours):
+        self.course = course
+        # Weekly hours the course meets in, counted from Monday 00:00
+        self.hours = hours
+        self.enrolled = 0
+        self.fill = Fill()
+
+
+def meeting_hours(schedule):
+    """Return the weekly hours, 0 to 167, in which a schedule meets"""
+    hours = set()
+    for start, end in parse_schedule(schedule):
+        hours.update(range(start // 60, (end - 1) // 60 + 1))
+    return tuple(sorted(hour % (7 * 24) for hour in hours))
+
+
+def day_number(timestamp):
+    return timestamp // SECONDS_PER_DAY
+
+
+def day_date(day):
+    return (EPOCH + datetime.timedelta(days=day)).strftime('%Y-%m-%d')
+
+
+class Analytics:
+    """Aggregates kept current by EnrollmentSystem events
+    
+    Every change moves only the totals of the course it touched, so its cost
+    does not grow with the school. Enrollments per day are counted from
+    enrollment fee charges, which also covers enrollments loaded from
+    history and made by other processes; drops and refused enrollments are
+    counted from the moment the process subscribes.
+    
+    Usage: enrollment_system.subscribe(analytics.record_event)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._courses = {}
+        self.total = Fill()
+        self.instructors = {}
+        # Weekly hour -> Fill of the courses meeting in it
+        self.hours = {}
+        # Day number -> [enrollments, drops, charged, paid]
+        self.days = {}
+        self.charged = 0.0
+        self.paid = 0.0
+        self.refused = {'full': 0, 'conflict': 0, 'other': 0}
+        self.waitlist_joins = 0
+    
+    @classmethod
+    def build(cls, enrollment_system, transactions=None):
+        """Build the totals for the system's current courses and history
+        
+        Args:
+            enrollment_system (EnrollmentSystem): Source of courses
+            transactions (iterable, optional): (student, Transaction) pairs;
+                defaults to walking each student's transaction list
+        """
+        if transactions is None:
+            transactions = ((student, transaction)
+                            for student in enrollment_system.students.values()
+                            for transaction in student.transactions)
+        
+        analytics = cls()
+        for course in list(enrollment_system.courses.values()):
+            analytics._track(course)
+        for student in list(enrollment_system.students.values()):
+            analytics.charged += student.archived_charged
+            analytics.paid += student.archived_paid
+        for _, transaction in transactions:
+            analytics._add_transaction(transaction)
+        return analytics
+    
+    def _groups(self, entry):
+        # Every Fill a course counts towards
+        groups = [self.total, self.instructors.setdefault(entry.course.instructor, Fill())]
+        groups += [self.hours.setdefault(hour, Fill()) for hour in entry.hours]
+        return groups
+    
+    def _track(self, course):
+        if course.course_id in self._courses:
+            self._untrack(course.course_id)
+        entry = self._courses[course.course_id] = _CourseEntry(course, meeting_hours(course.schedule))
+        entry.enrolled = len(course.enrolled_students)
+        entry.fill.add(1, entry.enrolled, course.capacity)
+        for group in self._groups(entry):
+            group.add(1, entry.enrolled, course.capacity)
+    
+    def _untrack(self, course_id):
+        entry = self._courses.pop(course_id, None)
+        if entry is None:
+            return
+        for group in self._groups(entry):
+            group.add(-1, -entry.enrolled, -entry.course.capacity)
+            group.refused -= entry.fill.refused
+        if not self.instructors[entry.course.instructor].courses:
+            del self.instructors[entry.course.instructor]
+        for hour in entry.hours:
+            if not self.hours[hour].courses:
+                del self.hours[hour]
+    
+    def _refresh(self, course):
+        # Called with the course's lock held, so its roster is stable
+        entry = self._courses.get(course.course_id)
+        if entry is None or entry.course is not course:
+            self._track(course)
+            return
+        change = len(course.enrolled_students) - entry.enrolled
+        if change:
+            entry.enrolled += change
+            entry.fill.add(0, change, 0)
+            for group in self._groups(entry):
+                group.add(0, change, 0)
+    
+    def _day(self, timestamp):
+        day = day_number(timestamp)
+        counts = self.days.get(day)
+        if counts is None:
+            counts = self.days[day] = [0, 0, 0.0, 0.0]
+        return counts
+    
+    def _add_transaction(self, transaction):
+        counts = self._day(transaction.timestamp)
+        if transaction.type == "charge":
+            self.charged += transaction.amount
+            counts[2] += transaction.amount
+            if transaction.description.startswith(ENROLLMENT_FEE):
+                counts[0] += 1
+        elif transaction.type == "payment":
+            self.paid += transaction.amount
+            counts[3] += transaction.amount
+    
+    def _refuse(self, course, reason):
+        if reason == COURSE_FULL:
+            self.refused['full'] += 1
+            entry = self._courses.get(course.course_id)
+            if entry is not None:
+                entry.fill.refused += 1
+                for group in self._groups(entry):
+                    group.refused += 1
+        elif reason.startswith("schedule conflicts"):
+            self.refused['conflict'] += 1
+        else:
+            self.refused['other'] += 1
+    
+    def record_event(self, event, **details):
+        """EnrollmentSystem listener that updates the totals"""
+        if event == 'batch':
+            for name, event_details in details['events']:
+                self.record_event(name, **event_details)
+            return
+        if event == 'reload':
+            self._reload(details['system'], details['transactions']())
+            return
+        with self._lock:
+            if event == 'add_course':
+                self._track(details['course'])
+            elif event == 'remove_course':
+                self._untrack(details['course'].course_id)
+            elif event in ('enroll', 'drop', 'restore_enrollment'):
+                self._refresh(details['course'])
+                if event == 'drop' or (event == 'restore_enrollment' and not details['enrolled']):
+                    self._day(int((datetime.datetime.now() - EPOCH).total_seconds()))[1] += 1
+            elif event == 'enroll_refused':
+                self._refuse(details['course'], details['reason'])
+            elif event == 'waitlist_join':
+                self.waitlist_joins += 1
+            if details.get('transaction') is not None:
+                self._add_transaction(details['transaction'])
+    
+    def _reload(self, enrollment_system, transactions):
+        fresh = Analytics.build(enrollment_system, transactions)
+        with self._lock:
+            # Drops, refusals and waitlist joins are only counted as they
+            # happen, so they carry over
+            for day, counts in self.days.items():
+                if counts[1]:
+                    fresh._day(day * SECONDS_PER_DAY)[1] += counts[1]
+            for name in ('_courses', 'total', 'instructors', 'hours', 'days', 'charged', 'paid'):
+                setattr(self, name, getattr(fresh, name))
+    
+    def report(self, now=None, days=REPORT_DAYS, limit=REPORT_COURSES):
+        """Return every aggregate as JSON-ready data
+        
+        Args:
+            now (int, optional): Transaction timestamp of today; defaults to
+                the current time
+            days (int): Days of enrollment velocity to include, up to today
+            limit (int): Courses in each of the fullest and most refused lists
+        
+        Returns:
+            dict: 'totals', 'finance', 'instructors', 'fullest_courses',
+                'most_refused_courses', 'heatmap' and 'velocity'
+        """
+        if now is None:
+            now = int((datetime.datetime.now() - EPOCH).total_seconds())
+        today = day_number(now)
+        with self._lock:
+            entries = list(self._courses.values())
+            fills = [(entry.course, entry.fill.to_dict()) for entry in entries]
+            instructors = {name: fill.to_dict() for name, fill in self.instructors.items()}
+            hours = {hour: fill.to_dict() for hour, fill in self.hours.items()}
+            velocity = [[day_date(day)] + list(self.days.get(day, (0, 0, 0.0, 0.0)))
+                        for day in range(today - days + 1, today + 1)]
+            totals = dict(self.total.to_dict(), refused=dict(self.refused), waitlist_joins=self.waitlist_joins)
+            charged, paid = self.charged, self.paid
+        
+        def course_row(course, fill):
+            return dict(fill, course_id=course.course_id, name=course.name, instructor=course.instructor)
+        
+        fullest = heapq.nlargest(limit, fills, key=lambda item: (item[1]['fill'], item[1]['enrolled']))
+        refused = heapq.nlargest(limit, (item for item in fills if item[1]['refused_full']),
+                                 key=lambda item: item[1]['refused_full'])
+        
+        # Rows Monday to Sunday, columns the hours any course meets in
+        day_hours = sorted({hour % 24 for hour in hours})
+        heatmap = {'hours': day_hours,
+                   'days': [{'day': name, 'cells': [hours.get(day * 24 + hour) for hour in day_hours]}
+                            for day, name in enumerate(DAY_NAMES)]}
+        return {
+            'totals': totals,
+            'finance': {'charged': charged, 'paid': paid, 'outstanding': charged - paid,
+                        'collected': round(paid / charged, 4) if charged else 0.0},
+            'instructors': [dict(fill, instructor=name) for name, fill in sorted(instructors.items())],
+            'fullest_courses': [course_row(course, fill) for course, fill in fullest],
+            'most_refused_courses': [course_row(course, fill) for course, fill in refused],
+            'heatmap': heatmap,
+            'velocity': [{'date': date, 'enrollments': enrollments, 'drops': drops,
+                          'charged': day_charged, 'paid': day_paid}
+                         for date, enrollments, drops, day_charged, day_paid in velocity],
+        }
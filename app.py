@@ -1,371 +1,881 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import os
-from datetime import datetime
-
-# Data models
-class Course:
-    def __init__(self, course_id, name, instructor, schedule, capacity):
-        self.course_id = course_id
-        self.name = name
-        self.instructor = instructor
-        self.schedule = schedule
-        self.capacity = capacity
-        self.enrolled_students = []
-        
-    def is_full(self):
-        return len(self.enrolled_students) >= self.capacity
-    
-    def enroll_student(self, student):
-        if not self.is_full() and student not in self.enrolled_students:
-            self.enrolled_students.append(student)
-            return True
-        return False
-    
-    def drop_student(self, student):
-        if student in self.enrolled_students:
-            self.enrolled_students.remove(student)
-            return True
-        return False
-    
-    def get_available_seats(self):
-        return self.capacity - len(self.enrolled_students)
-
-
-class Student:
-    def __init__(self, student_id, name, grade_level, password):
-        self.student_id = student_id
-        self.name = name
-        self.grade_level = grade_level
-        self.password = password  # In production, this should be hashed
-        self.enrolled_courses = []
-    
-    def enroll(self, course):
-        if course not in self.enrolled_courses and course.enroll_student(self):
-            self.enrolled_courses.append(course)
-            return True
-        return False
-    
-    def drop(self, course):
-        if course in self.enrolled_courses and course.drop_student(self):
-            self.enrolled_courses.remove(course)
-            return True
-        return False
-
-
-class EnrollmentSystem:
-    def __init__(self):
-        self.courses = {}
-        self.students = {}
-        self.admins = {}  # Basic admin accounts
-    
-    def add_course(self, course):
-        self.courses[course.course_id] = course
-    
-    def remove_course(self, course_id):
-        if course_id in self.courses:
-            course = self.courses[course_id]
-            # Automatically drop all students from this course
-            for student in course.enrolled_students[:]:
-                student.drop(course)
-            del self.courses[course_id]
-            return True
-        return False
-    
-    def add_student(self, student):
-        self.students[student.student_id] = student
-    
-    def add_admin(self, admin_id, name, password):
-        self.admins[admin_id] = {"name": name, "password": password}
-    
-    def get_course(self, course_id):
-        return self.courses.get(course_id)
-    
-    def get_student(self, student_id):
-        return self.students.get(student_id)
-    
-    def verify_admin(self, admin_id, password):
-        admin = self.admins.get(admin_id)
-        if admin and admin["password"] == password:
-            return True
-        return False
-    
-    def list_all_courses(self):
-        return list(self.courses.values())
-    
-    def list_all_students(self):
-        return list(self.students.values())
-
-
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import os
-from datetime import datetime
-from models import Course, Student, EnrollmentSystem
-from data_persistence import save_data, load_data
-
-# Initialize the system
-enrollment_system = EnrollmentSystem()
-
-# Try to load data, if it fails, initialize with default data
-if not load_data(enrollment_system):
-    print("No existing data found or error loading data. Initializing with default data.")
-    
-    # Add some courses
-    enrollment_system.add_course(Course("CS101", "Introduction to Programming", "Jomar Leano", "MWF 9:00-10:30", 30))
-    enrollment_system.add_course(Course("BIO201", "Biology I", "Stephanie Mores", "TTh 10:30-12:00", 25))
-    enrollment_system.add_course(Course("ENG101", "English Composition", "Vince Fernandez", "MWF 13:00-14:30", 35))
-    enrollment_system.add_course(Course("PHYS101", "Physics I", "Marylou Bacordio", "TTh 14:00-15:30", 20))
-    enrollment_system.add_course(Course("CHEM101", "Chemistry I", "Remar Bacula", "MWF 15:00-16:30", 40))
-
-    # Add some students
-    enrollment_system.add_student(Student("S1001", "Marlon Pabroa", 12, "pass123"))
-    enrollment_system.add_student(Student("S1002", "Jackine Geoca", 12, "pass123"))
-    enrollment_system.add_student(Student("S1003", "Ryle Cabanilla", 12, "pass123"))
-    enrollment_system.add_student(Student("S1004", "Xyrill Mensoro", 12, "pass123"))
-    enrollment_system.add_student(Student("S1005", "Norvy Daclan", 12, "pass123"))
-    
-    # Add an admin
-    enrollment_system.add_admin("admin", "Administrator", "admin123")
-    
-    # Save the initial data
-    save_data(enrollment_system)
-else:
-    print("Data loaded successfully.")
-
-# Flask application
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
-
-# Routes
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        user_id = request.form['user_id']
-        password = request.form['password']
-        user_type = request.form['user_type']
-        
-        if user_type == 'student':
-            student = enrollment_system.get_student(user_id)
-            if student and student.password == password:
-                session['user_id'] = user_id
-                session['user_type'] = 'student'
-                session['name'] = student.name
-                flash('Login successful!', 'success')
-                return redirect(url_for('student_dashboard'))
-        
-        elif user_type == 'admin':
-            if enrollment_system.verify_admin(user_id, password):
-                session['user_id'] = user_id
-                session['user_type'] = 'admin'
-                session['name'] = enrollment_system.admins[user_id]['name']
-                flash('Admin login successful!', 'success')
-                return redirect(url_for('admin_dashboard'))
-        
-        flash('Invalid credentials!', 'danger')
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
-
-@app.route('/student/dashboard')
-def student_dashboard():
-    if 'user_id' not in session or session['user_type'] != 'student':
-        flash('Please login first!', 'warning')
-        return redirect(url_for('login'))
-    
-    student = enrollment_system.get_student(session['user_id'])
-    all_courses = enrollment_system.list_all_courses()
-    return render_template('student_dashboard.html', student=student, all_courses=all_courses)
-
-@app.route('/student/enroll/<course_id>')
-def enroll_course(course_id):
-    if 'user_id' not in session or session['user_type'] != 'student':
-        flash('Please login first!', 'warning')
-        return redirect(url_for('login'))
-    
-    student = enrollment_system.get_student(session['user_id'])
-    course = enrollment_system.get_course(course_id)
-    
-    if course and student.enroll(course):
-        flash(f'Successfully enrolled in {course.name}!', 'success')
-        save_data(enrollment_system)  # Save data after enrollment
-    else:
-        flash('Enrollment failed. Course might be full or you are already enrolled.', 'danger')
-    
-    return redirect(url_for('student_dashboard'))
-
-@app.route('/student/drop/<course_id>')
-def drop_course(course_id):
-    if 'user_id' not in session or session['user_type'] != 'student':
-        flash('Please login first!', 'warning')
-        return redirect(url_for('login'))
-    
-    student = enrollment_system.get_student(session['user_id'])
-    course = enrollment_system.get_course(course_id)
-    
-    if course and student.drop(course):
-        flash(f'Successfully dropped {course.name}.', 'success')
-        save_data(enrollment_system)  # Save data after dropping
-    else:
-        flash('Drop failed. You might not be enrolled in this course.', 'danger')
-    
-    return redirect(url_for('student_dashboard'))
-
-@app.route('/admin/dashboard')
-def admin_dashboard():
-    if 'user_id' not in session or session['user_type'] != 'admin':
-        flash('Admin access required!', 'warning')
-        return redirect(url_for('login'))
-    
-    return render_template('admin_dashboard.html', 
-                          courses=enrollment_system.list_all_courses(),
-                          students=enrollment_system.list_all_students())
-
-@app.route('/admin/course/add', methods=['GET', 'POST'])
-def add_course():
-    if 'user_id' not in session or session['user_type'] != 'admin':
-        flash('Admin access required!', 'warning')
-        return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        course_id = request.form['course_id']
-        name = request.form['name']
-        instructor = request.form['instructor']
-        schedule = request.form['schedule']
-        capacity = int(request.form['capacity'])
-        
-        # Check if course ID already exists
-        if enrollment_system.get_course(course_id):
-            flash('Course ID already exists!', 'danger')
-        else:
-            new_course = Course(course_id, name, instructor, schedule, capacity)
-            enrollment_system.add_course(new_course)
-            flash('Course added successfully!', 'success')
-            save_data(enrollment_system)  # Save data after adding course
-            return redirect(url_for('admin_dashboard'))
-    
-    return render_template('add_course.html')
-
-@app.route('/admin/course/remove/<course_id>')
-def remove_course(course_id):
-    if 'user_id' not in session or session['user_type'] != 'admin':
-        flash('Admin access required!', 'warning')
-        return redirect(url_for('login'))
-    
-    if enrollment_system.remove_course(course_id):
-        flash('Course removed successfully!', 'success')
-        save_data(enrollment_system)  # Save data after removing course
-    else:
-        flash('Failed to remove course.', 'danger')
-    
-    return redirect(url_for('admin_dashboard'))
-
-@app.route('/admin/student/add', methods=['GET', 'POST'])
-def add_student():
-    if 'user_id' not in session or session['user_type'] != 'admin':
-        flash('Admin access required!', 'warning')
-        return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        student_id = request.form['student_id']
-        name = request.form['name']
-        grade_level = int(request.form['grade_level'])
-        password = request.form['password']
-        
-        # Check if student ID already exists
-        if enrollment_system.get_student(student_id):
-            flash('Student ID already exists!', 'danger')
-        else:
-            new_student = Student(student_id, name, grade_level, password)
-            enrollment_system.add_student(new_student)
-            flash('Student added successfully!', 'success')
-            save_data(enrollment_system)  # Save data after adding student
-            return redirect(url_for('admin_dashboard'))
-    
-    return render_template('add_student.html')
-
-@app.route('/admin/course/<course_id>/roster')
-def view_course_roster(course_id):
-    if 'user_id' not in session or session['user_type'] != 'admin':
-        flash('Admin access required!', 'warning')
-        return redirect(url_for('login'))
-    
-    course = enrollment_system.get_course(course_id)
-    if course:
-        return render_template('course_roster.html', course=course)
-    else:
-        flash('Course not found!', 'danger')
-        return redirect(url_for('admin_dashboard'))
-    
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        student_id = request.form['student_id']
-        name = request.form['name']
-        grade_level = int(request.form['grade_level'])
-        password = request.form['password']
-        confirm_password = request.form['confirm_password']
-        
-        # Validate input
-        errors = []
-        
-        # Check if ID already exists
-        if enrollment_system.get_student(student_id):
-            errors.append('Student ID already exists!')
-        
-        # Check if passwords match
-        if password != confirm_password:
-            errors.append('Passwords do not match!')
-        
-        # If there are no errors, create the new student
-        if not errors:
-            new_student = Student(student_id, name, grade_level, password)
-            enrollment_system.add_student(new_student)
-            flash('Registration successful! Please login.', 'success')
-            save_data(enrollment_system)  # Save data after registration
-            return redirect(url_for('login'))
-        
-        # If there are errors, show them
-        for error in errors:
-            flash(error, 'danger')
-    
-    return render_template('register.html')
-
-@app.route('/student/finances')
-def student_finances():
-    if 'user_id' not in session or session['user_type'] != 'student':
-        flash('Please login first!', 'warning')
-        return redirect(url_for('login'))
-    
-    student = enrollment_system.get_student(session['user_id'])
-    return render_template('student_finances.html', student=student)
-
-@app.route('/student/make_payment', methods=['POST'])
-def make_payment():
-    if 'user_id' not in session or session['user_type'] != 'student':
-        flash('Please login first!', 'warning')
-        return redirect(url_for('login'))
-    
-    amount = float(request.form['amount'])
-    payment_method = request.form['payment_method']
-    
-    student = enrollment_system.get_student(session['user_id'])
-    if student.make_payment(amount, payment_method):
-        flash(f'Payment of {amount} pesos successful!', 'success')
-        save_data(enrollment_system)  # Save data after payment
-    else:
-        flash('Payment failed. Please check the amount.', 'danger')
-    
-    return redirect(url_for('student_finances'))
-
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5051)
+"""Flask front end of the enrollment system
+
+create_app(config) builds the application. The data is loaded once per
+process, so importing this module does no work, and every app created in
+the process for the same data directory shares it. Run the development
+server with `python app.py`, or under a pre-forking server with the state
+loaded before the workers fork, so they share its pages copy-on-write.
+Several workers need SHARED mode, where they keep one SQLite database as
+the authority and catch up with each other's changes before every request
+and every change:
+    gunicorn --preload -w 8 'app:create_app({"PRELOAD": True, "SHARED": True, "STORAGE": "sqlite"})'
+For many mostly idle connections, serve the ASGI front end in asgi.py.
+"""
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, g
+from flask import before_render_template, template_rendered, current_app, get_template_attribute, make_response
+from werkzeug.local import LocalProxy
+import os
+from datetime import datetime
+import atexit
+import csv
+import gc
+import hashlib
+import io
+import shutil
+import tempfile
+import threading
+import time
+import metrics
+from analytics import Analytics, REPORT_COURSES, REPORT_DAYS
+from archive import ARCHIVE_DIR, LedgerArchive, archive_cutoff
+from auth import PasswordHasher, RateLimiter
+from batch_import import detect_format, open_binary
+from fragments import FragmentCache
+from models import Course, Student, EnrollmentSystem, EPOCH
+from replica import REPORTS, ReportWorker
+from storage import AsyncWriter, get_storage
+
+# The columnar finance ledger is optional and needs NumPy
+try:
+    from ledger import Ledger
+except ImportError:
+    Ledger = None
+
+# Settings create_app() understands. Each can also be set through an
+# ENROLLMENT_<NAME> environment variable; a config passed in wins over both.
+DEFAULT_CONFIG = {
+    'DATA_DIR': 'data',
+    # Storage backend: 'json' (snapshot + journal) or 'sqlite'
+    'STORAGE': 'json',
+    # JSON snapshots are coalesced: at most this many seconds or journal records apart
+    'SNAPSHOT_DELAY': 30.0,
+    'SNAPSHOT_EVERY': 1000,
+    # Hash passwords in a process pool instead of threads
+    'KDF_PROCESSES': False,
+    # Login attempts allowed per account and per client address each minute
+    'LOGIN_ATTEMPTS': 5,
+    # Start the sampling profiler with the app
+    'PROFILE': False,
+    # Load before a pre-forking server forks; storage is opened in each worker
+    'PRELOAD': False,
+    # Several processes serve the same data; needs the SQLite backend
+    'SHARED': False,
+    # Store changes in batches from a writer thread instead of the request's
+    # thread; set by the ASGI front end, whose handlers await the write
+    'ASYNC_WRITES': False,
+    # Move transactions of terms that ended more than this many days ago
+    # into the compressed archive; 0 keeps every transaction in memory.
+    # Needs the JSON backend; SQLite already reads histories on demand.
+    'ARCHIVE_AFTER_DAYS': 0,
+    # Run conflict reports and CSV exports in a worker process over the
+    # stored data, instead of over a replica taken in the serving process
+    'REPORT_WORKER': False,
+    # Reports share a replica, or the worker's copy of the data, for up to
+    # this many seconds instead of each taking a fresh one
+    'REPLICA_MAX_AGE': 1.0,
+    'SECRET_KEY': None,
+}
+
+# Rows per page in the admin listings and course rosters
+PAGE_SIZE = 25
+ROSTER_PAGE_SIZE = 50
+
+# How often a running app looks for terms to archive, in seconds
+ARCHIVE_CHECK_SECONDS = 86400
+
+
+def config_from_env(environ=os.environ):
+    """Read the ENROLLMENT_<NAME> environment variables into a config dict"""
+    config = {}
+    for key, default in DEFAULT_CONFIG.items():
+        value = environ.get(f'ENROLLMENT_{key}')
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            config[key] = value.lower() not in ('', '0', 'false', 'no')
+        elif isinstance(default, (int, float)):
+            config[key] = type(default)(value)
+        else:
+            config[key] = value
+    return config
+
+
+class AppState:
+    """Enrollment data and the services around it, shared by a process's apps
+    
+    load() reads the data; start() opens storage for writing and starts the
+    background threads. Under a pre-forking server load() runs in the master
+    and start() in each worker on its first request, since storage handles
+    and threads do not survive a fork.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.system = EnrollmentSystem()
+        self.storage = None
+        self.writer = None
+        self.ledger = None
+        self.analytics = None
+        self.reports = None
+        self.archive = LedgerArchive(os.path.join(config['DATA_DIR'], ARCHIVE_DIR))
+        self._stop_archiving = threading.Event()
+        self.login_limiter = RateLimiter(capacity=config['LOGIN_ATTEMPTS'], per_seconds=60)
+        self.profiler = metrics.SamplingProfiler()
+        self.fragments = FragmentCache()
+        # (time taken, replica) shared by reports; see replica()
+        self._replica = (None, None)
+        self._replica_lock = threading.Lock()
+        # Mixed into ETags; versions count from zero again in a new process
+        self.etag_salt = None
+        self._started_pid = None
+        self._lock = threading.Lock()
+    
+    def _open_storage(self):
+        options = {}
+        if self.config['STORAGE'] == 'json':
+            options['max_delay'] = self.config['SNAPSHOT_DELAY']
+            options['compact_every'] = self.config['SNAPSHOT_EVERY']
+        if self.config['SHARED']:
+            options['shared'] = True
+        return get_storage(self.config['STORAGE'], self.config['DATA_DIR'], **options)
+    
+    def load(self):
+        """Load the data, initializing it with default data if there is none
+        
+        Data that exists but cannot be read raises, from the storage
+        backend, and is never overwritten with the defaults.
+        """
+        self.storage = self._open_storage()
+        load_stats = {}
+        if not self.storage.load(self.system, stats=load_stats):
+            print("No existing data found. Initializing with default data.")
+            seed_defaults(self.system)
+            self.storage.save(self.system)
+        else:
+            print(f"Data loaded successfully: {load_stats['courses']} courses, {load_stats['students']} students, "
+                  f"{load_stats['transactions']} transactions, {load_stats['journal_records']} journal records "
+                  f"in {load_stats['seconds']:.3f}s.")
+        
+        # School-wide finance reports run over a columnar copy of all transactions
+        if Ledger is not None:
+            self.ledger = Ledger.build(self.system, self.storage.iter_transactions(self.system))
+        # Running totals behind the admin analytics page
+        self.analytics = Analytics.build(self.system, self.storage.iter_transactions(self.system))
+        metrics.TRANSACTIONS.set(load_stats.get('transactions', 0))
+    
+    def start(self):
+        """Start persisting changes and the background threads in this process"""
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            if self.config['PRELOAD']:
+                # Loaded by the server's master process, whose connections and
+                # thread pools did not survive the fork
+                self.storage.reopen()
+                self.system.hasher = PasswordHasher(processes=self.config['KDF_PROCESSES'])
+            elif self.config['KDF_PROCESSES']:
+                # Hash passwords in forked worker processes instead of threads
+                self.system.hasher = PasswordHasher(processes=True)
+            
+            # Persist every later change through the storage backend
+            if self.config['ASYNC_WRITES']:
+                self.writer = AsyncWriter(self.storage.record_event)
+            self.storage.attach(self.system, writer=self.writer)
+            if self.config['SHARED']:
+                self.system.coordinator = self.storage
+            atexit.register(self.close)
+            if self.ledger is not None:
+                self.system.subscribe(self.ledger.record_event)
+            self.system.subscribe(self.analytics.record_event)
+            
+            # Counts read by the metrics endpoint; transactions are counted as they happen
+            metrics.REGISTRY.gauge('enrollment_students', "Registered students",
+                                   func=lambda: len(self.system.students))
+            metrics.REGISTRY.gauge('enrollment_courses', "Courses offered",
+                                   func=lambda: len(self.system.courses))
+            self.system.subscribe(metrics.record_event)
+            metrics.register_stats(self.storage.stats)
+            if self.writer is not None:
+                metrics.register_stats(self.writer.stats)
+            
+            if self.config['PROFILE']:
+                self.profiler.start()
+            if self.config['ARCHIVE_AFTER_DAYS'] > 0 and self.config['STORAGE'] == 'json':
+                threading.Thread(target=self._archive_old_terms, name='ledger-archiver', daemon=True).start()
+            if self.config['REPORT_WORKER']:
+                self.reports = ReportWorker(self.config['STORAGE'], self.config['DATA_DIR'],
+                                            self.config['REPLICA_MAX_AGE'])
+            self.etag_salt = os.urandom(8).hex()
+            self._started_pid = os.getpid()
+    
+    def _archive_old_terms(self):
+        """Archive the terms past the cutoff now, then once every check interval"""
+        while True:
+            now = int((datetime.now() - EPOCH).total_seconds())
+            try:
+                archived = self.archive.archive(self.system, archive_cutoff(now, self.config['ARCHIVE_AFTER_DAYS']))
+                if archived:
+                    print(f"Archived {archived} transactions.")
+            except Exception as e:
+                print(f"Archiving old transactions failed: {e}")
+            if self._stop_archiving.wait(ARCHIVE_CHECK_SECONDS):
+                return
+    
+    def report(self, name, *args):
+        """Run a report of replica.py over a read-only replica of the data
+        
+        Args:
+            name (str): Name of the report function in replica.REPORTS
+            *args: Its arguments after the replica
+        """
+        if self.reports is not None:
+            return self.reports.run(name, *args)
+        return REPORTS[name](self.replica(), *args)
+    
+    def replica(self):
+        """Return a replica at most REPLICA_MAX_AGE seconds old
+        
+        Reports arriving together share one replica, so a burst of exports
+        pauses changes once rather than once per export.
+        """
+        with self._replica_lock:
+            taken_at, replica = self._replica
+            now = time.monotonic()
+            if replica is None or now - taken_at > self.config['REPLICA_MAX_AGE']:
+                replica = self.system.snapshot()
+                self._replica = (now, replica)
+            return replica
+    
+    def sync(self):
+        """Catch up with changes other processes made, in shared mode"""
+        if self.config['SHARED']:
+            self.storage.sync(self.system)
+    
+    def close(self):
+        """Stop the profiler and flush storage"""
+        self.profiler.stop()
+        self._stop_archiving.set()
+        if self.reports is not None:
+            self.reports.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.storage is not None:
+            self.storage.close()
+
+
+def seed_defaults(system):
+    """Add the sample courses, students and admin of a fresh installation"""
+    # Add some courses
+    system.add_course(Course("CS101", "Introduction to Programming", "Jomar Leano", "MWF 9:00-10:30", 30))
+    system.add_course(Course("BIO201", "Biology I", "Stephanie Mores", "TTh 10:30-12:00", 25))
+    system.add_course(Course("ENG101", "English Composition", "Vince Fernandez", "MWF 13:00-14:30", 35))
+    system.add_course(Course("PHYS101", "Physics I", "Marylou Bacordio", "TTh 14:00-15:30", 20))
+    system.add_course(Course("CHEM101", "Chemistry I", "Remar Bacula", "MWF 15:00-16:30", 40))
+    
+    # Add some students
+    system.add_student(Student("S1001", "Marlon Pabroa", 12, "pass123"))
+    system.add_student(Student("S1002", "Jackine Geoca", 12, "pass123"))
+    system.add_student(Student("S1003", "Ryle Cabanilla", 12, "pass123"))
+    system.add_student(Student("S1004", "Xyrill Mensoro", 12, "pass123"))
+    system.add_student(Student("S1005", "Norvy Daclan", 12, "pass123"))
+    
+    # Add an admin
+    system.add_admin("admin", "Administrator", "admin123")
+
+
+# One state per data directory and backend in this process
+_states = {}
+_states_lock = threading.Lock()
+
+
+def get_state(config):
+    """Return the loaded state for config, loading it on first use"""
+    key = (os.path.abspath(config['DATA_DIR']), config['STORAGE'])
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = _states[key] = AppState(config)
+            state.load()
+        return state
+
+
+def create_app(config=None):
+    """Build the Flask application
+    
+    Args:
+        config (dict, optional): Settings overriding DEFAULT_CONFIG and the
+            ENROLLMENT_* environment variables
+    
+    Returns:
+        Flask: The application; its state is app.extensions['enrollment']
+    """
+    settings = dict(DEFAULT_CONFIG)
+    settings.update(config_from_env())
+    settings.update(config or {})
+    if settings['SHARED'] and settings['STORAGE'] != 'sqlite':
+        raise ValueError("SHARED mode needs the 'sqlite' storage backend")
+    if settings['SHARED'] and settings['ASYNC_WRITES']:
+        raise ValueError("SHARED mode stores each change inside its database transaction; "
+                         "it cannot be combined with ASYNC_WRITES")
+    
+    app = Flask(__name__, template_folder='Templates')
+    app.config.update(settings)
+    # Generated before any fork, so preloaded workers accept each other's sessions
+    app.secret_key = settings['SECRET_KEY'] or os.urandom(24)
+    
+    state = get_state(settings)
+    app.extensions['enrollment'] = state
+    if settings['PRELOAD']:
+        # Keep the collector from writing to the loaded objects, which would
+        # copy their pages into every worker
+        state.storage.close()
+        gc.freeze()
+        app.before_request(state.start)
+    else:
+        state.start()
+    app.before_request(state.sync)
+    
+    for rule, view, options in _views:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.add_template_global(modify_query)
+    app.add_template_global(fragment)
+    app.before_request(start_request_timer)
+    app.after_request(record_request_time)
+    before_render_template.connect(start_template_timer, app)
+    template_rendered.connect(record_template_time, app)
+    return app
+
+
+# Views are collected here and registered by create_app() under their own names
+_views = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        _views.append((rule, view, options))
+        return view
+    return decorator
+
+
+# The state of the app handling the current request
+enrollment_system = LocalProxy(lambda: current_app.extensions['enrollment'].system)
+login_limiter = LocalProxy(lambda: current_app.extensions['enrollment'].login_limiter)
+profiler = LocalProxy(lambda: current_app.extensions['enrollment'].profiler)
+
+
+def modify_query(**changes):
+    """URL of the current page with some query arguments replaced; None removes one"""
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **request.view_args,
+                   **{key: value for key, value in args.items() if value is not None})
+
+def fragment(macro, course, *key, **context):
+    """Render a macro of _fragments.html for a course, cached until the course changes
+    
+    Args:
+        macro (str): Name of the macro, called as macro(course, **context)
+        course (Course): Course the fragment shows
+        *key: Anything else the output depends on, e.g. a page cursor
+    """
+    state = current_app.extensions['enrollment']
+    # Read before rendering: if the course changes meanwhile the entry holds
+    # newer output than its version, never older
+    version = state.system.course_versions.get(course.course_id)
+    return state.fragments.get(
+        (macro, course.course_id, version) + key,
+        lambda: get_template_attribute('_fragments.html', macro)(course, **context))
+
+def csv_response(rows, filename):
+    """Stream rows as a CSV attachment"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def render_conditional(versions, template_name, context):
+    """render_template() for a page the client may already have
+    
+    The weak ETag covers the versions of the data the page shows, the URL
+    and the user, so a client revalidating an unchanged page gets 304 Not
+    Modified without the page being built. Pages showing flashed messages
+    are always rendered.
+    
+    Args:
+        versions (tuple): Versions of the data, read before the data itself
+        template_name (str): Template to render
+        context (callable): Returns the template context; not called for a 304
+    """
+    if session.get('_flashes'):
+        return render_template(template_name, **context())
+    state = current_app.extensions['enrollment']
+    etag = hashlib.sha1(repr((state.etag_salt, template_name, request.full_path, session.get('user_id'),
+                              session.get('name'), versions)).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render_template(template_name, **context()))
+    response.set_etag(etag, weak=True)
+    # Always revalidate, since the page changes with every enrollment
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.REQUEST_SECONDS.labels(endpoint=request.endpoint or 'unmatched', method=request.method,
+                                       status=response.status_code).observe(time.perf_counter() - started)
+    return response
+
+def start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+def record_template_time(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        metrics.TEMPLATE_SECONDS.labels(template=template.name).observe(time.perf_counter() - started)
+
+# Routes
+@route('/')
+def index():
+    return render_template('index.html')
+
+
+@route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        user_id = request.form['user_id']
+        password = request.form['password']
+        user_type = request.form['user_type']
+        
+        # Password checks are deliberately slow; cap attempts per account and per client
+        if not login_limiter.allow(f"id:{user_type}:{user_id}", f"ip:{request.remote_addr}"):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('login.html'), 429
+        
+        if user_type == 'student':
+            student = enrollment_system.verify_student(user_id, password)
+            if student:
+                session['user_id'] = user_id
+                session['user_type'] = 'student'
+                session['name'] = student.name
+                flash('Login successful!', 'success')
+                return redirect(url_for('student_dashboard'))
+        
+        elif user_type == 'admin':
+            if enrollment_system.verify_admin(user_id, password):
+                session['user_id'] = user_id
+                session['user_type'] = 'admin'
+                session['name'] = enrollment_system.admins[user_id]['name']
+                flash('Admin login successful!', 'success')
+                return redirect(url_for('admin_dashboard'))
+        
+        flash('Invalid credentials!', 'danger')
+    
+    return render_template('login.html')
+
+@route('/logout')
+def logout():
+    session.clear()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('index'))
+
+@route('/student/dashboard')
+def student_dashboard():
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    student = enrollment_system.get_student(session['user_id'])
+    # Seats, enrollments and waitlist places all change the catalog version
+    return render_conditional((enrollment_system.catalog_version,), 'student_dashboard.html', lambda: dict(
+        student=student,
+        # Only the courses the student can still pick, with seats precomputed
+        available_courses=enrollment_system.course_availability(student),
+        waitlist_positions=enrollment_system.waitlist_positions(student)))
+
+@route('/student/enroll/<course_id>')
+def enroll_course(course_id):
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    course = enrollment_system.get_course(course_id)
+    
+    # Checks capacity and takes the seat atomically; the journal records it
+    if course and enrollment_system.enroll(session['user_id'], course_id):
+        flash(f'Successfully enrolled in {course.name}!', 'success')
+    else:
+        clashes = enrollment_system.schedule_conflicts(session['user_id'], course_id)
+        # A full course puts the student in line instead of making them retry
+        position = None if clashes else enrollment_system.join_waitlist(session['user_id'], course_id)
+        if clashes:
+            flash(f'Enrollment failed. {course.name} meets at the same time as '
+                  f'{", ".join(clash.name for clash in clashes)}.', 'danger')
+        elif position:
+            flash(f'{course.name} is full. You are number {position} on the waitlist '
+                  f'and will be enrolled automatically when a seat opens.', 'info')
+        else:
+            flash('Enrollment failed. Course might be full or you are already enrolled.', 'danger')
+    
+    return redirect(url_for('student_dashboard'))
+
+@route('/student/waitlist/leave/<course_id>')
+def leave_waitlist(course_id):
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    if enrollment_system.leave_waitlist(session['user_id'], course_id):
+        flash('You have left the waitlist.', 'success')
+    else:
+        flash('You are not on the waitlist for this course.', 'danger')
+    
+    return redirect(url_for('student_dashboard'))
+
+@route('/student/drop/<course_id>')
+def drop_course(course_id):
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    course = enrollment_system.get_course(course_id)
+    
+    if course and enrollment_system.drop(session['user_id'], course_id):
+        flash(f'Successfully dropped {course.name}.', 'success')
+    else:
+        flash('Drop failed. You might not be enrolled in this course.', 'danger')
+    
+    return redirect(url_for('student_dashboard'))
+
+@route('/admin/dashboard')
+def admin_dashboard():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    # Each listing is paged, sorted and searched on its own set of query arguments
+    args = request.args
+    versions = (enrollment_system.catalog_version, enrollment_system.student_version, profiler.running)
+    
+    def context():
+        courses, next_courses = enrollment_system.list_courses(
+            sort=args.get('course_sort', 'name'),
+            after=args.get('course_after'),
+            limit=PAGE_SIZE,
+            query=args.get('course_q'),
+            descending=args.get('course_order') == 'desc')
+        students, next_students = enrollment_system.list_students(
+            sort=args.get('student_sort', 'name'),
+            after=args.get('student_after'),
+            limit=PAGE_SIZE,
+            query=args.get('student_q'),
+            descending=args.get('student_order') == 'desc')
+        return dict(courses=courses,
+                    students=students,
+                    next_courses=next_courses,
+                    next_students=next_students,
+                    course_count=len(enrollment_system.courses),
+                    student_count=len(enrollment_system.students),
+                    profiler_running=profiler.running)
+    
+    return render_conditional(versions, 'admin_dashboard.html', context)
+
+@route('/admin/course/add', methods=['GET', 'POST'])
+def add_course():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        course_id = request.form['course_id']
+        name = request.form['name']
+        instructor = request.form['instructor']
+        schedule = request.form['schedule']
+        capacity = int(request.form['capacity'])
+        
+        # Check if course ID already exists
+        if enrollment_system.get_course(course_id):
+            flash('Course ID already exists!', 'danger')
+        else:
+            new_course = Course(course_id, name, instructor, schedule, capacity)
+            enrollment_system.add_course(new_course)
+            flash('Course added successfully!', 'success')
+            return redirect(url_for('admin_dashboard'))
+    
+    return render_template('add_course.html')
+
+@route('/admin/course/remove/<course_id>')
+def remove_course(course_id):
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    if enrollment_system.remove_course(course_id):
+        flash('Course removed successfully!', 'success')
+    else:
+        flash('Failed to remove course.', 'danger')
+    
+    return redirect(url_for('admin_dashboard'))
+
+@route('/admin/student/add', methods=['GET', 'POST'])
+def add_student():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        student_id = request.form['student_id']
+        name = request.form['name']
+        grade_level = int(request.form['grade_level'])
+        password = request.form['password']
+        
+        # Check if student ID already exists
+        if enrollment_system.get_student(student_id):
+            flash('Student ID already exists!', 'danger')
+        else:
+            new_student = Student(student_id, name, grade_level, password)
+            enrollment_system.add_student(new_student)
+            flash('Student added successfully!', 'success')
+            return redirect(url_for('admin_dashboard'))
+    
+    return render_template('add_student.html')
+
+@route('/admin/import', methods=['GET', 'POST'])
+def batch_import():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import.', 'danger')
+            return render_template('batch_import.html')
+        
+        # The rows are read twice, so spool the upload to a seekable file
+        source = tempfile.TemporaryFile()
+        shutil.copyfileobj(upload.stream, source)
+        report = tempfile.TemporaryFile('w+', newline='')
+        writer = csv.writer(report)
+        writer.writerow(['line', 'type', 'status', 'error'])
+        
+        def on_result(line_number, row_type, error):
+            writer.writerow([line_number, row_type or '', 'failed' if error else 'ok', error or ''])
+        
+        with source:
+            counts = enrollment_system.import_batch(
+                open_binary(source, detect_format(upload.filename)), on_result)
+        writer.writerow([])
+        writer.writerow(['applied', counts['applied'], 'failed', counts['failed']])
+        
+        def stream_report():
+            with report:
+                report.seek(0)
+                yield from iter(lambda: report.read(io.DEFAULT_BUFFER_SIZE), '')
+        
+        return Response(stream_report(), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=import_report.csv'})
+    
+    return render_template('batch_import.html')
+
+@route('/admin/reports/finance')
+def finance_report():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    ledger = current_app.extensions['enrollment'].ledger
+    if ledger is None:
+        return jsonify({'error': 'Finance reports require NumPy'}), 503
+    
+    # Payments grouped as {date: {method: amount}}
+    payments = {}
+    for (date, method), amount in ledger.payments_by_method_per_day().items():
+        payments.setdefault(date, {})[method] = amount
+    
+    now = int((datetime.now() - EPOCH).total_seconds())
+    return jsonify({
+        'total_outstanding': ledger.total_outstanding(),
+        'balances_by_grade': ledger.balances_by_grade(),
+        'payments_by_method_per_day': payments,
+        'aging_buckets': ledger.aging_buckets(now)
+    })
+
+@route('/admin/analytics')
+def admin_analytics():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    report = current_app.extensions['enrollment'].analytics.report()
+    return render_template('admin_analytics.html', report=report)
+
+@route('/admin/reports/analytics')
+def analytics_report():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    analytics = current_app.extensions['enrollment'].analytics
+    # Both arguments bound the work of the report, so keep them within reason
+    days = min(max(request.args.get('days', REPORT_DAYS, type=int), 1), 366)
+    limit = min(max(request.args.get('limit', REPORT_COURSES, type=int), 0), 100)
+    return jsonify(analytics.report(days=days, limit=limit))
+
+@route('/admin/reports/conflicts')
+def conflict_report():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    return jsonify(current_app.extensions['enrollment'].report('conflict_rows'))
+
+@route('/admin/reports/enrollments.csv')
+def enrollment_export():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    rows = current_app.extensions['enrollment'].report('enrollment_rows')
+    return csv_response(rows, 'enrollments.csv')
+
+@route('/admin/metrics')
+def admin_metrics():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@route('/admin/profiler', methods=['GET', 'POST'])
+def admin_profiler():
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        if request.form.get('action') == 'start':
+            profiler.start()
+            flash('Profiler started.', 'info')
+        else:
+            profiler.stop()
+            flash('Profiler stopped.', 'info')
+        return redirect(url_for('admin_dashboard'))
+    
+    # Collapsed stacks, ready for a flame graph
+    return Response(profiler.report(), mimetype='text/plain')
+
+@route('/admin/course/<course_id>/roster')
+def view_course_roster(course_id):
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    course = enrollment_system.get_course(course_id)
+    if course:
+        def context():
+            students, next_students = enrollment_system.roster_page(
+                course, after=request.args.get('after'), limit=ROSTER_PAGE_SIZE)
+            return dict(course=course, students=students, next_students=next_students)
+        
+        return render_conditional((enrollment_system.course_versions.get(course_id),),
+                                  'course_roster.html', context)
+    else:
+        flash('Course not found!', 'danger')
+        return redirect(url_for('admin_dashboard'))
+
+@route('/admin/course/<course_id>/roster.csv')
+def export_course_roster(course_id):
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Admin access required!', 'warning')
+        return redirect(url_for('login'))
+    
+    rows = current_app.extensions['enrollment'].report('roster_rows', course_id)
+    if rows is None:
+        flash('Course not found!', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    return csv_response(rows, f'roster_{course_id}.csv')
+
+@route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        student_id = request.form['student_id']
+        name = request.form['name']
+        grade_level = int(request.form['grade_level'])
+        password = request.form['password']
+        confirm_password = request.form['confirm_password']
+        
+        # Validate input
+        errors = []
+        
+        # Check if ID already exists
+        if enrollment_system.get_student(student_id):
+            errors.append('Student ID already exists!')
+        
+        # Check if passwords match
+        if password != confirm_password:
+            errors.append('Passwords do not match!')
+        
+        # If there are no errors, create the new student
+        if not errors:
+            new_student = Student(student_id, name, grade_level, password)
+            enrollment_system.add_student(new_student)
+            flash('Registration successful! Please login.', 'success')
+            return redirect(url_for('login'))
+        
+        # If there are errors, show them
+        for error in errors:
+            flash(error, 'danger')
+    
+    return render_template('register.html')
+
+@route('/student/finances')
+def student_finances():
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    student = enrollment_system.get_student(session['user_id'])
+    # Archived terms, newest first; only the one asked for is read from disk
+    terms = sorted({entry[0] for entry in student.archive}, reverse=True)
+    term = request.args.get('term')
+    if term not in terms:
+        return render_template('student_finances.html', student=student, terms=terms, term=None,
+                               transactions=reversed(student.transactions))
+    archived = current_app.extensions['enrollment'].archive.read(
+        entry for entry in student.archive if entry[0] == term)
+    return render_template('student_finances.html', student=student, terms=terms, term=term,
+                           transactions=reversed(archived))
+
+@route('/student/make_payment', methods=['POST'])
+def make_payment():
+    if 'user_id' not in session or session['user_type'] != 'student':
+        flash('Please login first!', 'warning')
+        return redirect(url_for('login'))
+    
+    amount = float(request.form['amount'])
+    payment_method = request.form['payment_method']
+    
+    if enrollment_system.make_payment(session['user_id'], amount, payment_method):
+        flash(f'Payment of {amount} pesos successful!', 'success')
+    else:
+        flash('Payment failed. Please check the amount.', 'danger')
+    
+    return redirect(url_for('student_finances'))
+
+
+if __name__ == '__main__':
+    create_app().run(debug=True, port=5051)
@@ -0,0 +1,131 @@
+"""Per-term archive of old ledger entries
+
+Transactions from terms that ended before a cutoff are moved out of
+memory into compressed segment files, one per term and archiving run, in
+an archive directory next to the snapshot. Each student's entries of a
+term are one zlib-compressed JSON block, so a single term of a single
+student is read back with one seek. The student keeps the amounts charged
+and paid before the cutoff, whose difference is the opening balance
+carried forward, plus the (term, file, offset, length) of each block.
+
+Segments are written and fsynced before EnrollmentSystem drops the
+transactions, and are never rewritten; a segment left behind by a run
+that did not finish is simply never referenced.
+"""
+import bisect
+import datetime
+import json
+import os
+import sys
+import time
+import zlib
+
+from models import EPOCH, Transaction
+
+ARCHIVE_DIR = 'archive'
+
+# Months in which a term starts: two semesters a year, named "<year>-1"
+# and "<year>-2"
+TERM_START_MONTHS = (1, 7)
+
+
+def term_of(timestamp):
+    """Name of the term a Transaction timestamp falls in"""
+    date = EPOCH + datetime.timedelta(seconds=timestamp)
+    return f"{date.year}-{bisect.bisect_right(TERM_START_MONTHS, date.month)}"
+
+
+def term_start(timestamp):
+    """Timestamp at which the term holding a timestamp began"""
+    date = EPOCH + datetime.timedelta(seconds=timestamp)
+    month = TERM_START_MONTHS[bisect.bisect_right(TERM_START_MONTHS, date.month) - 1]
+    return int((datetime.datetime(date.year, month, 1) - EPOCH).total_seconds())
+
+
+def archive_cutoff(now, days):
+    """Start of the oldest term to keep in memory
+    
+    Every term that ended more than `days` days before `now` is archived;
+    the term that was running `days` days ago is kept whole.
+    """
+    return term_start(now - days * 86400)
+
+
+class LedgerArchive:
+    """Segment files of archived transactions in one directory"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def read(self, entries):
+        """Read archived transactions, oldest first
+        
+        Args:
+            entries (iterable): A student's (term, file, offset, length)
+                archive entries to read
+        
+        Returns:
+            list: Transaction objects
+        """
+        transactions = []
+        for _, name, offset, length in entries:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+            if len(data) != length:
+                raise ValueError(f"archive segment {name} is truncated")
+            transactions.extend(Transaction.from_dict(t) for t in json.loads(zlib.decompress(data)))
+        return transactions
+    
+    def archive(self, enrollment_system, before):
+        """Move every transaction dated before a cutoff into new segments
+        
+        Args:
+            enrollment_system (EnrollmentSystem): System whose students' old
+                transactions are archived
+            before (int): Cutoff timestamp, normally archive_cutoff()
+        
+        Returns:
+            int: Number of transactions archived
+        """
+        os.makedirs(self.path, exist_ok=True)
+        run = time.time_ns()
+        segments = {}
+        archived = []
+        try:
+            for student in list(enrollment_system.students.values()):
+                with enrollment_system.student_lock(student.student_id):
+                    old = [transaction for transaction in student.transactions if transaction.timestamp < before]
+                if not old:
+                    continue
+                terms = {}
+                for transaction in old:
+                    terms.setdefault(term_of(transaction.timestamp), []).append(transaction)
+                entries = []
+                for term, transactions in sorted(terms.items()):
+                    segment = segments.get(term)
+                    if segment is None:
+                        name = sys.intern(f'ledger.{term}.{run}.seg')
+                        segment = segments[term] = (name, open(os.path.join(self.path, name), 'wb'))
+                    name, f = segment
+                    data = zlib.compress(json.dumps([t.to_dict() for t in transactions],
+                                                    separators=(',', ':')).encode('utf-8'))
+                    entries.append((term, name, f.tell(), len(data)))
+                    f.write(data)
+                archived.append((student.student_id, before, entries))
+            for _, f in segments.values():
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            for _, f in segments.values():
+                f.close()
+        if not archived:
+            return 0
+        if os.name != 'nt':
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        # Only now that the segments are durable may the transactions go
+        return enrollment_system.archive_transactions(archived)
@@ -0,0 +1,301 @@
+"""ASGI front end of the enrollment system
+
+Serves the Flask application of app.py from an event loop, so thousands of
+mostly idle connections cost a coroutine each rather than a thread. The
+hot student routes (dashboard, enroll, drop, waitlist, payment) run as
+coroutines on the loop; every other route runs as plain WSGI on a small
+thread pool. Changes are stored by the state's AsyncWriter in batches, and
+no response is sent before the changes made for it are durable, so
+concurrent requests share one journal fsync. Run it under any ASGI server:
+    uvicorn --factory asgi:create_asgi_app
+Use one process per data directory; SHARED mode is not supported.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import io
+import sys
+import threading
+
+import app as views
+from app import create_app
+
+# Threads running the routes that have no coroutine version
+WSGI_THREADS = 8
+
+# Set while the current task holds the coordinator's lock
+_holding = contextvars.ContextVar('holding', default=False)
+
+
+class AsyncCoordinator:
+    """Serializes EnrollmentSystem changes on the event loop
+    
+    Coroutines take the lock with `async with coordinator.change()`, so a
+    change waiting its turn yields to other requests instead of blocking a
+    thread. Installed as EnrollmentSystem.coordinator, it also makes changes
+    from WSGI threads take the same lock, through the loop, before any
+    course or student lock; a coroutine holding the lock therefore never
+    waits on those locks for another change.
+    """
+    
+    def __init__(self, loop):
+        self.loop = loop
+        self._lock = asyncio.Lock()
+        self._local = threading.local()
+    
+    @contextlib.asynccontextmanager
+    async def change(self):
+        """Hold the lock for the changes made in the block"""
+        async with self._lock:
+            token = _holding.set(True)
+            try:
+                yield
+            finally:
+                _holding.reset(token)
+    
+    @contextlib.contextmanager
+    def transaction(self, system):
+        """Context of one change made through EnrollmentSystem._changing()"""
+        if _holding.get() or getattr(self._local, 'depth', 0):
+            # Already inside change(), or a nested change in the same thread
+            yield
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            # A change on the loop outside change() cannot wait for the lock,
+            # but it runs without yielding, so no other coroutine interleaves
+            yield
+            return
+        asyncio.run_coroutine_threadsafe(self._lock.acquire(), self.loop).result()
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            self.loop.call_soon_threadsafe(self._lock.release)
+
+
+def coroutine_view(view):
+    """A coroutine calling a view that changes the system under the coordinator
+    
+    The response waits, without blocking the loop, until the changes are
+    stored.
+    """
+    async def handler(asgi_app, **view_args):
+        async with asgi_app.coordinator.change():
+            response = view(**view_args)
+        if asgi_app.state.writer is not None:
+            await asgi_app.state.writer.wait()
+        return response
+    handler.__name__ = view.__name__
+    return handler
+
+
+async def student_dashboard(asgi_app):
+    # Renders from memory, so it runs on the loop without a thread hop
+    return views.student_dashboard()
+
+
+# Endpoints served by coroutines
+HANDLERS = {
+    'student_dashboard': student_dashboard,
+    'enroll_course': coroutine_view(views.enroll_course),
+    'drop_course': coroutine_view(views.drop_course),
+    'leave_waitlist': coroutine_view(views.leave_waitlist),
+    'make_payment': coroutine_view(views.make_payment),
+}
+
+
+class AsgiApp:
+    """ASGI application around a Flask app created by create_app()"""
+    
+    def __init__(self, app, handlers=HANDLERS, threads=WSGI_THREADS):
+        self.app = app
+        self.state = app.extensions['enrollment']
+        self.handlers = handlers
+        self.coordinator = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+    
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.coordinator is None or self.coordinator.loop is not loop:
+            self.coordinator = AsyncCoordinator(loop)
+            self.state.system.coordinator = self.coordinator
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+        self._start()
+        
+        environ = wsgi_environ(scope, await read_body(receive))
+        try:
+            endpoint, view_args = self.app.url_map.bind_to_environ(environ).match()
+        except Exception:
+            # Not found and the like are answered by Flask itself
+            endpoint, view_args = None, {}
+        handler = self.handlers.get(endpoint)
+        if handler is None:
+            await self._stream_wsgi(environ, send)
+            return
+        status, headers, body = await self._dispatch(handler, view_args, environ)
+        await send_start(send, status, headers)
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def _stream_wsgi(self, environ, send):
+        """Run a route as WSGI on the pool and send its body chunk by chunk
+        
+        Each chunk after the first is produced by its own call on the pool,
+        so a long body is neither held in memory nor blocks the loop. The
+        response starts once the changes the view made are stored.
+        """
+        loop = asyncio.get_running_loop()
+        status, headers, chunks, chunk = await loop.run_in_executor(self._executor, call_wsgi, self.app, environ)
+        try:
+            if self.state.writer is not None:
+                await self.state.writer.wait()
+            await send_start(send, status, headers)
+            # Look one chunk ahead, so the last one goes out without more_body
+            while True:
+                following = await loop.run_in_executor(self._executor, next, chunks, None)
+                if following is None:
+                    break
+                if following:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = following
+            await send({'type': 'http.response.body', 'body': chunk})
+        finally:
+            await loop.run_in_executor(self._executor, chunks.close)
+    
+    async def _dispatch(self, handler, view_args, environ):
+        """Run a coroutine handler the way Flask runs a view"""
+        app = self.app
+        with app.request_context(environ):
+            try:
+                try:
+                    response = app.preprocess_request()
+                    if response is None:
+                        response = await handler(self, **view_args)
+                except Exception as exc:
+                    response = app.handle_user_exception(exc)
+                response = app.finalize_request(response)
+            except Exception as exc:
+                response = app.handle_exception(exc)
+            return response.status_code, response.headers.to_wsgi_list(), b''.join(response.iter_encoded())
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.state.writer is not None:
+                    await self.state.writer.wait()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def send_start(send, status, headers):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers]})
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ of an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(app, environ):
+    """Run a WSGI request up to the first chunk of its body
+    
+    An application may call start_response as late as its first chunk, so
+    the status and headers are only known from there on.
+    
+    Returns:
+        tuple: (status, headers, chunks, first chunk), where chunks is a
+            generator of the rest of the body; the caller closes it
+    """
+    started = {}
+    
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+    
+    chunks = _closing(app(environ, start_response))
+    chunk = next(chunks, b'')
+    return started['status'], started['headers'], chunks, chunk
+
+
+def _closing(result):
+    # Iterates a WSGI result; closing the generator closes the result
+    try:
+        yield from result
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def create_asgi_app(config=None):
+    """Build the ASGI application
+    
+    Args:
+        config (dict, optional): Settings for create_app(); ASYNC_WRITES
+            defaults to on
+    
+    Returns:
+        AsgiApp: The application; its Flask app is .app
+    """
+    settings = {'ASYNC_WRITES': True}
+    settings.update(config or {})
+    if settings.get('SHARED'):
+        raise ValueError("The ASGI front end serves one process; SHARED mode is not supported")
+    return AsgiApp(create_app(settings))
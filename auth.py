@@ -0,0 +1,229 @@
+"""Password hashing, verification cache and login rate limiting
+
+Passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>".
+Records still holding a plaintext password keep working and are rehashed
+the first time their owner logs in; hash them all at once with:
+    python auth.py migrate --data-dir data
+
+The KDF runs on a small worker pool so a burst of logins cannot occupy
+every request thread. hashlib releases the GIL while it derives a key, so
+the default pool uses threads; a process pool (forked, so workers do not
+re-run the app's startup) can be chosen instead.
+"""
+import argparse
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+
+ALGORITHM = 'pbkdf2_sha256'
+ITERATIONS = 200000
+# Stored hashes outside this range are refused rather than derived, so a
+# crafted hash cannot make a login attempt run the KDF for hours
+MIN_ITERATIONS = ITERATIONS
+MAX_ITERATIONS = 4 * ITERATIONS
+SALT_BYTES = 16
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _derive(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def make_hash(password, salt=None, iterations=ITERATIONS):
+    """Hash a password in the calling thread"""
+    salt = salt or os.urandom(SALT_BYTES)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(_derive(password, salt, iterations))}"
+
+
+def check_hash(password, stored):
+    """Check a password against a stored hash in the calling thread
+    
+    A hash whose iteration count is outside MIN_ITERATIONS to
+    MAX_ITERATIONS never matches.
+    """
+    try:
+        algorithm, iterations, salt, expected = stored.split('$')
+        iterations = int(iterations)
+        if algorithm != ALGORITHM or not MIN_ITERATIONS <= iterations <= MAX_ITERATIONS:
+            return False
+        derived = _derive(password, _unb64(salt), iterations)
+    except ValueError:
+        return False
+    return hmac.compare_digest(derived, _unb64(expected))
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + '$')
+
+
+class PasswordHasher:
+    """Runs KDF work on a bounded pool and caches recent verifications
+    
+    The cache remembers, per account, a keyed digest of the last password
+    that verified against the account's current hash. Repeat logins skip
+    the KDF; the key is random per process and the entries expire, so the
+    cache never holds anything an attacker could test guesses against
+    offline.
+    """
+    
+    def __init__(self, workers=None, processes=False, cache_size=10000, cache_ttl=600):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.processes = processes
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._cache = collections.OrderedDict()  # account -> (stored, digest, expires)
+        self._cache_lock = threading.Lock()
+        self._cache_key = secrets.token_bytes(32)
+    
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                if self.processes:
+                    self._pool = concurrent.futures.ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('fork'))
+                else:
+                    self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='kdf')
+            return self._pool
+    
+    def hash(self, password):
+        """Hash one password on the pool"""
+        return self._executor().submit(make_hash, password).result()
+    
+    def hash_many(self, passwords):
+        """Hash a list of passwords in parallel, keeping their order"""
+        return list(self._executor().map(make_hash, passwords))
+    
+    def _digest(self, stored, password):
+        return hmac.new(self._cache_key, f"{stored}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+    
+    def verify(self, account, password, stored):
+        """Check a password against what is stored for an account
+        
+        Args:
+            account (str): Cache key for the account, e.g. 'student:S1001'
+            password (str): Password that was entered
+            stored (str): Stored hash, or a legacy plaintext password
+        
+        Returns:
+            bool: True if the password matches
+        """
+        if not isinstance(stored, str) or not isinstance(password, str):
+            return False
+        if not is_hashed(stored):
+            return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+        
+        digest = self._digest(stored, password)
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._cache.get(account)
+            if cached and cached[0] == stored and cached[2] > now and hmac.compare_digest(cached[1], digest):
+                self._cache.move_to_end(account)
+                return True
+        
+        if not self._executor().submit(check_hash, password, stored).result():
+            return False
+        
+        with self._cache_lock:
+            self._cache[account] = (stored, digest, now + self.cache_ttl)
+            self._cache.move_to_end(account)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return True
+    
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class RateLimiter:
+    """Token buckets keyed by arbitrary strings, such as an ID or IP address
+    
+    Each key may spend up to capacity attempts at once, regaining one every
+    per_seconds / capacity seconds.
+    """
+    
+    def __init__(self, capacity=5, per_seconds=60.0, max_keys=100000):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated)
+    
+    def allow(self, *keys):
+        """Take one token from every key's bucket, or none if any is empty
+        
+        Returns:
+            bool: True if the attempt may proceed
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key in keys:
+                tokens, updated = self._buckets.get(key, (self.capacity, now))
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+                if tokens < 1:
+                    return False
+                levels.append((key, tokens))
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return True
+    
+    def _prune(self, now):
+        # Called with self._lock held: buckets that have refilled hold no state
+        full_after = self.capacity / self.rate
+        self._buckets = {key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                         if now - updated < full_after}
+
+
+# Shared by every EnrollmentSystem in the process
+default_hasher = PasswordHasher()
+
+
+def migrate(data_dir='data', storage_backend='json'):
+    """Hash every plaintext student and admin password in the stored data"""
+    from models import EnrollmentSystem
+    from storage import get_storage
+    
+    enrollment_system = EnrollmentSystem()
+    storage = get_storage(storage_backend, data_dir)
+    if not storage.load(enrollment_system):
+        raise SystemExit(f"No data found in {data_dir}")
+    storage.attach(enrollment_system)
+    try:
+        count = enrollment_system.hash_plaintext_passwords()
+    finally:
+        storage.close()
+        default_hasher.close()
+    print(f"Hashed {count} plaintext passwords in {data_dir}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Credential tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subcommands.add_parser('migrate', help="Hash plaintext passwords")
+    migrate_parser.add_argument('--data-dir', default='data')
+    migrate_parser.add_argument('--storage', default='json', choices=('json', 'sqlite'))
+    args = parser.parse_args()
+    
+    if args.command == 'migrate':
+        migrate(args.data_dir, args.storage)
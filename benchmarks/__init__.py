@@ -0,0 +1,2 @@
+# Benchmarks for the enrollment system. Run each one from the project root,
+# e.g. `python -m benchmarks.bench_enrollment`.
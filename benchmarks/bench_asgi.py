@@ -0,0 +1,198 @@
+"""Benchmark the ASGI front end against the WSGI app at high concurrency
+
+Each simulated client is a student visiting dashboard, enroll, pay and
+drop. On the WSGI path every client is a thread calling the Flask app, as
+under a threaded server; on the ASGI path every client is a coroutine on
+one event loop calling the ASGI app. Both store changes in the JSON
+journal with an fsync, so the numbers include durability. No server or
+sockets are involved; run with
+`python -m benchmarks.bench_asgi --clients 16 256 1024`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from werkzeug.test import EnvironBuilder
+
+from app import create_app
+from asgi import call_wsgi, create_asgi_app
+from benchmarks.suite import summarize
+from benchmarks.synthetic import generate_institution
+from data_persistence import save_data
+
+# Keep snapshots out of the way so both paths time the journal
+STORAGE_CONFIG = {'STORAGE': 'json', 'SNAPSHOT_DELAY': 3600.0, 'SNAPSHOT_EVERY': 1_000_000}
+
+
+def session_cookie(app, student_id):
+    # Signed directly, so the KDF and login rate limiter stay out of the numbers
+    serializer = app.session_interface.get_signing_serializer(app)
+    value = serializer.dumps({'user_id': student_id, 'user_type': 'student', 'name': student_id})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def visit(course_id):
+    """One student's visit as (name, method, path, form) requests"""
+    return [
+        ('GET /student/dashboard', 'GET', '/student/dashboard', None),
+        ('GET /student/enroll', 'GET', f'/student/enroll/{course_id}', None),
+        ('POST /student/make_payment', 'POST', '/student/make_payment', {'amount': '1', 'payment_method': 'Cash'}),
+        ('GET /student/drop', 'GET', f'/student/drop/{course_id}', None),
+    ]
+
+
+def client_plans(app, student_ids, course_ids, clients, visits, rng):
+    per_client = max(1, visits // clients)
+    return [(session_cookie(app, rng.choice(student_ids)),
+             [request for _ in range(per_client) for request in visit(rng.choice(course_ids))])
+            for _ in range(clients)]
+
+
+def record(latencies, name, started, status):
+    if status >= 400:
+        raise RuntimeError(f"{name} returned {status}")
+    latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def run_wsgi(app, plans):
+    """One thread per client calling the WSGI app"""
+    latencies = {}
+    lock = threading.Lock()
+    errors = []
+    start = threading.Barrier(len(plans) + 1)
+    
+    def client(cookie, requests):
+        local = {}
+        start.wait()
+        try:
+            for name, method, path, form in requests:
+                environ = EnvironBuilder(path=path, method=method, data=form,
+                                         headers={'Cookie': cookie}).get_environ()
+                started = time.perf_counter()
+                status, _, chunks, _ = call_wsgi(app, environ)
+                b''.join(chunks)
+                record(local, name, started, status)
+        except Exception as exc:
+            errors.append(repr(exc))
+        with lock:
+            for name, values in local.items():
+                latencies.setdefault(name, []).extend(values)
+    
+    threads = [threading.Thread(target=client, args=plan) for plan in plans]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"WSGI clients failed: {errors[0]}")
+    return latencies, elapsed
+
+
+async def asgi_call(asgi_app, method, path, cookie, form):
+    body = b''
+    headers = [(b'cookie', cookie.encode('latin-1'))]
+    if form:
+        body = '&'.join(f'{key}={value}' for key, value in form.items()).encode('ascii')
+        headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers,
+             'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+    
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+    
+    async def send(message):
+        sent.append(message)
+    
+    await asgi_app(scope, receive, send)
+    return sent[0]['status']
+
+
+def run_asgi(asgi_app, plans):
+    """One coroutine per client calling the ASGI app"""
+    latencies = {}
+    
+    async def client(cookie, requests):
+        for name, method, path, form in requests:
+            started = time.perf_counter()
+            status = await asgi_call(asgi_app, method, path, cookie, form)
+            record(latencies, name, started, status)
+    
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(client(*plan) for plan in plans))
+        return time.perf_counter() - started
+    
+    elapsed = asyncio.run(main())
+    return latencies, elapsed
+
+
+def collect(results, prefix, latencies, elapsed):
+    for name, values in latencies.items():
+        results[f'{prefix}.{name}'] = summarize(values, elapsed)
+    results[f'{prefix}.all'] = summarize([value for values in latencies.values() for value in values], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2_000)
+    parser.add_argument('--courses', type=int, default=100)
+    parser.add_argument('--clients', type=int, nargs='+', default=[16, 256, 1024],
+                        help="Concurrent clients, one run per value")
+    parser.add_argument('--visits', type=int, default=2_000, help="Student visits per run")
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    system = generate_institution(args.students, args.courses, seed=args.seed)
+    student_ids = list(system.students)
+    course_ids = list(system.courses)
+    root = tempfile.mkdtemp(prefix='enrollment-asgi-bench-')
+    results = {}
+    try:
+        for mode in ('wsgi', 'asgi'):
+            data_dir = os.path.join(root, mode)
+            save_data(system, data_dir)
+            if mode == 'wsgi':
+                app = create_app(dict(STORAGE_CONFIG, DATA_DIR=data_dir))
+                state = app.extensions['enrollment']
+            else:
+                asgi_app = create_asgi_app(dict(STORAGE_CONFIG, DATA_DIR=data_dir))
+                app, state = asgi_app.app, asgi_app.state
+            try:
+                for clients in args.clients:
+                    plans = client_plans(app, student_ids, course_ids, clients, args.visits, rng)
+                    if mode == 'wsgi':
+                        latencies, elapsed = run_wsgi(app, plans)
+                    else:
+                        latencies, elapsed = run_asgi(asgi_app, plans)
+                    collect(results, f'{mode}.c{clients}', latencies, elapsed)
+                results[f'{mode}.journal'] = state.storage.stats()
+            finally:
+                state.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    
+    for name, stats in results.items():
+        if 'p50_ms' in stats:
+            print(f"{name:<42} {stats['count']:6d}  p50 {stats['p50_ms']:9.3f} ms  "
+                  f"p99 {stats['p99_ms']:9.3f} ms  {stats['ops_per_s']:10.1f} req/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'parameters': vars(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Micro-benchmark for enrollment membership, add and remove
+
+Enrolls 100k students across 2k courses, then times membership checks,
+drops and course removal. Run with `python -m benchmarks.bench_enrollment`.
+"""
+import argparse
+import random
+import time
+
+from auth import make_hash
+from models import Course, Student, EnrollmentSystem
+
+# One precomputed hash, so setup does not run the KDF for every student
+PASSWORD = make_hash("pass")
+
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s  {elapsed / max(count, 1) * 1e6:8.2f} us/op  ({count} ops)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=100_000)
+    parser.add_argument('--courses', type=int, default=2_000)
+    parser.add_argument('--per-student', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    system = EnrollmentSystem()
+    
+    for i in range(args.courses):
+        system.add_course(Course(f"C{i:05d}", f"Course {i}", "Instructor", "MWF 9:00-10:30", 0))
+    for i in range(args.students):
+        system.restore_student(Student(f"S{i:06d}", f"Student {i}", 7 + i % 6, PASSWORD))
+    
+    courses = system.list_all_courses()
+    students = system.list_all_students()
+    pairs = [(student, course) for student in students
+             for course in rng.sample(courses, args.per_student)]
+    
+    # Size each course so every requested enrollment fits exactly
+    for _, course in pairs:
+        course.capacity += 1
+    
+    def enroll_all():
+        for student, course in pairs:
+            student.enroll(course)
+    
+    def check_all():
+        for student, course in pairs:
+            assert student in course.enrolled_students
+            assert course in student.enrolled_courses
+    
+    def seats_all():
+        for course in courses:
+            course.is_full()
+            course.get_available_seats()
+    
+    dropped = rng.sample(pairs, len(pairs) // 10)
+    
+    def drop_some():
+        for student, course in dropped:
+            student.drop(course)
+    
+    removed = [course.course_id for course in rng.sample(courses, args.courses // 10)]
+    
+    def remove_some():
+        for course_id in removed:
+            system.remove_course(course_id)
+    
+    print(f"{args.students} students, {args.courses} courses, {len(pairs)} enrollments")
+    timed("enroll", enroll_all, len(pairs))
+    timed("membership (both sides)", check_all, len(pairs) * 2)
+    timed("is_full + available seats", seats_all, len(courses) * 2)
+    timed("drop", drop_some, len(dropped))
+    timed("remove_course", remove_some, len(removed))
+
+
+if __name__ == '__main__':
+    main()
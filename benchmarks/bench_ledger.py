@@ -0,0 +1,72 @@
+"""Benchmark the columnar finance ledger reports on millions of rows
+
+Fills a Ledger with synthetic transactions and times each report, plus a
+plain Python loop computing the same balances for comparison. Requires
+NumPy. Run with `python -m benchmarks.bench_ledger`.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ledger import Ledger, CHARGE, PAYMENT, NO_METHOD
+
+
+class SyntheticStudent:
+    def __init__(self, student_id, grade_level):
+        self.student_id = student_id
+        self.grade_level = grade_level
+        # Nothing archived, so no balance is carried forward
+        self.opening_balance = 0.0
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<28} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--students', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    ledger = Ledger()
+    for i in range(args.students):
+        ledger._index_student(SyntheticStudent(f"S{i:06d}", 7 + i % 6))
+    for method in ("Cash", "Bank Transfer", "Credit Card"):
+        ledger._method_index[method] = len(ledger.methods)
+        ledger.methods.append(method)
+    
+    start_time = 1_700_000_000
+    student = rng.integers(0, args.students, args.rows, dtype=np.int32)
+    type = np.where(rng.random(args.rows) < 0.6, CHARGE, PAYMENT).astype(np.int8)
+    amount = np.where(type == CHARGE, 500.0, rng.integers(1, 400, args.rows).astype(np.float64))
+    timestamp = start_time + rng.integers(0, 365 * 86400, args.rows)
+    method = np.where(type == PAYMENT, rng.integers(0, 3, args.rows), NO_METHOD).astype(np.int16)
+    timed("extend", lambda: ledger.extend(student, amount, type, timestamp, method))
+    print(f"{len(ledger)} rows, {args.students} students")
+    
+    timed("balances", ledger.balances)
+    timed("total outstanding", ledger.total_outstanding)
+    timed("balances by grade", ledger.balances_by_grade)
+    timed("payments by method per day", ledger.payments_by_method_per_day)
+    timed("aging buckets", lambda: ledger.aging_buckets(start_time + 365 * 86400))
+    
+    rows = list(zip(student.tolist(), amount.tolist(), type.tolist()))
+    
+    def python_balances():
+        balances = [0.0] * args.students
+        for index, value, kind in rows:
+            balances[index] += value if kind == CHARGE else -value
+        return balances
+    
+    timed("balances (Python loop)", python_balances)
+
+
+if __name__ == '__main__':
+    main()
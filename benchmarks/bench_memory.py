@@ -0,0 +1,106 @@
+"""Memory benchmark for students with long transaction histories
+
+Builds 50k students with 40 transactions each, once with the slotted
+models and compact Transaction records and once with the plain dict
+records the models used to keep, and reports the traced allocation of
+each. A third run moves the whole history into the ledger archive, as
+for students whose transactions all belong to past terms. Run with
+`python -m benchmarks.bench_memory`.
+"""
+import argparse
+import gc
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from archive import LedgerArchive
+from models import Student, Transaction, EnrollmentSystem, EPOCH
+
+
+class DictStudent:
+    """Stand-in for the old __dict__-based Student with dict transactions"""
+    
+    def __init__(self, student_id, name, grade_level, password):
+        self.student_id = student_id
+        self.name = name
+        self.grade_level = grade_level
+        self.password = password
+        self.enrolled_courses = {}
+        self.balance = 0
+        self.transactions = []
+
+
+DESCRIPTIONS = [f"Enrollment fee for Course {i}" for i in range(40)] + \
+    ["Payment via Cash", "Payment via Bank Transfer", "Payment via Credit Card"]
+
+
+def history(rng, count):
+    """Yield (timestamp, description, amount, type) tuples for one student"""
+    timestamp = 1_700_000_000
+    for _ in range(count):
+        timestamp += rng.randrange(60, 86_400)
+        if rng.random() < 0.6:
+            yield timestamp, rng.choice(DESCRIPTIONS[:40]), 500, "charge"
+        else:
+            yield timestamp, rng.choice(DESCRIPTIONS[40:]), rng.randrange(1, 500), "payment"
+
+
+def build(compact, students, per_student, seed):
+    rng = random.Random(seed)
+    population = []
+    for i in range(students):
+        if compact:
+            student = Student(f"S{i:06d}", f"Student {i}", 7 + i % 6, "pass")
+            student.transactions = [Transaction(timestamp, description, amount, type)
+                                    for timestamp, description, amount, type in history(rng, per_student)]
+        else:
+            student = DictStudent(f"S{i:06d}", f"Student {i}", 7 + i % 6, "pass")
+            student.transactions = [{
+                # Build fresh strings, as json.load and strftime did
+                "date": (EPOCH.fromtimestamp(timestamp)).strftime("%Y-%m-%d %H:%M:%S"),
+                "description": "".join(description),
+                "amount": amount,
+                "type": "".join(type)
+            } for timestamp, description, amount, type in history(rng, per_student)]
+        population.append(student)
+    return population
+
+
+def measure(mode, args):
+    gc.collect()
+    tracemalloc.start()
+    population = build(mode != 'dict', args.students, args.transactions, args.seed)
+    if mode == 'archived':
+        archive_dir = tempfile.mkdtemp()
+        try:
+            system = EnrollmentSystem()
+            system.students = {student.student_id: student for student in population}
+            LedgerArchive(archive_dir).archive(system, int(time.time()))
+            del system
+            gc.collect()
+        finally:
+            shutil.rmtree(archive_dir)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del population
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50_000)
+    parser.add_argument('--transactions', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+    
+    records = args.students * args.transactions
+    print(f"{args.students} students x {args.transactions} transactions = {records} records")
+    for label, mode in (("dict records", 'dict'), ("slotted + compact", 'compact'), ("archived", 'archived')):
+        size = measure(mode, args)
+        print(f"{label:<20} {size / 2**20:8.1f} MiB  {size / records:6.1f} bytes/record")
+
+
+if __name__ == '__main__':
+    main()
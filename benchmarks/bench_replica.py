@@ -0,0 +1,103 @@
+"""Time replicas and how reports over them affect enrollment throughput
+
+Builds a synthetic institution, times a first replica and one taken after
+a few changes, then runs a stream of enroll and drop operations from
+several threads, alone and while another thread keeps exporting the
+enrollments and every roster, from a fresh replica per export and from
+replicas shared for --max-age seconds. Run with
+`python -m benchmarks.bench_replica`.
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.synthetic import generate_institution
+from replica import enrollment_rows, roster_rows
+
+
+def run_operations(system, operations, threads):
+    def run(share):
+        for student_id, course_id in share:
+            if system.enroll(student_id, course_id):
+                system.drop(student_id, course_id)
+    
+    workers = [threading.Thread(target=run, args=(operations[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+
+def run_reporting(system, operations, threads, max_age):
+    """Run the operations while another thread keeps exporting
+    
+    The exporter takes a fresh replica once the last is max_age seconds
+    old, as AppState.replica() does; 0 takes one for every export.
+    
+    Returns:
+        tuple: Seconds the operations took and exports run meanwhile
+    """
+    stop = threading.Event()
+    exports = []
+    
+    def report():
+        replica, taken_at = None, None
+        while not stop.is_set():
+            if replica is None or time.monotonic() - taken_at > max_age:
+                replica, taken_at = system.snapshot(), time.monotonic()
+            enrollment_rows(replica)
+            for course_id in replica.courses:
+                roster_rows(replica, course_id)
+            exports.append(None)
+    
+    reporter = threading.Thread(target=report)
+    reporter.start()
+    try:
+        elapsed = run_operations(system, operations, threads)
+    finally:
+        stop.set()
+        reporter.join()
+    return elapsed, len(exports)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--courses', type=int, default=400)
+    parser.add_argument('--operations', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--max-age', type=float, default=1.0,
+                        help="Seconds exports share a replica in the shared run")
+    args = parser.parse_args()
+    
+    system = generate_institution(args.students, args.courses, transactions_per_student=10, seed=args.seed)
+    rng = random.Random(args.seed)
+    student_ids = list(system.students)
+    course_ids = list(system.courses)
+    operations = [(rng.choice(student_ids), rng.choice(course_ids)) for _ in range(args.operations)]
+    
+    started = time.perf_counter()
+    system.snapshot()
+    first = time.perf_counter() - started
+    run_operations(system, operations[:100], 1)
+    started = time.perf_counter()
+    system.snapshot()
+    incremental = time.perf_counter() - started
+    print(f"{args.students} students, {args.courses} courses")
+    print(f"first replica       {first * 1000:8.2f} ms")
+    print(f"after 100 changes   {incremental * 1000:8.2f} ms")
+    
+    alone = run_operations(system, operations, args.threads)
+    fresh, fresh_exports = run_reporting(system, operations, args.threads, 0)
+    shared, shared_exports = run_reporting(system, operations, args.threads, args.max_age)
+    
+    for name, elapsed in (('alone', alone), ('fresh replicas', fresh), ('shared replicas', shared)):
+        print(f"enroll/drop {name:<16} {elapsed:8.3f}s  {len(operations) / elapsed:10.1f} ops/s")
+    print(f"exports run         {fresh_exports:8d} fresh, {shared_exports} shared")
+
+if __name__ == '__main__':
+    main()
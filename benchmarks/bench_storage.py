@@ -0,0 +1,102 @@
+"""Compare storage backends on enroll/drop/pay throughput
+
+Builds a synthetic institution, writes it with each backend into a
+temporary directory, then times a stream of enroll, payment and drop
+operations persisted through that backend. The legacy mode rewrites the
+full JSON snapshot after every operation, as the app used to; the dirty
+shards mode also saves after every operation but writes only the shards
+that changed. Run with `python -m benchmarks.bench_storage`.
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import PASSWORD, course_schedule
+from data_persistence import save_data
+from models import Course, Student, EnrollmentSystem
+from storage import get_storage
+
+
+def build_system(students, courses, seed):
+    rng = random.Random(seed)
+    system = EnrollmentSystem()
+    for i in range(courses):
+        system.add_course(Course(f"C{i:05d}", f"Course {i}", "Instructor", course_schedule(i), students))
+    for i in range(students):
+        system.restore_student(Student(f"S{i:06d}", f"Student {i}", 7 + i % 6, PASSWORD))
+    # Give everyone some history so snapshots have realistic weight
+    course_ids = list(system.courses)
+    for student_id in system.students:
+        for course_id in rng.sample(course_ids, 3):
+            system.enroll(student_id, course_id)
+    return system
+
+
+def run_operations(system, operations, after_each=None):
+    started = time.perf_counter()
+    for op, student_id, course_id in operations:
+        if op == 'enroll':
+            system.enroll(student_id, course_id)
+        elif op == 'pay':
+            system.make_payment(student_id, 100, "Cash")
+        else:
+            system.drop(student_id, course_id)
+        if after_each:
+            after_each()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5_000)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--operations', type=int, default=2_000)
+    parser.add_argument('--legacy-operations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    student_ids = [f"S{i:06d}" for i in range(args.students)]
+    course_ids = [f"C{i:05d}" for i in range(args.courses)]
+    operations = []
+    for _ in range(args.operations // 3):
+        student_id = rng.choice(student_ids)
+        course_id = rng.choice(course_ids)
+        operations += [('enroll', student_id, course_id), ('pay', student_id, None), ('drop', student_id, course_id)]
+    
+    results = []
+    for backend in ('json', 'sqlite'):
+        system = build_system(args.students, args.courses, args.seed)
+        data_dir = tempfile.mkdtemp()
+        try:
+            storage = get_storage(backend, data_dir)
+            storage.save(system)
+            storage.attach(system)
+            elapsed = run_operations(system, operations)
+            storage.close()
+        finally:
+            shutil.rmtree(data_dir)
+        results.append((backend, len(operations), elapsed))
+    
+    # Old behaviour: full snapshot rewrite after every mutation, then the
+    # same with snapshots that rewrite only the changed shards
+    legacy = operations[:args.legacy_operations]
+    for name, full in (('json full snapshot', True), ('json dirty shards', False)):
+        system = build_system(args.students, args.courses, args.seed)
+        data_dir = tempfile.mkdtemp()
+        try:
+            save_data(system, data_dir)
+            elapsed = run_operations(system, legacy, lambda: save_data(system, data_dir, full=full))
+        finally:
+            shutil.rmtree(data_dir)
+        results.append((name, len(legacy), elapsed))
+    
+    print(f"{args.students} students, {args.courses} courses")
+    for name, count, elapsed in results:
+        print(f"{name:<20} {count:6d} ops {elapsed:8.3f}s  {count / elapsed:10.1f} ops/s")
+
+
+if __name__ == '__main__':
+    main()
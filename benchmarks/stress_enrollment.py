@@ -0,0 +1,93 @@
+"""Stress test for concurrent enrollment against one nearly-full course
+
+Many threads race for the last few seats of a single course while other
+threads enroll in unrelated courses and make payments. Afterwards the
+script checks that the course was never overbooked and that every seat,
+roster entry and fee charge agree. Run with
+`python -m benchmarks.stress_enrollment`.
+"""
+import argparse
+import sys
+import threading
+import time
+
+from auth import make_hash
+from models import Course, Student, EnrollmentSystem
+
+# One precomputed hash, so setup does not run the KDF for every student
+PASSWORD = make_hash("pass")
+
+
+class PreemptedCourse(Course):
+    """Course that yields to other threads between the capacity check and the insert"""
+    
+    def is_full(self):
+        full = super().is_full()
+        time.sleep(0)
+        return full
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--seats-left', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    
+    # Switch threads as often as possible to widen any race window
+    sys.setswitchinterval(1e-6)
+    
+    failures = 0
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        system = EnrollmentSystem()
+        hot = PreemptedCourse("HOT", "Popular Course", "Instructor", "MWF 9:00-10:30", args.threads)
+        system.add_course(hot)
+        for i in range(args.threads):
+            system.add_course(Course(f"C{i}", f"Course {i}", "Instructor", "TTh 9:00-10:30", 1))
+        
+        # Fill the hot course up to the last few seats
+        for i in range(args.threads - args.seats_left):
+            filler = Student(f"F{i}", f"Filler {i}", 12, PASSWORD)
+            system.restore_student(filler)
+            system.enroll(filler.student_id, "HOT")
+        
+        racers = [Student(f"S{i}", f"Student {i}", 12, PASSWORD) for i in range(args.threads)]
+        for student in racers:
+            system.restore_student(student)
+        
+        barrier = threading.Barrier(args.threads)
+        
+        def race(index):
+            student_id = racers[index].student_id
+            barrier.wait()
+            system.enroll(student_id, "HOT")
+            system.enroll(student_id, f"C{index}")
+            system.make_payment(student_id, 100, "Cash")
+            system.drop(student_id, f"C{index}")
+            system.enroll(student_id, f"C{index}")
+        
+        threads = [threading.Thread(target=race, args=(i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        winners = [s for s in racers if hot in s.enrolled_courses]
+        consistent = (
+            len(hot.enrolled_students) <= hot.capacity
+            and len(winners) == args.seats_left
+            and all(s in hot.enrolled_students for s in winners)
+            and all(s.balance == sum(t.amount if t.type == 'charge' else -t.amount
+                                     for t in s.transactions) for s in racers)
+        )
+        if not consistent:
+            failures += 1
+    
+    elapsed = time.perf_counter() - started
+    print(f"{args.rounds} rounds x {args.threads} threads in {elapsed:.2f}s, {failures} inconsistent rounds")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
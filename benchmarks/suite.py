@@ -0,0 +1,258 @@
+"""Benchmark suite for persistence, model operations and Flask routes
+
+Generates a synthetic institution into a temporary data directory, then
+times load_data/save_data, EnrollmentSystem operations, the Flask routes
+through the test client and the same routes under concurrent clients.
+Results are written as JSON so runs of different versions can be diffed.
+Run with `python -m benchmarks.suite --output results.json`.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from app import create_app
+from benchmarks.synthetic import generate_institution
+from data_persistence import load_data, save_data
+from models import EnrollmentSystem
+
+
+def summarize(latencies, elapsed=None):
+    """Latency statistics in milliseconds, plus throughput"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    if not count:
+        return {'count': 0}
+    total = sum(latencies)
+    elapsed = elapsed if elapsed is not None else total
+    
+    def percentile(fraction):
+        return latencies[min(count - 1, int(fraction * count))] * 1000
+    
+    return {
+        'count': count,
+        'total_s': total,
+        'mean_ms': total / count * 1000,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': latencies[-1] * 1000,
+        'ops_per_s': count / elapsed if elapsed else None,
+    }
+
+
+def timed_calls(func, args_list):
+    """Call func(*args) for each args tuple and return the latencies"""
+    latencies = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_persistence(system, data_dir, repeat):
+    results = {}
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        written = save_data(system, data_dir, full=True)
+        latencies.append(time.perf_counter() - started)
+    results['save_data'] = dict(summarize(latencies), bytes=written)
+    
+    # A save after one student in a hundred changed rewrites only their shards
+    latencies = []
+    students = list(system.students.values())
+    for _ in range(repeat):
+        for student in students[::100]:
+            student.add_transaction(1, "Miscellaneous fee", "charge")
+        started = time.perf_counter()
+        written = save_data(system, data_dir)
+        latencies.append(time.perf_counter() - started)
+    results['save_data.incremental'] = dict(summarize(latencies), bytes=written)
+    
+    latencies = []
+    for _ in range(repeat):
+        loaded = EnrollmentSystem()
+        started = time.perf_counter()
+        load_data(loaded, data_dir)
+        latencies.append(time.perf_counter() - started)
+    results['load_data'] = summarize(latencies)
+    return results, loaded
+
+
+def bench_models(system, operations, rng):
+    """Time in-memory EnrollmentSystem operations, with no storage attached"""
+    student_ids = list(system.students)
+    course_ids = list(system.courses)
+    pairs = [(rng.choice(student_ids), rng.choice(course_ids)) for _ in range(operations)]
+    students = [(system.students[student_id],) for student_id, _ in pairs]
+    
+    return {
+        'model.enroll': summarize(timed_calls(system.enroll, pairs)),
+        'model.drop': summarize(timed_calls(system.drop, pairs)),
+        'model.make_payment': summarize(timed_calls(
+            system.make_payment, [(student_id, 1, "Cash") for student_id, _ in pairs])),
+        'model.course_availability': summarize(timed_calls(system.course_availability, students)),
+        'model.list_students_page': summarize(timed_calls(
+            lambda: system.list_students('name', limit=25), [()] * operations)),
+    }
+
+
+def login_as(client, user_id, user_type):
+    # Set the session directly so the KDF and login rate limiter stay out of the numbers
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_type'] = user_type
+        session['name'] = user_id
+
+
+def route_script(client, student_id, course_id):
+    """One student's visit: dashboard, enroll, pay, finances, drop"""
+    return [
+        ('GET /student/dashboard', lambda: client.get('/student/dashboard')),
+        ('GET /student/enroll', lambda: client.get(f'/student/enroll/{course_id}')),
+        ('POST /student/make_payment', lambda: client.post(
+            '/student/make_payment', data={'amount': '1', 'payment_method': 'Cash'})),
+        ('GET /student/finances', lambda: client.get('/student/finances')),
+        ('GET /student/drop', lambda: client.get(f'/student/drop/{course_id}')),
+    ]
+
+
+def run_visits(client, visits, latencies):
+    for student_id, course_id in visits:
+        login_as(client, student_id, 'student')
+        for name, request in route_script(client, student_id, course_id):
+            started = time.perf_counter()
+            response = request()
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+
+
+def bench_routes(app, system, requests, threads, rng):
+    student_ids = list(system.students)
+    course_ids = list(system.courses)
+    results = {}
+    
+    # Sequential, one client
+    client = app.test_client()
+    latencies = {}
+    visits = [(rng.choice(student_ids), rng.choice(course_ids)) for _ in range(requests)]
+    run_visits(client, visits, latencies)
+    for name, values in latencies.items():
+        results[f'route.{name}'] = summarize(values)
+    
+    login_as(client, 'admin', 'admin')
+    results['route.GET /admin/dashboard'] = summarize(timed_calls(
+        lambda: client.get('/admin/dashboard'), [()] * max(1, requests // 5)))
+    
+    # Concurrent clients, each visiting as different students
+    per_thread = max(1, requests // threads)
+    latencies = {}
+    locks = threading.Lock()
+    errors = []
+    
+    def worker(seed):
+        worker_rng = random.Random(seed)
+        local = {}
+        try:
+            run_visits(app.test_client(),
+                       [(worker_rng.choice(student_ids), worker_rng.choice(course_ids)) for _ in range(per_thread)],
+                       local)
+        except Exception as exc:
+            errors.append(repr(exc))
+        with locks:
+            for name, values in local.items():
+                latencies.setdefault(name, []).extend(values)
+    
+    workers = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"concurrent clients failed: {errors[0]}")
+    
+    for name, values in latencies.items():
+        results[f'concurrent.{name}'] = summarize(values, elapsed)
+    results['concurrent.all'] = summarize([value for values in latencies.values() for value in values], elapsed)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2_000)
+    parser.add_argument('--courses', type=int, default=100)
+    parser.add_argument('--transactions', type=int, default=20, help="Past transactions per student")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs of load_data and save_data")
+    parser.add_argument('--operations', type=int, default=2_000, help="Calls per model operation")
+    parser.add_argument('--requests', type=int, default=200, help="Student visits per route scenario")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    data_dir = tempfile.mkdtemp(prefix='enrollment-bench-')
+    try:
+        started = time.perf_counter()
+        system = generate_institution(args.students, args.courses, args.transactions, seed=args.seed)
+        results = {'generate': {'seconds': time.perf_counter() - started}}
+        
+        persistence, loaded = bench_persistence(system, data_dir, args.repeat)
+        results.update(persistence)
+        results.update(bench_models(loaded, args.operations, rng))
+        
+        # Keep snapshots out of the way so routes time the journal, as in production
+        app = create_app({'DATA_DIR': data_dir, 'STORAGE': 'json',
+                          'SNAPSHOT_DELAY': 3600.0, 'SNAPSHOT_EVERY': 1_000_000})
+        state = app.extensions['enrollment']
+        try:
+            results.update(bench_routes(app, state.system, args.requests, args.threads, rng))
+        finally:
+            state.close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parameters': vars(args),
+        'results': results,
+    }
+    
+    for name, stats in results.items():
+        if 'p50_ms' in stats:
+            print(f"{name:<40} {stats['count']:6d}  p50 {stats['p50_ms']:9.3f} ms  "
+                  f"p95 {stats['p95_ms']:9.3f} ms  {stats['ops_per_s']:10.1f} ops/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
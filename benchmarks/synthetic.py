@@ -0,0 +1,72 @@
+"""Synthetic institutions for the benchmarks"""
+import datetime
+import random
+
+from auth import make_hash
+from models import Course, Student, EnrollmentSystem, DATE_FORMAT
+
+# One precomputed hash, so setup does not run the KDF for every student
+PASSWORD = make_hash("pass")
+
+DAYS = ('M', 'T', 'W', 'Th', 'F', 'S', 'Su')
+MEETING_MINUTES = 50
+SLOTS_PER_DAY = 24 * 60 // MEETING_MINUTES
+
+
+def course_schedule(index):
+    """A weekly meeting no other course index shares
+    
+    Synthetic enrollments then never hit a schedule conflict. Past the
+    number of distinct slots courses get a free-form schedule, which is
+    never checked.
+    """
+    if index >= len(DAYS) * SLOTS_PER_DAY:
+        return "TBA"
+    day, slot = index % len(DAYS), index // len(DAYS)
+    start, end = slot * MEETING_MINUTES, (slot + 1) * MEETING_MINUTES
+    return f"{DAYS[day]} {start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}"
+
+
+def generate_institution(students, courses, transactions_per_student=0, enrollments_per_student=3,
+                         capacity=None, seed=0):
+    """Build an EnrollmentSystem with synthetic courses, students and history
+    
+    Args:
+        students (int): Number of students
+        courses (int): Number of courses
+        transactions_per_student (int): Past charges and payments per student
+        enrollments_per_student (int): Courses each student is enrolled in
+        capacity (int, optional): Seats per course; defaults to room for
+            every enrollment plus a quarter to spare
+        seed (int): Random seed
+    
+    Returns:
+        EnrollmentSystem: The populated system, with an admin 'admin'
+    """
+    rng = random.Random(seed)
+    if capacity is None:
+        capacity = max(1, students * enrollments_per_student * 5 // (4 * max(courses, 1)))
+    
+    system = EnrollmentSystem()
+    for i in range(courses):
+        system.add_course(Course(f"C{i:05d}", f"Course {i}", f"Instructor {i % 50}",
+                                 course_schedule(i), capacity, 1000 + 100 * (i % 5)))
+    for i in range(students):
+        system.restore_student(Student(f"S{i:06d}", f"Student {i}", 7 + i % 6, PASSWORD))
+    system.restore_admin("admin", "Administrator", PASSWORD)
+    
+    course_ids = list(system.courses)
+    start = datetime.datetime.now() - datetime.timedelta(days=365)
+    for student in system.students.values():
+        for course_id in rng.sample(course_ids, min(enrollments_per_student, len(course_ids))):
+            system.enroll(student.student_id, course_id)
+        # History spread over the past year, oldest first, alternating charges and payments
+        minutes = sorted(rng.sample(range(365 * 24 * 60), transactions_per_student))
+        for j, minute in enumerate(minutes):
+            date = (start + datetime.timedelta(minutes=minute)).strftime(DATE_FORMAT)
+            if j % 2 == 0:
+                student.add_transaction(500, "Miscellaneous fee", "charge", date)
+            else:
+                student.add_transaction(250, rng.choice(("Payment via Cash", "Payment via GCash", "Payment via Card")),
+                                        "payment", date)
+    return system
@@ -1,130 +1,1153 @@
-import json
-import os
-from datetime import datetime
-from models import Course, Student
-
-class DataEncoder(json.JSONEncoder):
-    """Custom JSON encoder to handle objects"""
-    def default(self, obj):
-        if hasattr(obj, '__dict__'):
-            # Convert object to dictionary
-            obj_dict = obj.__dict__.copy()
-            
-            # Handle circular references
-            if 'enrolled_students' in obj_dict:
-                obj_dict['enrolled_students'] = [student.student_id for student in obj_dict['enrolled_students']]
-            
-            if 'enrolled_courses' in obj_dict:
-                obj_dict['enrolled_courses'] = [course.course_id for course in obj_dict['enrolled_courses']]
-            
-            return obj_dict
-        return super().default(obj)
-
-def save_data(enrollment_system, data_dir='data'):
-    """Save enrollment system data to JSON files"""
-    # Create data directory if it doesn't exist
-    os.makedirs(data_dir, exist_ok=True)
-    
-    # Save courses
-    with open(os.path.join(data_dir, 'courses.json'), 'w') as f:
-        json.dump(list(enrollment_system.courses.values()), f, cls=DataEncoder, indent=2)
-    
-    # Save students
-    with open(os.path.join(data_dir, 'students.json'), 'w') as f:
-        json.dump(list(enrollment_system.students.values()), f, cls=DataEncoder, indent=2)
-    
-    # Save admins
-    with open(os.path.join(data_dir, 'admins.json'), 'w') as f:
-        json.dump(enrollment_system.admins, f, indent=2)
-    
-    # Save timestamp
-    with open(os.path.join(data_dir, 'last_save.txt'), 'w') as f:
-        f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-def load_data(enrollment_system, data_dir='data'):
-    """Load enrollment system data from JSON files"""
-    # Check if data directory exists
-    if not os.path.exists(data_dir):
-        return False
-    
-    try:
-        # Load courses
-        if os.path.exists(os.path.join(data_dir, 'courses.json')):
-            with open(os.path.join(data_dir, 'courses.json'), 'r') as f:
-                courses_data = json.load(f)
-                
-                # Clear existing courses
-                enrollment_system.courses = {}
-                
-                # Create course objects
-                for course_data in courses_data:
-                    course = Course(
-                        course_data['course_id'],
-                        course_data['name'],
-                        course_data['instructor'],
-                        course_data['schedule'],
-                        course_data['capacity']
-                    )
-                    enrollment_system.courses[course.course_id] = course
-        
-        # Load students
-        if os.path.exists(os.path.join(data_dir, 'students.json')):
-            with open(os.path.join(data_dir, 'students.json'), 'r') as f:
-                students_data = json.load(f)
-                
-                # Clear existing students
-                enrollment_system.students = {}
-                
-                # Create student objects
-                for student_data in students_data:
-                    student = Student(
-                        student_data['student_id'],
-                        student_data['name'],
-                        student_data['grade_level'],
-                        student_data['password']
-                    )
-                    
-                    # Set financial attributes if they exist in the loaded data
-                    if 'balance' in student_data:
-                        student.balance = student_data['balance']
-                    if 'transactions' in student_data:
-                        student.transactions = student_data['transactions']
-                        
-                    enrollment_system.students[student.student_id] = student
-        
-        # Load admins
-        if os.path.exists(os.path.join(data_dir, 'admins.json')):
-            with open(os.path.join(data_dir, 'admins.json'), 'r') as f:
-                enrollment_system.admins = json.load(f)
-        
-        # Restore relationships
-        if os.path.exists(os.path.join(data_dir, 'courses.json')) and os.path.exists(os.path.join(data_dir, 'students.json')):
-            with open(os.path.join(data_dir, 'courses.json'), 'r') as f:
-                courses_data = json.load(f)
-                
-                # Restore enrolled_students in courses
-                for course_data in courses_data:
-                    course = enrollment_system.courses.get(course_data['course_id'])
-                    if course:
-                        for student_id in course_data['enrolled_students']:
-                            student = enrollment_system.students.get(student_id)
-                            if student:
-                                course.enrolled_students.append(student)
-            
-            with open(os.path.join(data_dir, 'students.json'), 'r') as f:
-                students_data = json.load(f)
-                
-                # Restore enrolled_courses in students
-                for student_data in students_data:
-                    student = enrollment_system.students.get(student_data['student_id'])
-                    if student:
-                        for course_id in student_data['enrolled_courses']:
-                            course = enrollment_system.courses.get(course_id)
-                            if course:
-                                student.enrolled_courses.append(course)
-        
-        return True
-    
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return False
\ No newline at end of file
+import codecs
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from metrics import PERSISTENCE_SECONDS, replaying
+from models import Course, Student, EnrollmentSystem, Transaction
+
+JOURNAL_FILE = 'journal.log'
+MANIFEST_FILE = 'manifest.json'
+SNAPSHOT_FILES = ('courses', 'students', 'admins')
+COURSE_ORDER_FILE = 'course_order'
+
+# Courses and students are written in shards of about this many records; a
+# save rewrites only the shards holding a changed record
+RECORDS_PER_SHARD = 64
+MAX_SHARDS = 4096
+
+# Serializes snapshot writers so two saves can never interleave their files
+_save_lock = threading.Lock()
+
+# Time spent per persistence stage, for the admin metrics endpoint
+_encode_timer = PERSISTENCE_SECONDS.labels(stage='snapshot_encode')
+_write_timer = PERSISTENCE_SECONDS.labels(stage='snapshot_write')
+_append_timer = PERSISTENCE_SECONDS.labels(stage='journal_append')
+_compact_timer = PERSISTENCE_SECONDS.labels(stage='compaction')
+_load_timer = PERSISTENCE_SECONDS.labels(stage='load')
+
+
+class SnapshotError(Exception):
+    """Raised when snapshot files exist but no generation passes verification"""
+
+
+class DataEncoder(json.JSONEncoder):
+    """Custom JSON encoder to handle objects"""
+    def default(self, obj):
+        if isinstance(obj, Transaction):
+            return obj.to_dict()
+        
+        if hasattr(obj, '__slots__') or hasattr(obj, '__dict__'):
+            # Convert object to dictionary; the models use __slots__ instead of __dict__
+            if hasattr(obj, '__slots__'):
+                # The dirty flag is bookkeeping for the snapshot itself
+                obj_dict = {name: getattr(obj, name) for name in obj.__slots__ if name != 'dirty'}
+            else:
+                obj_dict = obj.__dict__.copy()
+            
+            # Handle circular references
+            if 'enrolled_students' in obj_dict:
+                obj_dict['enrolled_students'] = [student.student_id for student in obj_dict['enrolled_students']]
+            
+            if 'enrolled_courses' in obj_dict:
+                obj_dict['enrolled_courses'] = [course.course_id for course in obj_dict['enrolled_courses']]
+            
+            if 'waitlist' in obj_dict:
+                obj_dict['waitlist'] = [student.student_id for student in obj_dict['waitlist']]
+            
+            return obj_dict
+        return super().default(obj)
+
+def save_data(enrollment_system, data_dir='data', journal_seq=None, full=False):
+    """Save enrollment system data to JSON files
+    
+    The snapshot is written as a new generation: each file goes to a temp
+    file, is fsynced and renamed into place, and only then does the manifest
+    switch over to it. A crash at any point leaves the previous generation
+    intact.
+    
+    Courses and students are split into shards by a hash of their ID. When
+    the system was loaded from or last saved to the current generation in
+    data_dir, only the shards holding a dirty or removed record are encoded
+    and written; the new manifest refers to the previous files for the rest.
+    A file is never rewritten once written, so generations can share it.
+    
+    Args:
+        enrollment_system (EnrollmentSystem): System to snapshot
+        data_dir (str): Directory holding the data files
+        journal_seq (int, optional): Last journal record folded into this
+            snapshot. Records up to this number are skipped on replay.
+        full (bool): Rewrite every shard even if it has not changed
+    
+    Returns:
+        int: Number of bytes written
+    """
+    with _save_lock:
+        try:
+            return _write_snapshot(enrollment_system, data_dir, journal_seq, full)
+        except BaseException:
+            # Dirty flags may have been cleared for files never written
+            enrollment_system.snapshot_base = None
+            raise
+
+def _fsync_dir(path):
+    """Make renames inside a directory durable (not supported on Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _atomic_write(path, data):
+    """Write bytes to path so readers see either the old or the new content"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _read_manifest(data_dir):
+    """Return the current manifest, or None for a legacy/empty data directory"""
+    try:
+        with open(os.path.join(data_dir, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise SnapshotError(f"Unreadable manifest in {data_dir}: {e}")
+
+class _SnapshotBase:
+    """The snapshot generation a system's dirty flags are relative to
+    
+    members[kind][shard] holds the IDs stored in each shard of that
+    generation, so a changed shard is re-encoded without scanning the rest.
+    """
+    __slots__ = ('data_dir', 'generation', 'members')
+    
+    def __init__(self, data_dir, generation, members):
+        self.data_dir = data_dir
+        self.generation = generation
+        self.members = members
+
+def _shard_of(record_id, shards):
+    return zlib.crc32(str(record_id).encode('utf-8')) % shards
+
+def _shard_count(records):
+    shards = 1
+    while shards < MAX_SHARDS and shards * RECORDS_PER_SHARD < records:
+        shards *= 2
+    return shards
+
+def _shard_entries(entry):
+    """File entries of a course or student snapshot, one per shard"""
+    # Generations written before sharding hold a single file
+    return entry if isinstance(entry, list) else [entry]
+
+def _write_snapshot(enrollment_system, data_dir, journal_seq, full, course_order=None):
+    # course_order lists every course ID in catalog order when the system
+    # holds only some of the courses, as when folding the journal
+    
+    # Create data directory if it doesn't exist
+    os.makedirs(data_dir, exist_ok=True)
+    
+    previous = _read_manifest(data_dir)
+    generation = previous['generation'] + 1 if previous else 1
+    if journal_seq is None:
+        journal_seq = previous['journal_seq'] if previous else 0
+    
+    base = enrollment_system.snapshot_base
+    incremental = (not full and previous is not None and base is not None
+                   and base.data_dir == os.path.abspath(data_dir) and base.generation == previous['generation'])
+    removed = set(enrollment_system.removed_courses)
+    
+    files = {}
+    members = {}
+    written = 0
+    write_seconds = 0.0
+    order_changed = not incremental or COURSE_ORDER_FILE not in previous['files']
+    for kind, records in (('courses', enrollment_system.courses), ('students', enrollment_system.students)):
+        records = dict(records)
+        if incremental:
+            entries = list(_shard_entries(previous['files'][kind]))
+            shard_members = base.members[kind]
+            grown = len(entries) < MAX_SHARDS and len(records) > len(entries) * RECORDS_PER_SHARD * 4
+        if not incremental or grown:
+            # First save, or the shards have grown too large: lay them out afresh
+            entries = [None] * _shard_count(len(records))
+            shard_members = [set() for _ in entries]
+            for record_id in records:
+                shard_members[_shard_of(record_id, len(entries))].add(record_id)
+            changed = set(range(len(entries)))
+            order_changed = True
+        else:
+            changed = set()
+            if kind == 'courses':
+                for record_id in removed:
+                    shard = _shard_of(record_id, len(entries))
+                    if record_id in shard_members[shard]:
+                        shard_members[shard].discard(record_id)
+                        changed.add(shard)
+                        order_changed = True
+            for record_id, record in records.items():
+                if record.dirty:
+                    shard = _shard_of(record_id, len(entries))
+                    if record_id not in shard_members[shard]:
+                        shard_members[shard].add(record_id)
+                        order_changed = True
+                    changed.add(shard)
+        
+        # Write this generation's files for the changed shards next to the previous ones
+        for shard in sorted(changed):
+            shard_ids = sorted(record_id for record_id in shard_members[shard] if record_id in records)
+            shard_members[shard] = set(shard_ids)
+            shard_records = [records[record_id] for record_id in shard_ids]
+            with _encode_timer.time():
+                for record in shard_records:
+                    # Cleared first, so a change made while encoding marks it again
+                    record.dirty = False
+                data = json.dumps(shard_records, cls=DataEncoder, indent=2).encode('utf-8')
+            filename = f"{kind}.s{shard:04d}.{generation:06d}.json"
+            write_started = time.perf_counter()
+            _atomic_write(os.path.join(data_dir, filename), data)
+            write_seconds += time.perf_counter() - write_started
+            entries[shard] = {'file': filename, 'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data),
+                              'records': len(shard_records)}
+            written += len(data)
+        files[kind] = entries
+        members[kind] = shard_members
+    
+    # Shards lose the catalog order, so it is kept alongside them; the admins are few
+    extra = {'admins': lambda: json.dumps(enrollment_system.admins, indent=2)}
+    if order_changed:
+        extra[COURSE_ORDER_FILE] = lambda: json.dumps(list(enrollment_system.courses) if course_order is None
+                                                      else course_order)
+    else:
+        files[COURSE_ORDER_FILE] = previous['files'][COURSE_ORDER_FILE]
+    for name, encode in extra.items():
+        with _encode_timer.time():
+            data = encode().encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if previous and previous['files'].get(name, {}).get('sha256') == digest:
+            files[name] = previous['files'][name]
+            continue
+        filename = f"{name}.{generation:06d}.json"
+        write_started = time.perf_counter()
+        _atomic_write(os.path.join(data_dir, filename), data)
+        write_seconds += time.perf_counter() - write_started
+        files[name] = {'file': filename, 'sha256': digest, 'size': len(data)}
+        written += len(data)
+    write_started = time.perf_counter()
+    _fsync_dir(data_dir)
+    
+    # Switching the manifest is the commit point of the snapshot
+    saved_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    manifest = {'generation': generation, 'saved_at': saved_at, 'journal_seq': journal_seq, 'files': files}
+    if previous:
+        manifest['previous'] = {key: value for key, value in previous.items() if key != 'previous'}
+    manifest_data = json.dumps(manifest, indent=2).encode('utf-8')
+    _atomic_write(os.path.join(data_dir, MANIFEST_FILE), manifest_data)
+    _fsync_dir(data_dir)
+    
+    # Save timestamp
+    _atomic_write(os.path.join(data_dir, 'last_save.txt'), saved_at.encode('utf-8'))
+    _write_timer.observe(write_seconds + time.perf_counter() - write_started)
+    
+    enrollment_system.snapshot_base = _SnapshotBase(os.path.abspath(data_dir), generation, members)
+    enrollment_system.removed_courses -= removed
+    
+    # Keep the files of the current and previous generations only
+    keep = _manifest_files(manifest)
+    for name in os.listdir(data_dir):
+        parts = name.split('.')
+        if len(parts) in (3, 4) and parts[0] in SNAPSHOT_FILES + (COURSE_ORDER_FILE,) and parts[-2].isdigit() \
+                and parts[-1] == 'json' and name not in keep:
+            os.remove(os.path.join(data_dir, name))
+    
+    return written + len(manifest_data)
+
+def _manifest_files(manifest):
+    """Names of every file a manifest and its previous generation refer to"""
+    names = set()
+    for candidate in (manifest, manifest.get('previous')):
+        if candidate is None:
+            continue
+        for entry in candidate['files'].values():
+            names.update(shard['file'] for shard in _shard_entries(entry))
+    return names
+
+def load_data(enrollment_system, data_dir='data', stats=None):
+    """Load the JSON snapshot and replay the journal tail on top of it
+    
+    Args:
+        enrollment_system (EnrollmentSystem): System to populate
+        data_dir (str): Directory holding the data files
+        stats (dict, optional): Filled with record counts and the load time
+    
+    Returns:
+        bool: True if data was loaded, False if data_dir holds no snapshot,
+            manifest or journal at all
+    
+    Raises:
+        SnapshotError: If data files exist but cannot be read or replayed,
+            so callers do not mistake corruption for an empty database
+    """
+    started = time.perf_counter()
+    counts = _load_snapshot(enrollment_system, data_dir)
+    if counts is None:
+        if not _journal_paths(data_dir):
+            return False
+        # Changes journaled before the first snapshot was written
+        counts = {'courses': 0, 'students': 0, 'transactions': 0, 'generation': 0, 'journal_seq': 0}
+    
+    try:
+        counts['journal_seq'], counts['journal_records'] = _replay_journal(
+            enrollment_system, data_dir, counts['journal_seq'])
+    except SnapshotError:
+        raise
+    except Exception as e:
+        raise SnapshotError(f"Error replaying the journal in {data_dir}: {e}") from e
+    if counts['journal_records']:
+        # Replayed records may have added courses, students and transactions
+        counts['courses'] = len(enrollment_system.courses)
+        counts['students'] = len(enrollment_system.students)
+        counts['transactions'] = sum(len(student.transactions) for student in enrollment_system.students.values())
+    
+    enrollment_system.rebuild_indexes()
+    
+    seconds = time.perf_counter() - started
+    _load_timer.observe(seconds)
+    if stats is not None:
+        stats.update(counts)
+        stats['seconds'] = seconds
+    return True
+
+def _iter_json_array(path, chunk_size=65536, hasher=None):
+    """Yield the elements of a top-level JSON array one at a time
+    
+    The file is read in chunks and each element is decoded as soon as it is
+    complete, so the whole list never has to sit in memory at once. If a
+    hasher is given it is fed every byte of the file.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+        
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{path} does not contain a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    # Hash whatever follows the array as well
+                    if hasher is not None:
+                        for chunk in iter(lambda: f.read(chunk_size), b''):
+                            hasher.update(chunk)
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                # Only trust an element once its closing separator is buffered,
+                # so a number split across chunks is not cut short
+                if end is not None:
+                    after = end
+                    while after < len(buffer) and buffer[after] in ' \t\r\n':
+                        after += 1
+                    if eof or (after < len(buffer) and buffer[after] in ',]'):
+                        yield item
+                        pos = end
+                        continue
+            elif eof:
+                raise ValueError(f"Unexpected end of file in {path}")
+            
+            # Need more input: drop consumed text and read the next chunk
+            chunk = f.read(chunk_size)
+            if hasher is not None:
+                hasher.update(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+
+def _load_snapshot(enrollment_system, data_dir):
+    """Load the newest snapshot generation that passes verification
+    
+    Returns:
+        dict: Record counts plus the generation and journal position that
+            was loaded, or None if there is no snapshot at all
+    
+    Raises:
+        SnapshotError: If snapshot files exist but none can be loaded
+    """
+    # Check if data directory exists
+    if not os.path.isdir(data_dir):
+        return None
+    
+    manifest = _read_manifest(data_dir)
+    if manifest is None:
+        # Data written before manifests existed
+        files = {name: {'file': f"{name}.json"} for name in SNAPSHOT_FILES}
+        if not any(os.path.exists(os.path.join(data_dir, entry['file'])) for entry in files.values()):
+            if _snapshot_files(data_dir):
+                raise SnapshotError(f"Snapshot files in {data_dir} have no manifest")
+            return None
+        try:
+            counts = _load_files(enrollment_system, data_dir, files, verify=False)
+        except Exception as e:
+            raise SnapshotError(f"Unreadable snapshot in {data_dir}: {e}") from e
+        counts.update(generation=0, journal_seq=0)
+        return counts
+    
+    for candidate in (manifest, manifest.get('previous')):
+        if candidate is None:
+            continue
+        members = {}
+        try:
+            counts = _load_files(enrollment_system, data_dir, candidate['files'], verify=True, members=members)
+        except Exception as e:
+            print(f"Snapshot generation {candidate['generation']} is unusable ({e}), trying the previous one")
+            continue
+        counts.update(generation=candidate['generation'], journal_seq=candidate['journal_seq'])
+        if candidate is manifest:
+            # The records now match the current generation; later saves only
+            # write what changes
+            enrollment_system.snapshot_base = _SnapshotBase(os.path.abspath(data_dir), manifest['generation'],
+                                                            members)
+        return counts
+    
+    raise SnapshotError(f"No snapshot generation in {data_dir} passed verification")
+
+def _load_files(enrollment_system, data_dir, files, verify, members=None, shards=None):
+    """Load one set of snapshot files
+    
+    Each file is streamed once. Relationships are kept as ids while reading
+    and linked to the objects in a single resolve step at the end. Nothing
+    is assigned to the enrollment system until every file has verified.
+    Loaded records start out clean.
+    
+    Args:
+        members (dict, optional): Filled with the IDs read from each shard,
+            as {'courses': [set, ...], 'students': [set, ...]}
+        shards (dict, optional): Numbers of the shards to read, as
+            {'courses': set, 'students': set}; the others are skipped.
+            Records in skipped shards are linked to as bare stand-ins that
+            carry only their ID and are not added to the system.
+    
+    Raises:
+        ValueError: If a checksum does not match or a file cannot be parsed
+    """
+    counts = {'courses': 0, 'students': 0, 'transactions': 0}
+    courses = {}
+    students = {}
+    admins = None
+    course_links = []
+    student_links = []
+    
+    if members is None:
+        members = {}
+    
+    def read_shards(name):
+        # Yield (shard, record data) from every shard file, checking each one
+        members[name] = []
+        for shard, entry in enumerate(_shard_entries(files[name])):
+            members[name].append(set())
+            if shards is not None and shard not in shards[name]:
+                continue
+            hasher = hashlib.sha256() if verify else None
+            yield from ((shard, data) for data in _iter_json_array(os.path.join(data_dir, entry['file']),
+                                                                   hasher=hasher))
+            if verify and hasher.hexdigest() != entry['sha256']:
+                raise ValueError(f"checksum mismatch in {entry['file']}")
+    
+    # Load courses
+    try:
+        for shard, course_data in read_shards('courses'):
+            course = Course(
+                course_data['course_id'],
+                course_data['name'],
+                course_data['instructor'],
+                course_data['schedule'],
+                course_data['capacity'],
+                course_data.get('fee', 1000)
+            )
+            course.dirty = False
+            courses[course.course_id] = course
+            members['courses'][shard].add(course.course_id)
+            course_links.append((course, course_data.get('enrolled_students', []), course_data.get('waitlist', [])))
+    except FileNotFoundError:
+        if verify:
+            raise
+        courses = None
+    
+    # Shards are read in hash order; put the catalog back in its own order
+    if courses is not None and COURSE_ORDER_FILE in files:
+        with open(os.path.join(data_dir, files[COURSE_ORDER_FILE]['file']), 'rb') as f:
+            data = f.read()
+        if verify and hashlib.sha256(data).hexdigest() != files[COURSE_ORDER_FILE]['sha256']:
+            raise ValueError(f"checksum mismatch in {files[COURSE_ORDER_FILE]['file']}")
+        ordered = {course_id: courses.pop(course_id) for course_id in json.loads(data) if course_id in courses}
+        ordered.update(courses)
+        courses = ordered
+    
+    # Load students
+    try:
+        for shard, student_data in read_shards('students'):
+            student = Student(
+                student_data['student_id'],
+                student_data['name'],
+                student_data['grade_level'],
+                student_data['password']
+            )
+            
+            # Set financial attributes if they exist in the loaded data
+            if 'balance' in student_data:
+                student.balance = student_data['balance']
+            if 'transactions' in student_data:
+                student.transactions = [Transaction.from_dict(t) for t in student_data['transactions']]
+                counts['transactions'] += len(student.transactions)
+            if student_data.get('archive'):
+                student.archived_charged = student_data['archived_charged']
+                student.archived_paid = student_data['archived_paid']
+                student.archive = _archive_entries(student_data['archive'])
+            
+            student.dirty = False
+            students[student.student_id] = student
+            members['students'][shard].add(student.student_id)
+            student_links.append((student, student_data.get('enrolled_courses', [])))
+    except FileNotFoundError:
+        if verify:
+            raise
+        students = None
+    
+    # Load admins
+    try:
+        with open(os.path.join(data_dir, files['admins']['file']), 'rb') as f:
+            data = f.read()
+        if verify and hashlib.sha256(data).hexdigest() != files['admins']['sha256']:
+            raise ValueError(f"checksum mismatch in {files['admins']['file']}")
+        admins = json.loads(data)
+    except FileNotFoundError:
+        if verify:
+            raise
+    
+    # Resolve relationships in one pass over the collected ids
+    if courses is not None and students is not None:
+        linked_courses, linked_students = courses, students
+        if shards is not None:
+            linked_courses, linked_students = dict(courses), dict(students)
+            for course, student_ids, waitlist_ids in course_links:
+                for student_id in student_ids + waitlist_ids:
+                    if student_id not in linked_students:
+                        linked_students[student_id] = Student(student_id, '', 0, '')
+            for student, course_ids in student_links:
+                for course_id in course_ids:
+                    if course_id not in linked_courses:
+                        linked_courses[course_id] = Course(course_id, '', '', '', 0)
+        for course, student_ids, waitlist_ids in course_links:
+            for student_id in student_ids:
+                student = linked_students.get(student_id)
+                if student:
+                    course.enrolled_students[student] = None
+            for student_id in waitlist_ids:
+                student = linked_students.get(student_id)
+                if student:
+                    course.waitlist.append(student)
+        for student, course_ids in student_links:
+            for course_id in course_ids:
+                course = linked_courses.get(course_id)
+                if course:
+                    student.enrolled_courses[course] = None
+    
+    if courses is not None:
+        enrollment_system.courses = courses
+        counts['courses'] = len(courses)
+    if students is not None:
+        enrollment_system.students = students
+        counts['students'] = len(students)
+    if admins is not None:
+        enrollment_system.admins = admins
+    
+    return counts
+
+def _snapshot_files(data_dir):
+    """Names of the snapshot generation files in data_dir"""
+    names = []
+    for name in os.listdir(data_dir):
+        parts = name.split('.')
+        if len(parts) in (3, 4) and parts[0] in SNAPSHOT_FILES + (COURSE_ORDER_FILE,) and parts[-1] == 'json':
+            names.append(name)
+    return names
+
+def _snapshot_seq(data_dir):
+    """Return the last journal record folded into the current snapshot"""
+    manifest = _read_manifest(data_dir)
+    return manifest['journal_seq'] if manifest else 0
+
+def _sealed_segments(data_dir):
+    """Return (last_seq, path) for every rotated journal segment, oldest first"""
+    segments = []
+    for name in os.listdir(data_dir):
+        # Sealed segments are named journal.<last seq>.log
+        parts = name.split('.')
+        if len(parts) == 3 and parts[0] == 'journal' and parts[2] == 'log' and parts[1].isdigit():
+            segments.append((int(parts[1]), os.path.join(data_dir, name)))
+    return sorted(segments)
+
+def _read_journal(path):
+    """Yield the records of a journal file, stopping at a torn trailing write
+    
+    Only the last line can be torn by a crash mid-append; a line before it
+    that does not parse means the file is corrupt.
+    
+    Raises:
+        SnapshotError: If a record other than the last one cannot be read
+    """
+    with open(path, 'r') as f:
+        line = f.readline()
+        while line:
+            following = f.readline()
+            try:
+                if not line.endswith('\n'):
+                    raise ValueError("record is not terminated")
+                record = json.loads(line)
+            except ValueError as e:
+                if not following:
+                    # Partial record from a crash mid-append
+                    return
+                raise SnapshotError(f"Corrupt record in journal {path}: {e}")
+            yield record
+            line = following
+
+def _trim_torn_tail(path):
+    """Cut a torn last record off a journal file, so appends start on a fresh line
+    
+    Returns:
+        int: Number of bytes removed
+    """
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = len(data)
+        if end and not data.endswith(b'\n'):
+            end = data.rfind(b'\n') + 1
+        # A complete last line can still be garbage, e.g. from a write that
+        # reached the disk out of order
+        start = data.rfind(b'\n', 0, end - 1) + 1
+        if start < end:
+            try:
+                json.loads(data[start:end])
+            except ValueError:
+                end = start
+        if end == len(data):
+            return 0
+        f.truncate(end)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data) - end
+
+def _journal_paths(data_dir, include_active=True, after_seq=0):
+    """Paths of the sealed journal segments, oldest first, then the active log
+    
+    Segments holding only records up to after_seq are left out.
+    """
+    if not os.path.isdir(data_dir):
+        return []
+    paths = [path for seq, path in _sealed_segments(data_dir) if seq > after_seq]
+    active = os.path.join(data_dir, JOURNAL_FILE)
+    if include_active and os.path.exists(active):
+        paths.append(active)
+    return paths
+
+def _replay_journal(enrollment_system, data_dir, after_seq, include_active=True):
+    """Apply every journal record newer than the loaded snapshot
+    
+    Args:
+        after_seq (int): Last journal record already in the snapshot
+    
+    Returns:
+        tuple: Sequence number of the last record seen and how many
+            records were applied
+    """
+    last_seq = after_seq
+    applied = 0
+    with replaying():
+        for path in _journal_paths(data_dir, include_active, after_seq):
+            for record in _read_journal(path):
+                if record['seq'] <= last_seq:
+                    continue
+                apply_journal_record(enrollment_system, record)
+                last_seq = record['seq']
+                applied += 1
+    
+    return last_seq, applied
+
+def catch_up_journal(enrollment_system, data_dir, after_seq):
+    """Apply the journal records written since a system was loaded
+    
+    Meant for a reader of a data directory that another process writes.
+    Records must follow on without a gap; one is missing when compaction
+    removed it or the log was rotated while being listed.
+    
+    Args:
+        after_seq (int): Last record already applied, e.g. the journal_seq
+            load_data() reported or the previous return value
+    
+    Returns:
+        int: Last record applied, or None if a record is missing; load the
+            data again then
+    """
+    last_seq = after_seq
+    try:
+        with replaying():
+            for path in _journal_paths(data_dir, after_seq=after_seq):
+                for record in _read_journal(path):
+                    if record['seq'] <= last_seq:
+                        continue
+                    if record['seq'] != last_seq + 1:
+                        return None
+                    apply_journal_record(enrollment_system, record)
+                    last_seq = record['seq']
+    except FileNotFoundError:
+        # A segment was compacted away while reading
+        return None
+    return last_seq
+
+def _fold_journal(data_dir):
+    """Fold the sealed journal segments into a new snapshot generation
+    
+    Only the course and student shards holding a record the sealed records
+    name are read, replayed and rewritten; the new manifest refers to the
+    previous files for every other shard. A removed course's roster is read
+    as well, since removing it drops its students. Snapshots written
+    before sharding and shards about to be split are read in full instead.
+    
+    Returns:
+        int: Number of snapshot bytes written, or 0 if there is no snapshot
+            or nothing to fold
+    """
+    with _save_lock:
+        manifest = _read_manifest(data_dir)
+        if manifest is None or COURSE_ORDER_FILE not in manifest['files']:
+            return _fold_journal_in_full(data_dir)
+        
+        after_seq = manifest['journal_seq']
+        records = [record for path in _journal_paths(data_dir, include_active=False, after_seq=after_seq)
+                   for record in _read_journal(path) if record['seq'] > after_seq]
+        if not records:
+            return 0
+        
+        files = manifest['files']
+        ids = {'courses': set(), 'students': set()}
+        added = {'courses': 0, 'students': 0}
+        removed = set()
+        for record in records:
+            if 'course_id' in record:
+                ids['courses'].add(record['course_id'])
+            if 'student_id' in record:
+                ids['students'].add(record['student_id'])
+            if record['op'] == 'add_course':
+                added['courses'] += 1
+            elif record['op'] == 'add_student':
+                added['students'] += 1
+            elif record['op'] == 'remove_course':
+                removed.add(record['course_id'])
+        for kind, entries in files.items():
+            if kind in ids:
+                entries = _shard_entries(entries)
+                stored = sum(entry.get('records', 0) for entry in entries)
+                if stored + added[kind] > len(entries) * RECORDS_PER_SHARD * 4:
+                    # _write_snapshot lays the shards out afresh
+                    return _fold_journal_in_full(data_dir)
+        
+        try:
+            while True:
+                shards = {kind: {_shard_of(record_id, len(_shard_entries(files[kind]))) for record_id in kind_ids}
+                          for kind, kind_ids in ids.items()}
+                snapshot = EnrollmentSystem()
+                members = {}
+                _load_files(snapshot, data_dir, files, verify=True, members=members, shards=shards)
+                roster = {student.student_id for course_id in removed if course_id in snapshot.courses
+                          for student in snapshot.courses[course_id].enrolled_students}
+                if roster <= ids['students']:
+                    break
+                ids['students'] |= roster
+            with open(os.path.join(data_dir, files[COURSE_ORDER_FILE]['file']), 'r') as f:
+                course_order = dict.fromkeys(json.load(f))
+        except Exception as e:
+            print(f"Snapshot generation {manifest['generation']} is unusable ({e}), folding in full")
+            return _fold_journal_in_full(data_dir)
+        
+        snapshot.snapshot_base = _SnapshotBase(os.path.abspath(data_dir), manifest['generation'], members)
+        with replaying():
+            for record in records:
+                apply_journal_record(snapshot, record)
+                if record['op'] == 'add_course':
+                    course_order.setdefault(record['course_id'])
+                elif record['op'] == 'remove_course':
+                    course_order.pop(record['course_id'], None)
+        return _write_snapshot(snapshot, data_dir, records[-1]['seq'], False, course_order=list(course_order))
+
+def _fold_journal_in_full(data_dir):
+    # Called by _fold_journal with _save_lock held
+    snapshot = EnrollmentSystem()
+    counts = _load_snapshot(snapshot, data_dir)
+    if counts is None:
+        return 0
+    folded_seq, _ = _replay_journal(snapshot, data_dir, counts['journal_seq'], include_active=False)
+    return _write_snapshot(snapshot, data_dir, folded_seq, False)
+
+def apply_journal_record(enrollment_system, record):
+    """Re-apply a single journal record to the enrollment system"""
+    op = record['op']
+    
+    if op == 'add_course':
+        enrollment_system.add_course(Course(
+            record['course_id'],
+            record['name'],
+            record['instructor'],
+            record['schedule'],
+            record['capacity'],
+            record.get('fee', 1000)
+        ))
+    elif op == 'remove_course':
+        enrollment_system.remove_course(record['course_id'])
+    elif op == 'add_student':
+        enrollment_system.restore_student(Student(
+            record['student_id'],
+            record['name'],
+            record['grade_level'],
+            record['password']
+        ))
+    elif op in ('enroll', 'drop'):
+        # Restore the relationship only; the fee has its own charge record
+        enrollment_system.restore_enrollment(record['student_id'], record['course_id'], op == 'enroll')
+    elif op in ('waitlist_join', 'waitlist_leave'):
+        enrollment_system.restore_waitlist(record['student_id'], record['course_id'], op == 'waitlist_join')
+    elif op == 'set_password':
+        student = enrollment_system.get_student(record['student_id'])
+        if student:
+            student.password = record['password']
+            student.touch()
+    elif op == 'set_admin_password':
+        admin = enrollment_system.admins.get(record['admin_id'])
+        if admin:
+            admin['password'] = record['password']
+    elif op in ('charge', 'payment'):
+        student = enrollment_system.get_student(record['student_id'])
+        if student:
+            student.add_transaction(record['amount'], record['description'], op, record['date'])
+    elif op == 'archive':
+        enrollment_system.restore_archive(record['student_id'], record['before'], _archive_entries(record['entries']))
+
+def _archive_entries(entries):
+    # Segment names repeat for every student archived in the same run
+    return tuple((term, sys.intern(name), offset, length) for term, name, offset, length in entries)
+
+def journal_records(event, details):
+    """Journal records for one change event published by EnrollmentSystem
+    
+    A batch event gives the records of all of its changes.
+    """
+    if event == 'batch':
+        return [record for name, event_details in details['events']
+                for record in journal_records(name, event_details)]
+    
+    student = details.get('student')
+    course = details.get('course')
+    
+    if event == 'enroll':
+        # The enrollment together with the fee it charged
+        return [
+            {'op': 'enroll', 'student_id': student.student_id, 'course_id': course.course_id},
+            _transaction_record(student, details['transaction'])
+        ]
+    elif event == 'drop':
+        return [{'op': 'drop', 'student_id': student.student_id, 'course_id': course.course_id}]
+    elif event == 'payment':
+        return [_transaction_record(student, details['transaction'])]
+    elif event == 'add_student':
+        return [{
+            'op': 'add_student',
+            'student_id': student.student_id,
+            'name': student.name,
+            'grade_level': student.grade_level,
+            'password': student.password
+        }]
+    elif event == 'add_course':
+        return [{
+            'op': 'add_course',
+            'course_id': course.course_id,
+            'name': course.name,
+            'instructor': course.instructor,
+            'schedule': course.schedule,
+            'capacity': course.capacity,
+            'fee': course.fee
+        }]
+    elif event == 'remove_course':
+        return [{'op': 'remove_course', 'course_id': course.course_id}]
+    elif event in ('waitlist_join', 'waitlist_leave'):
+        return [{'op': event, 'student_id': student.student_id, 'course_id': course.course_id}]
+    elif event == 'set_password':
+        return [{'op': 'set_password', 'student_id': student.student_id, 'password': student.password}]
+    elif event == 'set_admin_password':
+        return [{'op': 'set_admin_password', 'admin_id': details['admin_id'], 'password': details['password']}]
+    elif event == 'archive':
+        return [{'op': 'archive', 'student_id': student.student_id, 'before': details['before'],
+                 'entries': details['entries']}]
+    return []
+
+def _transaction_record(student, transaction):
+    return {
+        'op': transaction.type,
+        'student_id': student.student_id,
+        'date': transaction.date,
+        'description': transaction.description,
+        'amount': transaction.amount
+    }
+
+
+class SnapshotWriter:
+    """Background worker that coalesces bursts of changes into one flush
+    
+    Request threads only call mark_dirty() and return. The worker calls
+    flush() once max_pending changes are waiting or the oldest of them has
+    waited max_delay seconds, whichever comes first.
+    """
+    
+    def __init__(self, flush, max_delay=30.0, max_pending=1000):
+        """
+        Args:
+            flush (callable): Does the write and returns the bytes written
+            max_delay (float): Longest a change waits before a flush, in seconds
+            max_pending (int): Number of pending changes that forces a flush
+        """
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._flush = flush
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._first_dirty = None
+        self._stopping = False
+        
+        # Exposed through stats()
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_at = None
+        self.bytes_written = 0
+        
+        self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self._thread.start()
+    
+    def mark_dirty(self, count=1):
+        """Note that count changes are waiting to be flushed"""
+        with self._cond:
+            if self._pending == 0:
+                self._first_dirty = time.monotonic()
+                self._cond.notify()
+            self._pending += count
+            if self._pending >= self.max_pending:
+                self._cond.notify()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and self._pending < self.max_pending:
+                    if self._pending == 0:
+                        self._cond.wait()
+                        continue
+                    remaining = self._first_dirty + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                
+                if self._pending == 0:
+                    # Only reached when stopping with nothing left to write
+                    return
+                pending = self._pending
+                self._pending = 0
+                self._first_dirty = None
+            
+            started = time.perf_counter()
+            try:
+                written = self._flush() or 0
+            except Exception as e:
+                print(f"Background snapshot failed: {e}")
+                # Retry after another delay
+                self.mark_dirty(pending)
+                if self._stopping:
+                    return
+                continue
+            
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - started
+            self.last_flush_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.bytes_written += written
+    
+    def stop(self, flush=True):
+        """Stop the worker, flushing whatever is pending first by default"""
+        with self._cond:
+            self._stopping = True
+            if not flush:
+                self._pending = 0
+            self._cond.notify()
+        self._thread.join()
+    
+    def stats(self):
+        return {
+            'queue_depth': self._pending,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds,
+            'last_flush_at': self.last_flush_at,
+            'bytes_written': self.bytes_written
+        }
+
+
+class Journal:
+    """Append-only write-ahead log of enrollment system mutations
+    
+    Each mutation is written as one compact JSON line and fsynced before the
+    request returns, instead of rewriting the whole snapshot. A background
+    SnapshotWriter rotates the log and folds it into the JSON snapshot once
+    compact_every records are pending or max_delay seconds have passed.
+    """
+    
+    def __init__(self, data_dir='data', compact_every=1000, max_delay=30.0):
+        self.data_dir = data_dir
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        
+        os.makedirs(data_dir, exist_ok=True)
+        self._path = os.path.join(data_dir, JOURNAL_FILE)
+        if os.path.exists(self._path):
+            trimmed = _trim_torn_tail(self._path)
+            if trimmed:
+                print(f"Removed a torn record of {trimmed} bytes from the end of {self._path}")
+        self.seq = self._find_last_seq()
+        self._file = open(self._path, 'a')
+        self._unsealed = sum(1 for _ in _read_journal(self._path))
+        self.bytes_appended = 0
+        
+        self.writer = SnapshotWriter(self.compact, max_delay, compact_every)
+        if self._unsealed:
+            # Fold records left over from the last run
+            self.writer.mark_dirty(self._unsealed)
+    
+    def _find_last_seq(self):
+        last_seq = _snapshot_seq(self.data_dir)
+        segments = _sealed_segments(self.data_dir)
+        if segments:
+            last_seq = max(last_seq, segments[-1][0])
+        active = os.path.join(self.data_dir, JOURNAL_FILE)
+        if os.path.exists(active):
+            for record in _read_journal(active):
+                last_seq = max(last_seq, record['seq'])
+        return last_seq
+    
+    def append(self, *records):
+        """Write records to the log and fsync them as one batch
+        
+        Args:
+            *records (dict): Records with at least an 'op' key
+        """
+        with self._lock:
+            lines = []
+            for record in records:
+                self.seq += 1
+                lines.append(json.dumps(dict(record, seq=self.seq), separators=(',', ':')))
+            data = '\n'.join(lines) + '\n'
+            with _append_timer.time():
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._unsealed += len(records)
+            self.bytes_appended += len(data)
+        
+        self.writer.mark_dirty(len(records))
+    
+    def record_event(self, event, **details):
+        """EnrollmentSystem listener that journals each change
+        
+        A batch event is written as one append, so the whole batch costs a
+        single fsync.
+        
+        Usage: enrollment_system.subscribe(journal.record_event)
+        """
+        records = journal_records(event, details)
+        if records:
+            self.append(*records)
+    
+    def _rotate(self):
+        """Seal the active log so new appends go to a fresh file"""
+        with self._lock:
+            if self._unsealed == 0:
+                return False
+            self._file.close()
+            os.replace(self._path, os.path.join(self.data_dir, f'journal.{self.seq:012d}.log'))
+            self._file = open(self._path, 'a')
+            self._unsealed = 0
+            return True
+    
+    def compact(self):
+        """Fold all sealed journal segments into the JSON snapshot
+        
+        The fold reads the shards the sealed records touch into a scratch
+        EnrollmentSystem, so it never touches the live objects that request
+        handlers are mutating, and rewrites just those shards.
+        
+        Returns:
+            int: Number of snapshot bytes written
+        """
+        with self._compact_lock, _compact_timer.time():
+            self._rotate()
+            segments = _sealed_segments(self.data_dir)
+            if not segments:
+                return 0
+            
+            written = _fold_journal(self.data_dir)
+            
+            # Keep segments the previous generation still needs, so falling
+            # back to it on load can replay them
+            manifest = _read_manifest(self.data_dir)
+            if manifest is None:
+                return 0
+            covered = manifest.get('previous', manifest)['journal_seq']
+            for seq, path in segments:
+                if seq <= covered:
+                    os.remove(path)
+            return written
+    
+    def stats(self):
+        """Return queue depth, flush timings and byte counts"""
+        stats = self.writer.stats()
+        stats.update(journal_seq=self.seq, unsealed_records=self._unsealed, bytes_appended=self.bytes_appended)
+        return stats
+    
+    def close(self, compact=True):
+        """Stop the background writer and close the log
+        
+        Args:
+            compact (bool): Flush pending records into the snapshot first
+        """
+        # Without the final flush the records simply stay in the journal for replay
+        self.writer.stop(flush=compact)
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,57 @@
+"""Cache of rendered page fragments
+
+Pages are assembled from fragments that are the same for every user, such
+as a course's row in the catalog, and parts rendered per request, such as
+the student's enroll button. A fragment's key includes the version of the
+data it was rendered from (see EnrollmentSystem.course_versions), so a
+change makes the next lookup miss and the stale entry ages out of the LRU;
+nothing has to be invalidated explicitly.
+"""
+import collections
+import threading
+import metrics
+
+FRAGMENT_LOOKUPS = metrics.REGISTRY.counter(
+    'enrollment_fragment_cache_total', "Fragment cache lookups by result", ('result',))
+_HITS = FRAGMENT_LOOKUPS.labels(result='hit')
+_MISSES = FRAGMENT_LOOKUPS.labels(result='miss')
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments"""
+    
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, render):
+        """Return the fragment cached under key, rendering it on a miss
+        
+        Args:
+            key (tuple): Identifies the fragment, including the versions of
+                the data it shows
+            render (callable): Returns the fragment; called without the lock
+                held, so two threads may render the same miss
+        """
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                _HITS.inc()
+                return fragment
+        _MISSES.inc()
+        fragment = render()
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,124 @@
+"""Sorted indexes for keyset pagination of large listings"""
+import base64
+import bisect
+import json
+import threading
+
+
+def encode_cursor(entry):
+    """Turn a (key, item_id) index entry into an opaque URL-safe cursor"""
+    if entry is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(entry)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Reverse encode_cursor; a missing or malformed cursor means the first page"""
+    if not cursor:
+        return None
+    try:
+        key, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return key, item_id
+
+
+class SortedIndex:
+    """Items kept sorted by key_func(item), with the item id as tie-breaker
+    
+    Pages are found by bisecting to the cursor, the last (key, id) entry of
+    the previous page, so every page costs the same however deep it is.
+    """
+    
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self._lock = threading.Lock()
+        self._entries = []  # Sorted (key, item_id) pairs
+        self._keys = {}     # item_id -> key currently in _entries
+        self._items = {}    # item_id -> item
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def load(self, items):
+        """Replace the contents with (item_id, item) pairs in one sort"""
+        with self._lock:
+            self._items = dict(items)
+            self._keys = {item_id: self.key_func(item) for item_id, item in self._items.items()}
+            self._entries = sorted((key, item_id) for item_id, key in self._keys.items())
+    
+    def add(self, item_id, item):
+        """Insert an item, or move it if its key has changed"""
+        key = self.key_func(item)
+        with self._lock:
+            old_key = self._keys.get(item_id)
+            if old_key is not None:
+                if old_key == key:
+                    self._items[item_id] = item
+                    return
+                self._remove_entry(old_key, item_id)
+            bisect.insort(self._entries, (key, item_id))
+            self._keys[item_id] = key
+            self._items[item_id] = item
+    
+    # Re-keying an item is the same operation as adding it
+    update = add
+    
+    def discard(self, item_id):
+        with self._lock:
+            key = self._keys.pop(item_id, None)
+            if key is not None:
+                self._remove_entry(key, item_id)
+                del self._items[item_id]
+    
+    def _remove_entry(self, key, item_id):
+        # Called with self._lock held
+        position = bisect.bisect_left(self._entries, (key, item_id))
+        if position < len(self._entries) and self._entries[position] == (key, item_id):
+            del self._entries[position]
+    
+    def _start(self, after, descending):
+        # Called with self._lock held
+        if descending:
+            if after is None:
+                return len(self._entries) - 1
+            return bisect.bisect_left(self._entries, tuple(after)) - 1
+        if after is None:
+            return 0
+        return bisect.bisect_right(self._entries, tuple(after))
+    
+    def page(self, after=None, limit=25, descending=False, predicate=None):
+        """Return one page of items after the cursor entry
+        
+        Args:
+            after (tuple, optional): Last (key, item_id) of the previous page
+            limit (int): Maximum number of items to return
+            descending (bool): Walk the index from the largest key down
+            predicate (callable, optional): Only items for which it returns
+                True are included
+        
+        Returns:
+            tuple: (items, next_entry) where next_entry is None on the last page
+        """
+        with self._lock:
+            entries = self._entries
+            try:
+                position = self._start(after, descending)
+            except TypeError:
+                # A cursor from another sort order; start over
+                position = self._start(None, descending)
+            step = -1 if descending else 1
+            
+            items = []
+            last = None
+            while 0 <= position < len(entries):
+                entry = entries[position]
+                position += step
+                item = self._items[entry[1]]
+                if predicate is None or predicate(item):
+                    if len(items) == limit:
+                        # There is at least one more match: hand out a cursor
+                        return items, last
+                    items.append(item)
+                    last = entry
+            return items, None
@@ -0,0 +1,245 @@
+"""Columnar finance ledger for school-wide reports
+
+Every student's transactions are also kept here as NumPy columns (student
+index, amount, type, timestamp and payment method), next to the
+per-student Transaction lists. Report functions run vectorized over the
+whole school instead of looping over each student's history in Python.
+
+Requires NumPy; app.py only enables the ledger when it is installed.
+"""
+import datetime
+import threading
+
+import numpy as np
+
+from models import EPOCH
+
+CHARGE = 0
+PAYMENT = 1
+TYPE_CODES = {'charge': CHARGE, 'payment': PAYMENT}
+NO_METHOD = -1
+SECONDS_PER_DAY = 86400
+
+
+class Ledger:
+    """Append-only, array-backed copy of all transactions"""
+    
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._size = 0
+        self.student = np.empty(capacity, dtype=np.int32)
+        self.amount = np.empty(capacity, dtype=np.float64)
+        self.type = np.empty(capacity, dtype=np.int8)
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.method = np.empty(capacity, dtype=np.int16)
+        
+        # Lookup tables that map the integer columns back to names
+        self.student_ids = []
+        self.grade_levels = []
+        # Balances carried forward from archived transactions, which have no rows
+        self.openings = []
+        self._student_index = {}
+        self.methods = []
+        self._method_index = {}
+    
+    def __len__(self):
+        return self._size
+    
+    @classmethod
+    def build(cls, enrollment_system, transactions=None):
+        """Build a ledger for every student in the system
+        
+        Args:
+            enrollment_system (EnrollmentSystem): Source of students
+            transactions (iterable, optional): (student, Transaction) pairs;
+                defaults to walking each student's transaction list
+        """
+        if transactions is None:
+            transactions = ((student, transaction)
+                            for student in enrollment_system.students.values()
+                            for transaction in student.transactions)
+        
+        ledger = cls()
+        for student in enrollment_system.students.values():
+            ledger._index_student(student)
+        
+        rows = [(ledger._index_student(student), transaction.amount, TYPE_CODES[transaction.type],
+                 transaction.timestamp, ledger._index_method(transaction))
+                for student, transaction in transactions]
+        if rows:
+            student, amount, type, timestamp, method = zip(*rows)
+            ledger.extend(student, amount, type, timestamp, method)
+        return ledger
+    
+    def _index_student(self, student):
+        index = self._student_index.get(student.student_id)
+        if index is None:
+            index = self._student_index[student.student_id] = len(self.student_ids)
+            self.student_ids.append(student.student_id)
+            self.grade_levels.append(student.grade_level)
+            self.openings.append(student.opening_balance)
+        return index
+    
+    def _index_method(self, transaction):
+        if transaction.type != 'payment':
+            return NO_METHOD
+        # Payments are described as "Payment via <method>"
+        method = transaction.description.split('Payment via ', 1)[-1]
+        index = self._method_index.get(method)
+        if index is None:
+            index = self._method_index[method] = len(self.methods)
+            self.methods.append(method)
+        return index
+    
+    def _reserve(self, count):
+        needed = self._size + count
+        capacity = len(self.student)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('student', 'amount', 'type', 'timestamp', 'method'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+    
+    def extend(self, student, amount, type, timestamp, method):
+        """Append whole columns of rows at once"""
+        count = len(student)
+        with self._lock:
+            self._reserve(count)
+            end = self._size + count
+            self.student[self._size:end] = student
+            self.amount[self._size:end] = amount
+            self.type[self._size:end] = type
+            self.timestamp[self._size:end] = timestamp
+            self.method[self._size:end] = method
+            self._size = end
+    
+    def append(self, student, transaction):
+        """Append one of a student's transactions"""
+        with self._lock:
+            index = self._index_student(student)
+            method = self._index_method(transaction)
+            self._reserve(1)
+            row = self._size
+            self.student[row] = index
+            self.amount[row] = transaction.amount
+            self.type[row] = TYPE_CODES[transaction.type]
+            self.timestamp[row] = transaction.timestamp
+            self.method[row] = method
+            self._size = row + 1
+    
+    def record_event(self, event, **details):
+        """EnrollmentSystem listener that mirrors new transactions"""
+        if event in ('enroll', 'payment', 'transaction'):
+            self.append(details['student'], details['transaction'])
+        elif event == 'add_student':
+            with self._lock:
+                self._index_student(details['student'])
+        elif event == 'reload':
+            # Built aside, so reports keep reading the old rows until the swap
+            fresh = Ledger.build(details['system'], details['transactions']())
+            with self._lock:
+                for name, value in vars(fresh).items():
+                    if name != '_lock':
+                        setattr(self, name, value)
+        elif event == 'batch':
+            for name, event_details in details['events']:
+                self.record_event(name, **event_details)
+    
+    def _columns(self):
+        """Consistent views of the rows written so far"""
+        with self._lock:
+            size = self._size
+            return (self.student[:size], self.amount[:size], self.type[:size],
+                    self.timestamp[:size], self.method[:size], len(self.student_ids))
+    
+    def _openings(self, students):
+        with self._lock:
+            return np.asarray(self.openings[:students], dtype=np.float64)
+    
+    # Reports
+    
+    def balances(self):
+        """Return every student's balance, indexed like student_ids"""
+        student, amount, type, _, _, students = self._columns()
+        signed = np.where(type == CHARGE, amount, -amount)
+        return np.bincount(student, weights=signed, minlength=students) + self._openings(students)
+    
+    def total_outstanding(self):
+        """Total amount owed across all students"""
+        balances = self.balances()
+        return float(balances[balances > 0].sum())
+    
+    def balances_by_grade(self):
+        """Return {grade_level: total balance}"""
+        balances = self.balances()
+        grades = np.asarray(self.grade_levels[:len(balances)])
+        levels, inverse = np.unique(grades, return_inverse=True)
+        totals = np.bincount(inverse, weights=balances, minlength=len(levels))
+        return {int(level): float(total) for level, total in zip(levels, totals)}
+    
+    def payments_by_method_per_day(self):
+        """Return {(date 'YYYY-MM-DD', method): total paid}"""
+        _, amount, type, timestamp, method, _ = self._columns()
+        payments = type == PAYMENT
+        days = timestamp[payments] // SECONDS_PER_DAY
+        methods = method[payments].astype(np.int64)
+        keys, inverse = np.unique(days * len(self.methods) + methods, return_inverse=True)
+        totals = np.bincount(inverse, weights=amount[payments], minlength=len(keys))
+        
+        report = {}
+        for key, total in zip(keys, totals):
+            day, method_index = divmod(int(key), len(self.methods))
+            date = (EPOCH + datetime.timedelta(days=day)).strftime("%Y-%m-%d")
+            report[(date, self.methods[method_index])] = float(total)
+        return report
+    
+    def aging_buckets(self, now, bounds=(30, 60, 90)):
+        """Split outstanding balances by the age of the charges behind them
+        
+        Payments settle each student's oldest charges first, so whatever is
+        still owed belongs to the newest charges. A balance carried forward
+        from the archive counts as a charge older than every bucket, and a
+        credit carried forward as a payment.
+        
+        Args:
+            now (int): Reference time as a Transaction timestamp
+            bounds (tuple): Bucket edges in days
+        
+        Returns:
+            dict: {'0-30': amount, '30-60': amount, ..., '90+': amount}
+        """
+        student, amount, type, timestamp, _, students = self._columns()
+        charges = type == CHARGE
+        paid = np.bincount(student[~charges], weights=amount[~charges], minlength=students)
+        openings = self._openings(students)
+        paid -= np.minimum(openings, 0)
+        carried = np.flatnonzero(openings > 0)
+        charge_student = np.r_[student[charges], carried]
+        charge_amount = np.r_[amount[charges], openings[carried]]
+        charge_timestamp = np.r_[timestamp[charges], np.zeros(len(carried), dtype=np.int64)]
+        
+        # Charges grouped by student, oldest first
+        order = np.lexsort((charge_timestamp, charge_student))
+        charge_student = charge_student[order]
+        charge_amount = charge_amount[order]
+        charge_age = (now - charge_timestamp[order]) / SECONDS_PER_DAY
+        
+        # Amount charged to the same student before each charge
+        running = np.cumsum(charge_amount) - charge_amount
+        starts = np.flatnonzero(np.r_[True, charge_student[1:] != charge_student[:-1]]) \
+            if len(charge_student) else np.array([], dtype=np.int64)
+        group_offset = np.repeat(running[starts], np.diff(np.r_[starts, len(charge_student)]))
+        charged_before = running - group_offset
+        
+        settled = np.clip(paid[charge_student] - charged_before, 0, charge_amount)
+        outstanding = charge_amount - settled
+        
+        edges = [0, *bounds]
+        labels = [f"{low}-{high}" for low, high in zip(edges, edges[1:])] + [f"{bounds[-1]}+"]
+        bucket = np.searchsorted(np.asarray(bounds), charge_age, side='right')
+        totals = np.bincount(bucket, weights=outstanding, minlength=len(labels))
+        return {label: float(total) for label, total in zip(labels, totals)}
@@ -0,0 +1,423 @@
+"""Lightweight metrics and a sampling profiler
+
+Counters, gauges and latency histograms live in one registry and are
+rendered in the Prometheus text format by the admin metrics endpoint.
+Each metric keeps one child per combination of label values; look the
+child up once with labels() and keep it where the same labels are used on
+every call. Histograms use fixed buckets, so observing a value is a bisect
+and a few additions under a lock.
+
+The SamplingProfiler periodically records the stack of every other thread
+and reports how often each stack was seen, as "frame;frame;frame count"
+lines that flame graph tools read directly.
+"""
+import bisect
+import collections
+import contextlib
+import functools
+import math
+import os
+import sys
+import threading
+import time
+
+# Upper bounds in seconds, from a fast dictionary lookup to a slow snapshot
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Base for a named metric with optional labels"""
+    type = None
+    
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+    
+    def labels(self, **labels):
+        """Return the child for these label values, creating it on first use"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def _default(self):
+        # Metrics without labels have a single child
+        return self.labels()
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(key, child))
+        return lines
+    
+    def _render_child(self, key, child):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+    
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. operations performed"""
+    type = 'counter'
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+    
+    def set(self, value):
+        with self._lock:
+            self.value = value
+    
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down
+    
+    A gauge created with a func calls it at every scrape instead of holding
+    a value, so counts that are already kept elsewhere are never stale.
+    """
+    type = 'gauge'
+    
+    def __init__(self, name, help, labelnames=(), func=None):
+        super().__init__(name, help, labelnames)
+        self.func = func
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def set(self, value):
+        self._default().set(value)
+    
+    def inc(self, amount=1):
+        self._default().inc(amount)
+    
+    def dec(self, amount=1):
+        self._default().dec(amount)
+    
+    def render(self):
+        if self.func is None:
+            return super().render()
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}",
+                f"{self.name} {_format_value(self.func())}"]
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+    
+    @contextlib.contextmanager
+    def time(self):
+        """Observe the seconds spent in the with block, even if it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets, e.g. latencies"""
+    type = 'histogram'
+    
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value):
+        self._default().observe(value)
+    
+    def time(self):
+        return self._default().time()
+    
+    def _render_child(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+        labels = _label_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Named collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        """Add a metric; a metric already registered under the name is replaced"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+    
+    def gauge(self, name, help, labelnames=(), func=None):
+        return self.register(Gauge(name, help, labelnames, func))
+    
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+    
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'enrollment_request_seconds', "Time spent handling HTTP requests", ('endpoint', 'method', 'status'))
+TEMPLATE_SECONDS = REGISTRY.histogram(
+    'enrollment_template_seconds', "Time spent rendering templates", ('template',))
+OPERATION_SECONDS = REGISTRY.histogram(
+    'enrollment_operation_seconds', "Time spent in EnrollmentSystem operations", ('operation',))
+OPERATIONS = REGISTRY.counter(
+    'enrollment_operations_total', "EnrollmentSystem changes by outcome", ('operation', 'outcome'))
+PERSISTENCE_SECONDS = REGISTRY.histogram(
+    'enrollment_persistence_seconds', "Time spent loading, serializing and writing data", ('stage',))
+TRANSACTIONS = REGISTRY.gauge(
+    'enrollment_transactions', "Charges and payments on record")
+
+
+# stats() keys of the persistence backend and the async writer shown as gauges
+STATS_GAUGES = {
+    'queue_depth': ('enrollment_persistence_queue_depth', "Journal records waiting for the next snapshot"),
+    'unsealed_records': ('enrollment_persistence_unsealed_records', "Journal records not yet folded into a snapshot"),
+    'last_flush_seconds': ('enrollment_persistence_last_flush_seconds', "Duration of the last snapshot write"),
+    'flushes': ('enrollment_persistence_flushes', "Snapshots written since startup"),
+    'bytes_written': ('enrollment_persistence_bytes_written', "Bytes written by snapshots since startup"),
+    'bytes_appended': ('enrollment_persistence_bytes_appended', "Bytes appended to the journal since startup"),
+    'queued': ('enrollment_writer_queued', "Changes queued on the async writer but not yet stored"),
+}
+
+
+def register_stats(stats, registry=None):
+    """Expose the numeric counters of a stats() method as gauges
+    
+    Only keys listed in STATS_GAUGES and present in the current stats are
+    registered; each gauge calls stats() again at every scrape.
+    
+    Args:
+        stats (callable): Returns a dict of counters, e.g. Storage.stats
+        registry (Registry, optional): Defaults to REGISTRY
+    """
+    registry = registry or REGISTRY
+    for key in stats():
+        if key in STATS_GAUGES:
+            name, help = STATS_GAUGES[key]
+            registry.gauge(name, help, func=lambda key=key: stats().get(key) or 0)
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def replaying():
+    """Leave the operations called in the with block out of the metrics
+    
+    Replaying the journal, or another process's changes, calls the same
+    EnrollmentSystem methods that requests do; counting those calls would
+    count each change again at every load, compaction and catch-up.
+    """
+    previous = getattr(_local, 'replaying', False)
+    _local.replaying = True
+    try:
+        yield
+    finally:
+        _local.replaying = previous
+
+
+def timed_operation(operation, count_outcome=False):
+    """Decorator timing an EnrollmentSystem method into OPERATION_SECONDS
+    
+    Calls made inside replaying() are not recorded.
+    
+    Args:
+        operation (str): Value of the operation label
+        count_outcome (bool): Also count calls in OPERATIONS, as 'failed'
+            when the method returns False or None and 'ok' otherwise
+    """
+    histogram = OPERATION_SECONDS.labels(operation=operation)
+    if count_outcome:
+        succeeded = OPERATIONS.labels(operation=operation, outcome='ok')
+        failed = OPERATIONS.labels(operation=operation, outcome='failed')
+    
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'replaying', False):
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            histogram.observe(time.perf_counter() - started)
+            if count_outcome:
+                (failed if result is None or result is False else succeeded).inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def record_event(event, **details):
+    """EnrollmentSystem listener that keeps the transaction gauge current
+    
+    Usage: enrollment_system.subscribe(metrics.record_event)
+    """
+    if event == 'batch':
+        TRANSACTIONS.inc(sum(1 for _, event_details in details['events'] if event_details.get('transaction')))
+    elif event == 'reload':
+        TRANSACTIONS.set(sum(1 for _ in details['transactions']()))
+    elif details.get('transaction') is not None:
+        TRANSACTIONS.inc()
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads at a fixed interval
+    
+    Sampling costs the profiled threads nothing but the GIL hand-offs to
+    the sampler, so it can be switched on briefly in production.
+    """
+    
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = collections.Counter()
+        self.started_at = None
+        self.stopped_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._samples_lock = threading.Lock()
+    
+    @property
+    def running(self):
+        return self._thread is not None
+    
+    def start(self):
+        """Clear earlier samples and start sampling; does nothing if running"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.samples = collections.Counter()
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        """Stop sampling, keeping the samples for report(); does nothing if stopped"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return False
+            self._stop.set()
+        thread.join()
+        self.stopped_at = time.time()
+        return True
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = [self._stack(frame) for thread_id, frame in sys._current_frames().items()
+                      if thread_id != own_id]
+            with self._samples_lock:
+                self.samples.update(stacks)
+    
+    def _stack(self, frame):
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+    
+    def report(self, limit=None):
+        """Return the collapsed stacks, most frequent first
+        
+        Args:
+            limit (int, optional): Only the most frequent stacks
+        
+        Returns:
+            str: One "frame;frame;frame count" line per distinct stack
+        """
+        with self._samples_lock:
+            samples = self.samples.most_common(limit)
+        return ''.join(f"{stack} {count}\n" for stack, count in samples)
@@ -1,144 +1,1398 @@
-# models.py
-import datetime
-
-
-class Course:
-    def __init__(self, course_id, name, instructor, schedule, capacity, fee=1000):
-        self.course_id = course_id
-        self.name = name
-        self.instructor = instructor
-        self.schedule = schedule
-        self.capacity = capacity
-        self.fee = fee  # Course fee in pesos
-        self.enrolled_students = []
-        
-    # Rest of the class remains the same
-        
-    def is_full(self):
-        return len(self.enrolled_students) >= self.capacity
-    
-    def enroll_student(self, student):
-        if not self.is_full() and student not in self.enrolled_students:
-            self.enrolled_students.append(student)
-            return True
-        return False
-    
-    def drop_student(self, student):
-        if student in self.enrolled_students:
-            self.enrolled_students.remove(student)
-            return True
-        return False
-    
-    def get_available_seats(self):
-        return self.capacity - len(self.enrolled_students)
-
-
-class Student:
-    def __init__(self, student_id, name, grade_level, password):
-        self.student_id = student_id
-        self.name = name
-        self.grade_level = grade_level
-        self.password = password  # In production, this should be hashed
-        self.enrolled_courses = []
-        self.balance = 0  # Initialize balance to 0
-        self.transactions = []  # Initialize empty transactions list
-    
-    def enroll(self, course):
-        if course not in self.enrolled_courses and course.enroll_student(self):
-            self.enrolled_courses.append(course)
-            # Add a charge for enrollment
-            self.add_transaction(500, f"Enrollment fee for {course.name}", "charge")
-            return True
-        return False
-    
-    def drop(self, course):
-        if course in self.enrolled_courses and course.drop_student(self):
-            self.enrolled_courses.remove(course)
-            return True
-        return False
-    
-    def add_transaction(self, amount, description, type):
-        """Add a transaction to the student's account
-        
-        Args:
-            amount (float): Transaction amount
-            description (str): Description of the transaction
-            type (str): Either 'charge' or 'payment'
-        """
-        from datetime import datetime
-        
-        # Create transaction record
-        transaction = {
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "description": description,
-            "amount": amount,
-            "type": type
-        }
-        
-        # Add to transactions history
-        self.transactions.append(transaction)
-        
-        # Update balance
-        if type == "charge":
-            self.balance += amount
-        elif type == "payment":
-            self.balance -= amount
-    
-    def make_payment(self, amount, payment_method):
-        """Make a payment toward the student's balance
-        
-        Args:
-            amount (float): Amount to pay
-            payment_method (str): Method of payment
-            
-        Returns:
-            bool: True if payment was successful, False otherwise
-        """
-        if amount <= 0 or amount > self.balance:
-            return False
-        
-        self.add_transaction(amount, f"Payment via {payment_method}", "payment")
-        return True
-
-class EnrollmentSystem:
-    def __init__(self):
-        self.courses = {}
-        self.students = {}
-        self.admins = {}  # Basic admin accounts
-    
-    def add_course(self, course):
-        self.courses[course.course_id] = course
-    
-    def remove_course(self, course_id):
-        if course_id in self.courses:
-            course = self.courses[course_id]
-            # Automatically drop all students from this course
-            for student in course.enrolled_students[:]:
-                student.drop(course)
-            del self.courses[course_id]
-            return True
-        return False
-    
-    def add_student(self, student):
-        self.students[student.student_id] = student
-    
-    def add_admin(self, admin_id, name, password):
-        self.admins[admin_id] = {"name": name, "password": password}
-    
-    def get_course(self, course_id):
-        return self.courses.get(course_id)
-    
-    def get_student(self, student_id):
-        return self.students.get(student_id)
-    
-    def verify_admin(self, admin_id, password):
-        admin = self.admins.get(admin_id)
-        if admin and admin["password"] == password:
-            return True
-        return False
-    
-    def list_all_courses(self):
-        return list(self.courses.values())
-    
-    def list_all_students(self):
-        return list(self.students.values())
\ No newline at end of file
+# models.py
+import bisect
+import collections
+import contextlib
+import datetime
+import itertools
+import sys
+import threading
+import types
+
+from auth import default_hasher, is_hashed
+from indexes import SortedIndex, decode_cursor, encode_cursor
+from metrics import timed_operation
+from schedule import Timetable, conflicting_course_pairs, parse_schedule
+
+# Transaction timestamps count seconds of local wall-clock time from this point
+EPOCH = datetime.datetime(1970, 1, 1)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Why enroll() refused a student a seat that had run out
+COURSE_FULL = "course is full"
+
+
+class Transaction:
+    """Compact ledger entry
+    
+    The date is kept as integer seconds, the type as an interned string and
+    the description as an index into a table shared by every transaction,
+    since most entries repeat a handful of descriptions. The date and
+    description properties give back the strings the templates display.
+    """
+    __slots__ = ('timestamp', 'description_id', 'amount', 'type')
+    
+    _descriptions = []
+    _description_ids = {}
+    _descriptions_lock = threading.Lock()
+    
+    def __init__(self, timestamp, description, amount, type):
+        self.timestamp = timestamp
+        self.description_id = self._description_id(description)
+        self.amount = amount
+        self.type = sys.intern(type)
+    
+    @classmethod
+    def _description_id(cls, description):
+        description_id = cls._description_ids.get(description)
+        if description_id is None:
+            with cls._descriptions_lock:
+                description_id = cls._description_ids.get(description)
+                if description_id is None:
+                    cls._descriptions.append(description)
+                    description_id = cls._description_ids[description] = len(cls._descriptions) - 1
+        return description_id
+    
+    @classmethod
+    def from_date(cls, date, description, amount, type):
+        """Create a transaction from a 'YYYY-MM-DD HH:MM:SS' date string"""
+        timestamp = int((datetime.datetime.strptime(date, DATE_FORMAT) - EPOCH).total_seconds())
+        return cls(timestamp, description, amount, type)
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_date(data['date'], data['description'], data['amount'], data['type'])
+    
+    @property
+    def date(self):
+        return (EPOCH + datetime.timedelta(seconds=self.timestamp)).strftime(DATE_FORMAT)
+    
+    @property
+    def description(self):
+        return self._descriptions[self.description_id]
+    
+    def to_dict(self):
+        """Return the record in its JSON shape"""
+        return {
+            "date": self.date,
+            "description": self.description,
+            "amount": self.amount,
+            "type": self.type
+        }
+
+
+class Waitlist:
+    """First come, first served queue of students waiting for a seat
+    
+    Each student who joins draws the next ticket number, so a position is
+    the student's ticket minus the ticket at the head of the queue. Students
+    who leave early stay in the deque as stale entries until they reach the
+    head; a sorted list of their tickets corrects the positions behind them,
+    which costs a bisect only while such gaps exist.
+    """
+    __slots__ = ('_queue', '_tickets', '_next_ticket', '_gaps')
+    
+    def __init__(self):
+        self._queue = collections.deque()  # (ticket, student), oldest first
+        self._tickets = {}  # Student -> ticket, for students still waiting
+        self._next_ticket = 0
+        self._gaps = []  # Sorted tickets of students who left but are still queued
+    
+    def __len__(self):
+        return len(self._tickets)
+    
+    def __contains__(self, student):
+        return student in self._tickets
+    
+    def __iter__(self):
+        tickets = self._tickets
+        return iter([student for ticket, student in self._queue if tickets.get(student) == ticket])
+    
+    def append(self, student):
+        """Queue a student and return their position"""
+        if student not in self._tickets:
+            self._tickets[student] = self._next_ticket
+            self._queue.append((self._next_ticket, student))
+            self._next_ticket += 1
+        return self.position(student)
+    
+    def discard(self, student):
+        ticket = self._tickets.pop(student, None)
+        if ticket is None:
+            return False
+        bisect.insort(self._gaps, ticket)
+        self._trim()
+        return True
+    
+    def popleft(self):
+        """Remove and return the student at the head, or None if nobody waits"""
+        if not self._queue:
+            return None
+        _, student = self._queue.popleft()
+        del self._tickets[student]
+        self._trim()
+        return student
+    
+    def _trim(self):
+        # Drop stale entries so the head is always a waiting student; the
+        # stale head always holds the smallest gap ticket
+        queue = self._queue
+        while queue and self._tickets.get(queue[0][1]) != queue[0][0]:
+            queue.popleft()
+            del self._gaps[0]
+    
+    def position(self, student):
+        """Return the student's 1-based place in line, or None if not waiting"""
+        ticket = self._tickets.get(student)
+        if ticket is None:
+            return None
+        ahead = ticket - self._queue[0][0]
+        if self._gaps:
+            ahead -= bisect.bisect_left(self._gaps, ticket)
+        return ahead + 1
+
+
+class Course:
+    __slots__ = ('course_id', 'name', 'instructor', 'schedule', 'capacity', 'fee', 'enrolled_students', 'waitlist',
+                 'dirty')
+    
+    def __init__(self, course_id, name, instructor, schedule, capacity, fee=1000):
+        self.course_id = course_id
+        self.name = name
+        self.instructor = instructor
+        self.schedule = schedule
+        self.capacity = capacity
+        self.fee = fee  # Course fee in pesos
+        # Insertion-ordered dict used as a set: O(1) membership, add and remove
+        self.enrolled_students = {}
+        self.waitlist = Waitlist()
+        # Changed since the last snapshot; see data_persistence.save_data()
+        self.dirty = True
+    
+    # Rest of the class remains the same
+    
+    def is_full(self):
+        return len(self.enrolled_students) >= self.capacity
+    
+    def enroll_student(self, student):
+        if not self.is_full() and student not in self.enrolled_students:
+            self.enrolled_students[student] = None
+            self.dirty = True
+            return True
+        return False
+    
+    def drop_student(self, student):
+        if student in self.enrolled_students:
+            del self.enrolled_students[student]
+            self.dirty = True
+            return True
+        return False
+    
+    def get_available_seats(self):
+        return self.capacity - len(self.enrolled_students)
+
+
+class Student:
+    __slots__ = ('student_id', 'name', 'grade_level', 'password', 'enrolled_courses', 'balance', 'transactions',
+                 'archived_charged', 'archived_paid', 'archive', 'dirty', 'replica_log')
+    
+    def __init__(self, student_id, name, grade_level, password):
+        self.student_id = student_id
+        self.name = name
+        self.grade_level = grade_level
+        self.password = password  # PBKDF2 hash; plaintext until migrated, see auth.py
+        self.enrolled_courses = {}  # Ordered set of courses, see Course.enrolled_students
+        self.balance = 0  # Initialize balance to 0
+        self.transactions = []  # Transaction records, oldest first
+        # Totals of the transactions moved to the archive, and where they
+        # went as (term, file, offset, length) entries; see archive.py
+        self.archived_charged = 0
+        self.archived_paid = 0
+        self.archive = ()
+        self.dirty = True  # Changed since the last snapshot
+        self.replica_log = None  # Set of changed students, see EnrollmentSystem.snapshot()
+    
+    def touch(self):
+        """Note that the record changed, for snapshot files and replicas"""
+        self.dirty = True
+        if self.replica_log is not None:
+            self.replica_log.add(self)
+    
+    @property
+    def opening_balance(self):
+        """Balance carried forward from the archived transactions"""
+        return self.archived_charged - self.archived_paid
+    
+    def enroll(self, course):
+        if course not in self.enrolled_courses and course.enroll_student(self):
+            self.enrolled_courses[course] = None
+            # Add a charge for enrollment
+            self.add_transaction(500, f"Enrollment fee for {course.name}", "charge")
+            return True
+        return False
+    
+    def drop(self, course):
+        if course in self.enrolled_courses and course.drop_student(self):
+            del self.enrolled_courses[course]
+            self.touch()
+            return True
+        return False
+    
+    def add_transaction(self, amount, description, type, date=None):
+        """Add a transaction to the student's account
+        
+        Args:
+            amount (float): Transaction amount
+            description (str): Description of the transaction
+            type (str): Either 'charge' or 'payment'
+            date (str, optional): Timestamp to record, defaults to now.
+                Used when replaying transactions from the journal.
+        """
+        # Create transaction record
+        if date:
+            transaction = Transaction.from_date(date, description, amount, type)
+        else:
+            now = datetime.datetime.now().replace(microsecond=0)
+            transaction = Transaction(int((now - EPOCH).total_seconds()), description, amount, type)
+        
+        # Add to transactions history
+        self.transactions.append(transaction)
+        self.touch()
+        
+        # Update balance
+        if type == "charge":
+            self.balance += amount
+        elif type == "payment":
+            self.balance -= amount
+    
+    def make_payment(self, amount, payment_method):
+        """Make a payment toward the student's balance
+        
+        Args:
+            amount (float): Amount to pay
+            payment_method (str): Method of payment
+        
+        Returns:
+            bool: True if payment was successful, False otherwise
+        """
+        if amount <= 0 or amount > self.balance:
+            return False
+        
+        self.add_transaction(amount, f"Payment via {payment_method}", "payment")
+        return True
+
+
+class CourseView:
+    """Read-only copy of a Course as it was when a Replica was taken"""
+    __slots__ = ('course_id', 'name', 'instructor', 'schedule', 'capacity', 'fee', 'student_ids', 'waitlist_ids')
+    
+    def __init__(self, course):
+        self.course_id = course.course_id
+        self.name = course.name
+        self.instructor = course.instructor
+        self.schedule = course.schedule
+        self.capacity = course.capacity
+        self.fee = course.fee
+        self.student_ids = tuple(student.student_id for student in course.enrolled_students)
+        self.waitlist_ids = tuple(student.student_id for student in course.waitlist)
+    
+    def is_full(self):
+        return len(self.student_ids) >= self.capacity
+    
+    def get_available_seats(self):
+        return self.capacity - len(self.student_ids)
+
+
+class StudentView:
+    """Read-only copy of a Student as it was when a Replica was taken
+    
+    The transaction history is not copied: histories only grow, and
+    archiving replaces the list rather than shortening it, so the view
+    keeps the list and how long it was. A history storage has not read yet
+    is read in full when first used.
+    """
+    __slots__ = ('student_id', 'name', 'grade_level', 'balance', 'course_ids', 'archived_charged', 'archived_paid',
+                 'archive', '_transactions', '_count')
+    
+    def __init__(self, student):
+        self.student_id = student.student_id
+        self.name = student.name
+        self.grade_level = student.grade_level
+        self.balance = student.balance
+        self.course_ids = tuple(course.course_id for course in student.enrolled_courses)
+        self.archived_charged = student.archived_charged
+        self.archived_paid = student.archived_paid
+        self.archive = student.archive
+        self._transactions = student.transactions
+        self._count = len(student.transactions) if getattr(student.transactions, 'loaded', True) else None
+    
+    @property
+    def transactions(self):
+        return self._transactions[:self._count]
+    
+    @property
+    def opening_balance(self):
+        return self.archived_charged - self.archived_paid
+
+
+class Replica:
+    """Immutable, point-in-time view of an EnrollmentSystem
+    
+    Taken by EnrollmentSystem.snapshot(). Its courses and students map IDs
+    to CourseView and StudentView records; reading them takes no locks, so
+    a long report over a replica never holds up a change, and never sees
+    one either.
+    """
+    
+    def __init__(self, courses, students, taken_at):
+        self.courses = types.MappingProxyType(courses)
+        self.students = types.MappingProxyType(students)
+        self.taken_at = taken_at
+    
+    def get_course(self, course_id):
+        return self.courses.get(course_id)
+    
+    def get_student(self, student_id):
+        return self.students.get(student_id)
+    
+    def roster(self, course_id):
+        """Return the course's students in the order they enrolled, or None for an unknown course"""
+        course = self.courses.get(course_id)
+        if course is None:
+            return None
+        return [self.students[student_id] for student_id in course.student_ids if student_id in self.students]
+
+
+class ChangeGate:
+    """Lets changes run side by side, or a replica be taken alone
+    
+    Every change holds shared() while it runs; exclusive() waits for the
+    changes in progress, and new changes wait until it is released. The
+    two take turns: a waiting replica goes ahead of changes that have yet
+    to start, and the changes that waited for a replica go ahead of the
+    next one, so neither a stream of changes nor of replicas can starve the
+    other. A thread already inside a change enters again without waiting,
+    so a change made while making another cannot deadlock.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._changes = 0
+        self._exclusive = False
+        self._waiting = 0
+        # Replicas released so far, and changes admitted by the last one
+        # that have yet to start
+        self._turns = 0
+        self._blocked = 0
+        self._admitted = 0
+        self._local = threading.local()
+    
+    @contextlib.contextmanager
+    def shared(self):
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            try:
+                yield
+            finally:
+                local.depth -= 1
+            return
+        with self._cond:
+            if self._exclusive or self._waiting:
+                turn = self._turns
+                self._blocked += 1
+                while self._exclusive or (self._waiting and self._turns == turn):
+                    self._cond.wait()
+                self._blocked -= 1
+                if self._turns != turn:
+                    self._admitted -= 1
+            self._changes += 1
+        local.depth = 1
+        try:
+            yield
+        finally:
+            local.depth = 0
+            with self._cond:
+                self._changes -= 1
+                if not self._changes:
+                    self._cond.notify_all()
+    
+    @contextlib.contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            while self._exclusive or self._changes or self._admitted:
+                self._cond.wait()
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._turns += 1
+                self._admitted = self._blocked
+                self._cond.notify_all()
+
+
+def fill_ratio(course):
+    """Fraction of a course's seats that are taken"""
+    if course.capacity <= 0:
+        return 1.0
+    return len(course.enrolled_students) / course.capacity
+
+
+# Sort orders offered by the admin listings, as sort name -> key function
+COURSE_SORT_KEYS = {
+    'name': lambda course: course.name.casefold(),
+    'id': lambda course: course.course_id,
+    'fill': fill_ratio,
+}
+STUDENT_SORT_KEYS = {
+    'name': lambda student: student.name.casefold(),
+    'id': lambda student: student.student_id,
+    'grade': lambda student: student.grade_level,
+}
+
+
+def _text_filter(query, fields):
+    """Predicate matching items with query in any of the named text fields"""
+    if not query:
+        return None
+    query = query.casefold()
+    return lambda item: any(query in str(getattr(item, field)).casefold() for field in fields)
+
+
+class EnrollmentSystem:
+    """Registry of courses, students and admins
+    
+    enroll, drop, make_payment and the add/remove methods are safe to call
+    from concurrent request threads. Each course and student has its own
+    lock; a course lock is always taken before a student lock so two
+    operations can never wait on each other, and unrelated enrollments
+    proceed in parallel.
+    """
+    
+    def __init__(self):
+        self.courses = {}
+        self.students = {}
+        self.admins = {}  # Basic admin accounts
+        self._listeners = []
+        self._registry_lock = threading.Lock()
+        self._course_locks = {}
+        self._student_locks = {}
+        
+        # Availability index: ordered sets of courses with and without free
+        # seats, plus each course's position in the catalog for display order
+        self._index_lock = threading.Lock()
+        self.open_courses = {}
+        self.full_courses = {}
+        self._catalog_position = {}
+        self._next_position = 0
+        
+        # Sorted indexes behind the paginated admin listings, and each
+        # course's roster sorted by student name
+        self.course_indexes = {sort: SortedIndex(key) for sort, key in COURSE_SORT_KEYS.items()}
+        self.student_indexes = {sort: SortedIndex(key) for sort, key in STUDENT_SORT_KEYS.items()}
+        self._rosters = {}
+        
+        # Per-student interval indexes of weekly meetings, built on first use
+        self._timetables = {}
+        
+        # student_id -> ordered set of the courses the student is waitlisted for
+        self._waiting = {}
+        
+        # Versions for caching what is rendered from the data: a course's
+        # version changes with its seats, roster or waitlist, and the catalog
+        # version with any course; student_version changes as students are added
+        self.course_versions = {}
+        self.catalog_version = 0
+        self.student_version = 0
+        
+        # Keeps changes out while a replica is taken. The last replica's
+        # (version, view) of every course, keyed by the live course, and its
+        # student views by ID; the students in a replica add themselves to
+        # the log when they change, and the count finds the ones added since
+        self._gate = ChangeGate()
+        self._replica_courses = {}
+        self._replica_students = {}
+        self._replica_log = set()
+        self._replica_count = 0
+        
+        # Password hashing pool and verification cache
+        self.hasher = default_hasher
+        
+        # Set by storage shared between processes, which runs every change
+        # in a database transaction; see SqliteStorage.transaction()
+        self.coordinator = None
+        
+        # Kept by data_persistence: the snapshot the records' dirty flags are
+        # relative to, and the courses removed since it was written
+        self.snapshot_base = None
+        self.removed_courses = set()
+    
+    def subscribe(self, listener):
+        """Register a callable invoked as listener(event, **details) after each change
+        
+        Listeners run while the locks of the change are held, so they see
+        changes to the same course or student in the order they happened.
+        enroll and payment events carry the new transaction, as does a
+        'transaction' event for one another process made; a 'batch' event
+        carries events=[(event, details), ...] applied together. The
+        'enroll_refused' and 'restore_enrollment' events report enrollments
+        refused or replayed from a log; they change nothing to store. A
+        'reload' event says every record was just replaced from storage;
+        see reloaded().
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, event, **details):
+        for listener in self._listeners:
+            listener(event, **details)
+    
+    @contextlib.contextmanager
+    def _changing(self):
+        """Context of one change, entered before any course or student lock"""
+        if self.coordinator is None:
+            with self._gate.shared():
+                yield
+        else:
+            with self.coordinator.transaction(self), self._gate.shared():
+                yield
+    
+    @timed_operation('snapshot')
+    def snapshot(self):
+        """Return a read-only Replica of the system as it is now
+        
+        Changes wait while the replica is taken. Records unchanged since the
+        previous replica are shared with it rather than copied again, and
+        the changed students are known without looking at the others, so
+        the wait grows with the number of changes. With a coordinator, e.g.
+        in shared mode, the replica is taken inside one of its transactions,
+        so it includes the changes other processes made.
+        
+        Returns:
+            Replica: The point-in-time view
+        """
+        coordinated = contextlib.nullcontext() if self.coordinator is None else self.coordinator.transaction(self)
+        with coordinated, self._gate.exclusive():
+            course_records = {}
+            courses = {}
+            for course_id, course in self.courses.items():
+                version = self.course_versions.get(course_id)
+                record = self._replica_courses.get(course)
+                if record is None or record[0] != version:
+                    record = (version, CourseView(course))
+                course_records[course] = record
+                courses[course_id] = record[1]
+            self._replica_courses = course_records
+            
+            log = self._replica_log
+            changed = []
+            while log:
+                changed.append(log.pop())
+            # Students are never removed, so the ones added since come last
+            added = itertools.islice(self.students.values(), self._replica_count, None)
+            views = dict(self._replica_students)
+            for student in itertools.chain(changed, added):
+                if self.students.get(student.student_id) is student:
+                    student.replica_log = log
+                    views[student.student_id] = StudentView(student)
+            self._replica_students = views
+            self._replica_count = len(self.students)
+            return Replica(courses, views, datetime.datetime.now().replace(microsecond=0))
+    
+    def _lock_for(self, locks, key):
+        with self._registry_lock:
+            lock = locks.get(key)
+            if lock is None:
+                lock = locks[key] = threading.Lock()
+            return lock
+    
+    def course_lock(self, course_id):
+        return self._lock_for(self._course_locks, course_id)
+    
+    def student_lock(self, student_id):
+        return self._lock_for(self._student_locks, student_id)
+    
+    def rebuild_indexes(self):
+        """Recompute derived indexes after courses were loaded in bulk"""
+        with self._index_lock:
+            self.student_version += 1
+            # The records the last replica shared views of were replaced
+            self._replica_courses = {}
+            self._replica_students = {}
+            self._replica_count = 0
+            self.open_courses = {}
+            self.full_courses = {}
+            self._catalog_position = {}
+            self._next_position = 0
+            for course in self.courses.values():
+                self._index_course(course)
+            self._rosters = {course: self._roster_index(course) for course in self.courses.values()}
+            self._timetables = {}
+            self._waiting = {}
+            for course in self.courses.values():
+                for student in course.waitlist:
+                    self._waiting.setdefault(student.student_id, {})[course] = None
+        
+        for index in self.course_indexes.values():
+            index.load(self.courses.items())
+        for index in self.student_indexes.values():
+            index.load(self.students.items())
+    
+    def _roster_index(self, course):
+        roster = SortedIndex(STUDENT_SORT_KEYS['name'])
+        roster.load((student.student_id, student) for student in course.enrolled_students)
+        return roster
+    
+    def _touch_course(self, course):
+        # Called with self._index_lock held
+        self.catalog_version += 1
+        self.course_versions[course.course_id] = self.catalog_version
+    
+    def _waitlist_changed(self, course):
+        course.dirty = True
+        with self._index_lock:
+            self._touch_course(course)
+    
+    def _index_course(self, course):
+        # Called with self._index_lock held
+        self._touch_course(course)
+        self._catalog_position[course] = self._next_position
+        self._next_position += 1
+        if course.is_full():
+            self.full_courses[course] = None
+        else:
+            self.open_courses[course] = None
+    
+    def _unindex_course(self, course):
+        # Called with self._index_lock held
+        self.catalog_version += 1
+        self.course_versions.pop(course.course_id, None)
+        self._catalog_position.pop(course, None)
+        self.open_courses.pop(course, None)
+        self.full_courses.pop(course, None)
+    
+    def _update_availability(self, course):
+        """Move a course between the open and full sets after its roster changed"""
+        with self._index_lock:
+            if course not in self._catalog_position:
+                return
+            self._touch_course(course)
+            if course.is_full():
+                self.open_courses.pop(course, None)
+                self.full_courses[course] = None
+            else:
+                self.full_courses.pop(course, None)
+                self.open_courses[course] = None
+            self.course_indexes['fill'].update(course.course_id, course)
+    
+    @timed_operation('course_availability')
+    def course_availability(self, student):
+        """Courses the student is not enrolled in, in catalog order
+        
+        Built from set differences against the availability index, so the
+        cost follows the number of courses returned rather than catalog size
+        times the student's enrollments.
+        
+        Returns:
+            list: (course, available_seats, is_full) tuples
+        """
+        with self._index_lock:
+            open_courses = self.open_courses.keys() - student.enrolled_courses.keys()
+            full_courses = self.full_courses.keys() - student.enrolled_courses.keys()
+            position = self._catalog_position
+            rows = [(course, course.get_available_seats(), False) for course in open_courses]
+            rows += [(course, 0, True) for course in full_courses]
+        rows.sort(key=lambda row: position.get(row[0], 0))
+        return rows
+    
+    def _timetable(self, student):
+        # Called with the student's lock held
+        timetable = self._timetables.get(student.student_id)
+        if timetable is None:
+            timetable = self._timetables[student.student_id] = Timetable(student.enrolled_courses)
+        return timetable
+    
+    def schedule_conflicts(self, student_id, course_id):
+        """Return the student's courses whose meetings overlap the given course"""
+        course = self.courses.get(course_id)
+        student = self.students.get(student_id)
+        if course is None or student is None:
+            return []
+        with self.student_lock(student_id):
+            clashes = self._timetable(student).conflicts(parse_schedule(course.schedule), ignore=course_id)
+        return [self.courses[clash] for clash in sorted(clashes) if clash in self.courses]
+    
+    @timed_operation('conflict_report')
+    def conflict_report(self):
+        """Find every student enrolled in two courses that meet at the same time
+        
+        Clashing course pairs come from one sweep over all meeting times;
+        only the rosters of those pairs are then intersected.
+        
+        Returns:
+            list: (student, course, course) tuples sorted by student ID
+        """
+        courses = dict(self.courses)
+        report = []
+        for first_id, second_id in sorted(conflicting_course_pairs(courses.values())):
+            first, second = courses[first_id], courses[second_id]
+            for student in first.enrolled_students.keys() & second.enrolled_students.keys():
+                report.append((student, first, second))
+        report.sort(key=lambda row: row[0].student_id)
+        return report
+    
+    def _store_course(self, course):
+        # Called with the course's lock held
+        with self._index_lock:
+            replaced = self.courses.get(course.course_id)
+            if replaced is not None:
+                self._unindex_course(replaced)
+                self._rosters.pop(replaced, None)
+                # Rebuild timetables lazily in case the schedule changed
+                self._timetables = {}
+            self.courses[course.course_id] = course
+            self._index_course(course)
+            self._rosters[course] = self._roster_index(course)
+        for index in self.course_indexes.values():
+            index.add(course.course_id, course)
+    
+    def _store_student(self, student):
+        # Called with the student's lock held
+        if self._replica_count and student.student_id in self.students:
+            # Replaces a student the last replica may hold
+            self._replica_log.add(student)
+        self.students[student.student_id] = student
+        with self._index_lock:
+            self.student_version += 1
+        for index in self.student_indexes.values():
+            index.add(student.student_id, student)
+    
+    def _take_seat(self, student, course):
+        """Enroll with the course and student locks held
+        
+        Returns:
+            str: Why the student could not be enrolled, or None on success
+        """
+        if course in student.enrolled_courses:
+            return "already enrolled"
+        if course.is_full():
+            return COURSE_FULL
+        timetable = self._timetable(student)
+        meetings = parse_schedule(course.schedule)
+        clashes = timetable.conflicts(meetings, ignore=course.course_id)
+        if clashes:
+            return f"schedule conflicts with {', '.join(sorted(clashes))}"
+        if not student.enroll(course):
+            return "enrollment refused"
+        timetable.add(course.course_id, meetings)
+        self._update_availability(course)
+        roster = self._rosters.get(course)
+        if roster is not None:
+            roster.add(student.student_id, student)
+        return None
+    
+    @timed_operation('add_course')
+    def add_course(self, course):
+        with self._changing(), self.course_lock(course.course_id):
+            self._store_course(course)
+            self._notify('add_course', course=course)
+    
+    @timed_operation('remove_course', count_outcome=True)
+    def remove_course(self, course_id):
+        with self._changing(), self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            if course is None:
+                return False
+            # Automatically drop all students from this course
+            for student in list(course.enrolled_students):
+                with self.student_lock(student.student_id):
+                    student.drop(course)
+                    timetable = self._timetables.get(student.student_id)
+                    if timetable is not None:
+                        timetable.remove(course_id, parse_schedule(course.schedule))
+            # Nobody can wait for a course that no longer exists
+            while course.waitlist:
+                student = course.waitlist.popleft()
+                with self.student_lock(student.student_id):
+                    self._waiting.get(student.student_id, {}).pop(course, None)
+            with self._index_lock:
+                del self.courses[course_id]
+                self.removed_courses.add(course_id)
+                self._unindex_course(course)
+                self._rosters.pop(course, None)
+            for index in self.course_indexes.values():
+                index.discard(course_id)
+            self._notify('remove_course', course=course)
+            return True
+    
+    @timed_operation('add_student')
+    def add_student(self, student):
+        """Add a new student, hashing the password they chose
+        
+        The password is always taken as plaintext, even if it looks like a
+        stored hash; records read back from storage use restore_student().
+        """
+        # Hash before taking the lock; the KDF is deliberately slow
+        student.password = self.hasher.hash(student.password)
+        self.restore_student(student)
+    
+    def restore_student(self, student):
+        """Add a student whose password is stored already, e.g. from a log
+        
+        Listeners get the same 'add_student' event as for add_student().
+        """
+        with self._changing(), self.student_lock(student.student_id):
+            self._store_student(student)
+            self._notify('add_student', student=student)
+    
+    @timed_operation('enroll', count_outcome=True)
+    def enroll(self, student_id, course_id):
+        """Atomically enroll a student, charging the enrollment fee
+        
+        Enrollment is refused when the course meets at the same time as one
+        the student already takes; schedule_conflicts() tells which.
+        
+        Returns:
+            bool: True if the student took a seat, False otherwise
+        """
+        with self._changing(), self.course_lock(course_id):
+            # Look up under the lock so a concurrent remove_course is seen
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return False
+            with self.student_lock(student_id):
+                reason = self._take_seat(student, course)
+                if reason is not None:
+                    self._notify('enroll_refused', student=student, course=course, reason=reason)
+                    return False
+                self._notify('enroll', student=student, course=course,
+                             transaction=student.transactions[-1])
+                return True
+    
+    @timed_operation('drop', count_outcome=True)
+    def drop(self, student_id, course_id):
+        """Atomically drop a student from a course
+        
+        The freed seat goes straight to the head of the course's waitlist,
+        under the same course lock, so nobody can take it in between.
+        
+        Returns:
+            bool: True if the student was enrolled and has been dropped
+        """
+        with self._changing(), self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return False
+            with self.student_lock(student_id):
+                if not student.drop(course):
+                    return False
+                timetable = self._timetables.get(student_id)
+                if timetable is not None:
+                    timetable.remove(course_id, parse_schedule(course.schedule))
+                self._update_availability(course)
+                roster = self._rosters.get(course)
+                if roster is not None:
+                    roster.discard(student_id)
+                self._notify('drop', student=student, course=course)
+            # The dropping student's lock is released first: holding two
+            # student locks at once could deadlock against a batch import
+            self._promote(course)
+            return True
+    
+    def _promote(self, course):
+        """Enroll waitlisted students while the course has free seats
+        
+        Called with the course's lock held. A student who can no longer take
+        the seat, e.g. after enrolling in a course at the same time, loses
+        their place and the next student is tried.
+        """
+        while course.waitlist and not course.is_full():
+            student = course.waitlist.popleft()
+            with self.student_lock(student.student_id):
+                self._waiting.get(student.student_id, {}).pop(course, None)
+                if self.students.get(student.student_id) is student and \
+                        self._take_seat(student, course) is None:
+                    self._notify('enroll', student=student, course=course,
+                                 transaction=student.transactions[-1])
+                else:
+                    self._waitlist_changed(course)
+                    self._notify('waitlist_leave', student=student, course=course)
+    
+    @timed_operation('join_waitlist', count_outcome=True)
+    def join_waitlist(self, student_id, course_id):
+        """Queue a student for a seat in a full course
+        
+        Returns:
+            int: The student's position in line, or None if the course has
+                free seats, the student already takes it, or either is unknown
+        """
+        with self._changing(), self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return None
+            with self.student_lock(student_id):
+                if course in student.enrolled_courses or not course.is_full():
+                    return None
+                if student not in course.waitlist:
+                    course.waitlist.append(student)
+                    self._waiting.setdefault(student_id, {})[course] = None
+                    self._waitlist_changed(course)
+                    self._notify('waitlist_join', student=student, course=course)
+                return course.waitlist.position(student)
+    
+    @timed_operation('leave_waitlist', count_outcome=True)
+    def leave_waitlist(self, student_id, course_id):
+        """Take a student off a course's waitlist
+        
+        Returns:
+            bool: True if the student was waiting
+        """
+        with self._changing(), self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return False
+            with self.student_lock(student_id):
+                if not course.waitlist.discard(student):
+                    return False
+                self._waiting.get(student_id, {}).pop(course, None)
+                self._waitlist_changed(course)
+                self._notify('waitlist_leave', student=student, course=course)
+                return True
+    
+    def waitlist_position(self, student_id, course_id):
+        """Return the student's place in a course's waitlist, or None"""
+        course = self.courses.get(course_id)
+        student = self.students.get(student_id)
+        if course is None or student is None:
+            return None
+        with self.course_lock(course_id):
+            return course.waitlist.position(student)
+    
+    def waitlist_positions(self, student):
+        """Return {course: position} for every course the student waits for"""
+        positions = {}
+        for course in list(self._waiting.get(student.student_id, ())):
+            with self.course_lock(course.course_id):
+                position = course.waitlist.position(student)
+            if position is not None:
+                positions[course] = position
+        return positions
+    
+    @timed_operation('make_payment', count_outcome=True)
+    def make_payment(self, student_id, amount, payment_method):
+        """Atomically record a payment against the student's balance
+        
+        Returns:
+            bool: True if the payment was accepted
+        """
+        with self._changing(), self.student_lock(student_id):
+            student = self.students.get(student_id)
+            if student is None or not student.make_payment(amount, payment_method):
+                return False
+            self._notify('payment', student=student, transaction=student.transactions[-1])
+            return True
+    
+    def restore_enrollment(self, student_id, course_id, enrolled=True):
+        """Enroll or drop a student as recorded in a log, without charging
+        
+        Used when replaying the journal and changes made by other processes.
+        Unlike drop(), a drop does not promote from the waitlist; the log
+        holds the enrollments the promotion made. Listeners get a
+        'restore_enrollment' event, which storage ignores.
+        
+        Returns:
+            bool: True if the enrollment changed
+        """
+        with self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return False
+            with self.student_lock(student_id):
+                timetable = self._timetables.get(student_id)
+                roster = self._rosters.get(course)
+                if enrolled:
+                    if course in student.enrolled_courses or not course.enroll_student(student):
+                        return False
+                    student.enrolled_courses[course] = None
+                    student.touch()
+                    # A promotion from the waitlist is logged as an enroll
+                    if course.waitlist.discard(student):
+                        self._waiting.get(student_id, {}).pop(course, None)
+                    if timetable is not None:
+                        timetable.add(course_id, parse_schedule(course.schedule))
+                    if roster is not None:
+                        roster.add(student_id, student)
+                else:
+                    if not student.drop(course):
+                        return False
+                    if timetable is not None:
+                        timetable.remove(course_id, parse_schedule(course.schedule))
+                    if roster is not None:
+                        roster.discard(student_id)
+                self._update_availability(course)
+                self._notify('restore_enrollment', student=student, course=course, enrolled=enrolled)
+                return True
+    
+    def restore_waitlist(self, student_id, course_id, waiting=True):
+        """Add a student to or take them off a waitlist as recorded in a log
+        
+        Returns:
+            bool: True if the waitlist changed
+        """
+        with self.course_lock(course_id):
+            course = self.courses.get(course_id)
+            student = self.students.get(student_id)
+            if course is None or student is None:
+                return False
+            with self.student_lock(student_id):
+                if waiting:
+                    if student in course.waitlist:
+                        return False
+                    course.waitlist.append(student)
+                    self._waiting.setdefault(student_id, {})[course] = None
+                else:
+                    if not course.waitlist.discard(student):
+                        return False
+                    self._waiting.get(student_id, {}).pop(course, None)
+                self._waitlist_changed(course)
+                return True
+    
+    def reloaded(self, transactions):
+        """Tell listeners that storage replaced every record in bulk
+        
+        Listeners get a 'reload' event carrying the system and the
+        transactions callable, so copies derived from the records, e.g. the
+        finance ledger, can be rebuilt instead of going stale.
+        
+        Args:
+            transactions (callable): Returns a fresh iterator of (student,
+                Transaction) pairs for every stored transaction
+        """
+        self._notify('reload', system=self, transactions=transactions)
+    
+    def restore_transaction(self, student_id, transaction, in_history=False):
+        """Apply a charge or payment another process already stored
+        
+        Listeners get a 'transaction' event carrying it.
+        
+        Args:
+            student_id (str): Student the transaction belongs to
+            transaction (Transaction): The stored transaction
+            in_history (bool): The student's history already holds it, e.g.
+                one that has yet to be read from storage
+        
+        Returns:
+            bool: False if the student is unknown
+        """
+        with self.student_lock(student_id):
+            student = self.students.get(student_id)
+            if student is None:
+                return False
+            if not in_history:
+                student.transactions.append(transaction)
+            student.touch()
+            if transaction.type == "charge":
+                student.balance += transaction.amount
+            elif transaction.type == "payment":
+                student.balance -= transaction.amount
+            self._notify('transaction', student=student, transaction=transaction)
+            return True
+    
+    def _archive(self, student, before, entries):
+        # Called with the student's lock held
+        if entries and entries[0] in student.archive:
+            return False
+        kept = []
+        for transaction in student.transactions:
+            if transaction.timestamp >= before:
+                kept.append(transaction)
+            elif transaction.type == "charge":
+                student.archived_charged += transaction.amount
+            elif transaction.type == "payment":
+                student.archived_paid += transaction.amount
+        student.transactions = kept
+        student.archive += tuple(entries)
+        student.touch()
+        return True
+    
+    @timed_operation('archive_transactions')
+    def archive_transactions(self, archived):
+        """Drop transactions that have been copied into the archive
+        
+        The balance is unchanged; what the transactions charged and paid
+        moves to the student's archived totals. Listeners get one 'batch'
+        event of 'archive' events.
+        
+        Args:
+            archived (list): (student_id, before, entries) triples: every
+                transaction of the student dated before the timestamp
+                `before` is stored in the archive blocks that the
+                (term, file, offset, length) entries point to
+        
+        Returns:
+            int: Number of transactions dropped
+        """
+        events = []
+        dropped = 0
+        with self._changing():
+            for student_id, before, entries in archived:
+                with self.student_lock(student_id):
+                    student = self.students.get(student_id)
+                    if student is None:
+                        continue
+                    count = len(student.transactions)
+                    if self._archive(student, before, entries):
+                        dropped += count - len(student.transactions)
+                        events.append(('archive', {'student': student, 'before': before, 'entries': entries}))
+            if events:
+                self._notify('batch', events=events)
+        return dropped
+    
+    def restore_archive(self, student_id, before, entries):
+        """Drop archived transactions as recorded in a log
+        
+        Returns:
+            bool: False if the student is unknown or the entries are applied already
+        """
+        with self.student_lock(student_id):
+            student = self.students.get(student_id)
+            return student is not None and self._archive(student, before, entries)
+    
+    @timed_operation('import_batch')
+    def import_batch(self, open_rows, on_result=None):
+        """Add courses and students and enroll students from a stream of rows
+        
+        Each row is a dict whose 'type' is 'course' (course_id, name,
+        instructor, schedule, capacity and optional fee), 'student'
+        (student_id, name, grade_level, password) or 'enroll' (student_id,
+        course_id). Rows are checked for duplicates, capacity and schedule
+        conflicts in file order, so earlier rows of the batch count.
+        
+        The rows are read twice and never kept: once to find the courses and
+        students involved and hash the new passwords, then again to validate
+        and apply them with all of their locks held. Listeners receive a
+        single 'batch' event holding every change, so storage writes the
+        whole batch at once.
+        
+        Args:
+            open_rows (callable): Returns a fresh iterator of
+                (line_number, row) pairs each time it is called
+            on_result (callable, optional): Called as
+                on_result(line_number, row_type, error) for every row, where
+                error is None if the row was applied
+        
+        Returns:
+            dict: Counts of 'applied' and 'failed' rows
+        """
+        course_ids = set()
+        student_ids = set()
+        passwords = {}  # line number -> plaintext password of a student row
+        for line_number, row in open_rows():
+            if row.get('course_id'):
+                course_ids.add(str(row['course_id']))
+            if row.get('student_id'):
+                student_ids.add(str(row['student_id']))
+            if row.get('type') == 'student' and row.get('password') is not None:
+                passwords[line_number] = str(row['password'])
+        
+        # Hash in parallel before taking any lock; the KDF is deliberately slow
+        hashes = dict(zip(passwords, self.hasher.hash_many(list(passwords.values()))))
+        
+        counts = {'applied': 0, 'failed': 0}
+        events = []
+        with self._changing(), contextlib.ExitStack() as locks:
+            # Same order as everywhere else: courses before students
+            for course_id in sorted(course_ids):
+                locks.enter_context(self.course_lock(course_id))
+            for student_id in sorted(student_ids):
+                locks.enter_context(self.student_lock(student_id))
+            
+            for line_number, row in open_rows():
+                row_type = row.get('type')
+                try:
+                    error = self._apply_row(row_type, row, events, hashes.get(line_number))
+                except (KeyError, TypeError, ValueError) as exc:
+                    error = f"invalid row: {exc}"
+                counts['failed' if error else 'applied'] += 1
+                if on_result is not None:
+                    on_result(line_number, row_type, error)
+            
+            if events:
+                self._notify('batch', events=events)
+        return counts
+    
+    def _apply_row(self, row_type, row, events, password=None):
+        # Called by import_batch with every lock of the batch held; password
+        # is the hash of a student row's password, computed beforehand
+        if row_type == 'course':
+            course_id = str(row['course_id'])
+            if course_id in self.courses:
+                return "course already exists"
+            fee = row.get('fee')
+            course = Course(course_id, row['name'], row['instructor'], row['schedule'],
+                            int(row['capacity']), float(fee) if fee not in (None, '') else 1000)
+            if course.capacity <= 0:
+                return "capacity must be positive"
+            self._store_course(course)
+            events.append(('add_course', {'course': course}))
+        elif row_type == 'student':
+            student_id = str(row['student_id'])
+            if student_id in self.students:
+                return "student already exists"
+            if password is None:
+                return "missing password"
+            student = Student(student_id, row['name'], int(row['grade_level']), password)
+            self._store_student(student)
+            events.append(('add_student', {'student': student}))
+        elif row_type == 'enroll':
+            student = self.students.get(str(row['student_id']))
+            course = self.courses.get(str(row['course_id']))
+            if student is None:
+                return "unknown student"
+            if course is None:
+                return "unknown course"
+            error = self._take_seat(student, course)
+            if error:
+                return error
+            events.append(('enroll', {'student': student, 'course': course,
+                                      'transaction': student.transactions[-1]}))
+        else:
+            return f"unknown row type {row_type!r}"
+        return None
+    
+    def add_admin(self, admin_id, name, password):
+        """Add an admin, always hashing the password"""
+        self.restore_admin(admin_id, name, self.hasher.hash(password))
+    
+    def restore_admin(self, admin_id, name, password):
+        """Add an admin whose password is stored already"""
+        self.admins[admin_id] = {"name": name, "password": password}
+    
+    def get_course(self, course_id):
+        return self.courses.get(course_id)
+    
+    def get_student(self, student_id):
+        return self.students.get(student_id)
+    
+    @timed_operation('verify_admin', count_outcome=True)
+    def verify_admin(self, admin_id, password):
+        admin = self.admins.get(admin_id)
+        if admin is None or not self.hasher.verify(f"admin:{admin_id}", password, admin["password"]):
+            return False
+        if not is_hashed(admin["password"]):
+            # Upgrade a legacy plaintext password now that we know it
+            hashed = self.hasher.hash(password)
+            with self._changing():
+                admin["password"] = hashed
+                self._notify('set_admin_password', admin_id=admin_id, password=hashed)
+        return True
+    
+    @timed_operation('verify_student', count_outcome=True)
+    def verify_student(self, student_id, password):
+        """Check a student's password
+        
+        Returns:
+            Student: The student if the password matches, None otherwise
+        """
+        student = self.students.get(student_id)
+        if student is None or not self.hasher.verify(f"student:{student_id}", password, student.password):
+            return None
+        if not is_hashed(student.password):
+            # Upgrade a legacy plaintext password now that we know it
+            hashed = self.hasher.hash(password)
+            with self._changing(), self.student_lock(student_id):
+                student.password = hashed
+                student.touch()
+                self._notify('set_password', student=student)
+        return student
+    
+    def hash_plaintext_passwords(self):
+        """Hash every password still stored in plaintext, as one batch
+        
+        Returns:
+            int: Number of passwords hashed
+        """
+        students = [student for student in self.students.values() if not is_hashed(student.password)]
+        admin_ids = [admin_id for admin_id, admin in self.admins.items() if not is_hashed(admin["password"])]
+        hashes = self.hasher.hash_many([student.password for student in students] +
+                                       [self.admins[admin_id]["password"] for admin_id in admin_ids])
+        
+        events = []
+        with self._changing():
+            for student, password in zip(students, hashes):
+                with self.student_lock(student.student_id):
+                    student.password = password
+                    student.touch()
+                events.append(('set_password', {'student': student}))
+            for admin_id, password in zip(admin_ids, hashes[len(students):]):
+                self.admins[admin_id]["password"] = password
+                events.append(('set_admin_password', {'admin_id': admin_id, 'password': password}))
+            if events:
+                self._notify('batch', events=events)
+        return len(events)
+    
+    def list_all_courses(self):
+        return list(self.courses.values())
+    
+    def list_all_students(self):
+        return list(self.students.values())
+    
+    @timed_operation('list_courses')
+    def list_courses(self, sort='name', after=None, limit=25, query=None, descending=False):
+        """Return one page of courses for the admin listing
+        
+        Args:
+            sort (str): One of COURSE_SORT_KEYS
+            after (str, optional): Cursor returned with the previous page
+            limit (int): Page size
+            query (str, optional): Text to search for in the course ID,
+                name and instructor, ignoring case
+            descending (bool): Reverse the sort order
+        
+        Returns:
+            tuple: (courses, next_cursor) where next_cursor is None on the last page
+        """
+        index = self.course_indexes.get(sort, self.course_indexes['name'])
+        predicate = _text_filter(query, ('course_id', 'name', 'instructor'))
+        courses, last = index.page(decode_cursor(after), limit, descending, predicate)
+        return courses, encode_cursor(last)
+    
+    @timed_operation('list_students')
+    def list_students(self, sort='name', after=None, limit=25, query=None, descending=False):
+        """Return one page of students for the admin listing
+        
+        Args:
+            sort (str): One of STUDENT_SORT_KEYS
+            after (str, optional): Cursor returned with the previous page
+            limit (int): Page size
+            query (str, optional): Text to search for in the student ID
+                and name, ignoring case
+            descending (bool): Reverse the sort order
+        
+        Returns:
+            tuple: (students, next_cursor) where next_cursor is None on the last page
+        """
+        index = self.student_indexes.get(sort, self.student_indexes['name'])
+        predicate = _text_filter(query, ('student_id', 'name'))
+        students, last = index.page(decode_cursor(after), limit, descending, predicate)
+        return students, encode_cursor(last)
+    
+    @timed_operation('roster_page')
+    def roster_page(self, course, after=None, limit=50):
+        """Return one page of a course's students, sorted by name
+        
+        Returns:
+            tuple: (students, next_cursor) where next_cursor is None on the last page
+        """
+        roster = self._rosters.get(course)
+        if roster is None:
+            return [], None
+        students, last = roster.page(decode_cursor(after), limit)
+        return students, encode_cursor(last)
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Reports over read-only replicas of the enrollment data
+
+Every report is a function of a Replica (see EnrollmentSystem.snapshot())
+that returns plain rows, so it runs the same over a replica taken in the
+serving process or over one a ReportWorker process loads from storage.
+Either way the report reads a point-in-time copy and takes no lock that
+enroll or drop requests need.
+
+Reports are not free for the serving process: changes wait while a
+replica is taken, and the reports themselves compete for the GIL with
+request threads. Reports arriving together share one replica (see
+AppState.replica()), and benchmarks/bench_replica.py measures what they
+cost enroll and drop throughput.
+
+A ReportWorker moves that work to another process, which loads the data
+from storage once and then, for JSON data, brings it up to date by
+replaying the new journal records.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+from data_persistence import catch_up_journal
+from models import EnrollmentSystem
+from schedule import conflicting_course_pairs
+from storage import get_storage
+
+# Reports by name, for running them in a worker process
+REPORTS = {}
+
+
+def report(function):
+    REPORTS[function.__name__] = function
+    return function
+
+
+@report
+def roster_rows(replica, course_id):
+    """CSV rows of a course's roster, sorted by name; None for an unknown course"""
+    students = replica.roster(course_id)
+    if students is None:
+        return None
+    rows = [['student_id', 'name', 'grade_level']]
+    rows += [[student.student_id, student.name, student.grade_level]
+             for student in sorted(students, key=lambda student: (student.name.casefold(), student.student_id))]
+    return rows
+
+
+@report
+def enrollment_rows(replica):
+    """CSV rows of every course with its seats, enrollment and waitlist"""
+    rows = [['course_id', 'name', 'instructor', 'schedule', 'capacity', 'enrolled', 'waitlisted', 'fill']]
+    for course in replica.courses.values():
+        enrolled = len(course.student_ids)
+        rows.append([course.course_id, course.name, course.instructor, course.schedule, course.capacity,
+                     enrolled, len(course.waitlist_ids),
+                     round(enrolled / course.capacity, 4) if course.capacity > 0 else 1.0])
+    return rows
+
+
+@report
+def conflict_rows(replica):
+    """Every student enrolled in two courses that meet at the same time, sorted by student ID"""
+    rows = []
+    for first_id, second_id in sorted(conflicting_course_pairs(replica.courses.values())):
+        first, second = replica.courses[first_id], replica.courses[second_id]
+        for student_id in set(first.student_ids).intersection(second.student_ids):
+            student = replica.students.get(student_id)
+            if student is not None:
+                rows.append({'student_id': student_id, 'name': student.name, 'courses': [first_id, second_id]})
+    rows.sort(key=lambda row: row['student_id'])
+    return rows
+
+
+class ReportWorker:
+    """Runs reports in a separate process over the stored data
+    
+    The worker loads the data directory like a starting app would and takes
+    a replica, so reports cost the serving process neither CPU nor the
+    brief pause of taking a replica. When the files have changed and the
+    replica is more than max_age seconds old, the worker brings it up to
+    date: with the JSON backend by replaying the new journal records into
+    the data it loaded, otherwise by loading everything again.
+    """
+    
+    def __init__(self, backend, data_dir, max_age=1.0):
+        self.backend = backend
+        self.data_dir = data_dir
+        self.max_age = max_age
+        # Spawned rather than forked: the serving process has threads and locks
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context('spawn'))
+    
+    def run(self, name, *args):
+        """Run the named report and return its rows"""
+        return self._executor.submit(_run_report, self.backend, self.data_dir, self.max_age, name, args).result()
+    
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# The worker's data, the last journal record in it, its replica, when the
+# files were last checked and how they looked. Only _run_report and _refresh
+# touch it, so this is state of the spawned worker process alone; the serving
+# process never loads data into its own copy.
+_loaded = {'system': None, 'journal_seq': 0, 'replica': None, 'checked_at': None, 'signature': None}
+
+
+def _data_signature(data_dir):
+    signature = []
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                # A temp file renamed into place while listing
+                continue
+    return sorted(signature)
+
+
+def _refresh(backend, data_dir):
+    system = _loaded['system']
+    if system is not None and backend == 'json':
+        journal_seq = catch_up_journal(system, data_dir, _loaded['journal_seq'])
+        if journal_seq is not None:
+            _loaded.update(journal_seq=journal_seq, replica=system.snapshot())
+            return
+    
+    system = EnrollmentSystem()
+    stats = {}
+    storage = get_storage(backend, data_dir)
+    try:
+        storage.load(system, stats)
+    finally:
+        storage.close()
+    _loaded.update(system=system, journal_seq=stats.get('journal_seq', 0), replica=system.snapshot())
+
+
+def _run_report(backend, data_dir, max_age, name, args):
+    # Runs in the worker process
+    now = time.monotonic()
+    if _loaded['checked_at'] is None or now - _loaded['checked_at'] > max_age:
+        signature = _data_signature(data_dir)
+        if signature != _loaded['signature']:
+            _refresh(backend, data_dir)
+            _loaded['signature'] = signature
+        _loaded['checked_at'] = now
+    return REPORTS[name](_loaded['replica'], *args)
@@ -0,0 +1,117 @@
+"""Course schedule parsing and conflict detection
+
+A schedule such as "MWF 9:00-10:30" or "TTh 10:30-12:00; S 8:00-11:00"
+becomes a tuple of (start, end) intervals counted in minutes from Monday
+00:00, so overlapping meetings are plain interval overlaps.
+"""
+import bisect
+import functools
+import heapq
+import re
+
+MINUTES_PER_DAY = 24 * 60
+
+# Longer codes first so "TTh" reads as Tuesday, Thursday
+DAY_CODES = {'M': 0, 'Tu': 1, 'T': 1, 'W': 2, 'Th': 3, 'R': 3, 'F': 4, 'Sa': 5, 'S': 5, 'Su': 6}
+DAY_PATTERN = re.compile('|'.join(sorted(DAY_CODES, key=len, reverse=True)))
+MEETING_PATTERN = re.compile(r'^\s*([A-Za-z]+)\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+
+
+def _parse_days(days):
+    codes = DAY_PATTERN.findall(days)
+    if ''.join(codes) != days:
+        return None
+    return [DAY_CODES[code] for code in codes]
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_schedule(schedule):
+    """Parse a schedule string into sorted weekly (start, end) minute intervals
+    
+    Meetings are separated by ';' or ','. Returns an empty tuple when the
+    text cannot be read, so free-form schedules never cause conflicts.
+    """
+    intervals = []
+    for meeting in re.split(r'[;,]', schedule or ''):
+        match = MEETING_PATTERN.match(meeting)
+        if not match:
+            return ()
+        days = _parse_days(match.group(1))
+        start = int(match.group(2)) * 60 + int(match.group(3))
+        end = int(match.group(4)) * 60 + int(match.group(5))
+        if not days or start >= end or end > MINUTES_PER_DAY:
+            return ()
+        for day in days:
+            offset = day * MINUTES_PER_DAY
+            intervals.append((offset + start, offset + end))
+    return tuple(sorted(intervals))
+
+
+class Timetable:
+    """One student's weekly meetings, sorted by start time
+    
+    Enrollments made before conflicts were checked may overlap each other,
+    so a meeting that ends late can hide behind later ones. A new interval
+    is compared with every meeting starting before its end and no more
+    than the longest meeting's length before its start.
+    """
+    
+    def __init__(self, courses=()):
+        self._entries = []  # Sorted (start, end, course_id)
+        self._longest = 0  # Upper bound on end - start; not lowered by remove()
+        for course in courses:
+            self.add(course.course_id, parse_schedule(course.schedule))
+    
+    def conflicts(self, intervals, ignore=None):
+        """Return the IDs of courses with a meeting overlapping any interval"""
+        entries = self._entries
+        found = set()
+        for start, end in intervals:
+            position = bisect.bisect_left(entries, (start,))
+            after = position
+            while after < len(entries) and entries[after][0] < end:
+                found.add(entries[after][2])
+                after += 1
+            earliest = start - self._longest
+            before = position - 1
+            while before >= 0 and entries[before][0] >= earliest:
+                if entries[before][1] > start:
+                    found.add(entries[before][2])
+                before -= 1
+        found.discard(ignore)
+        return found
+    
+    def add(self, course_id, intervals):
+        for start, end in intervals:
+            bisect.insort(self._entries, (start, end, course_id))
+            self._longest = max(self._longest, end - start)
+    
+    def remove(self, course_id, intervals):
+        for start, end in intervals:
+            position = bisect.bisect_left(self._entries, (start, end, course_id))
+            if position < len(self._entries) and self._entries[position] == (start, end, course_id):
+                del self._entries[position]
+
+
+def conflicting_course_pairs(courses):
+    """Find every pair of courses whose meetings overlap
+    
+    One sweep over all meetings sorted by start time, keeping a heap of the
+    meetings still in progress.
+    
+    Returns:
+        set: (course_id, course_id) pairs, each sorted
+    """
+    meetings = sorted((start, end, course.course_id)
+                      for course in courses
+                      for start, end in parse_schedule(course.schedule))
+    in_progress = []  # Heap of (end, course_id)
+    pairs = set()
+    for start, end, course_id in meetings:
+        while in_progress and in_progress[0][0] <= start:
+            heapq.heappop(in_progress)
+        for _, other in in_progress:
+            if other != course_id:
+                pairs.add((other, course_id) if other < course_id else (course_id, other))
+        heapq.heappush(in_progress, (end, course_id))
+    return pairs
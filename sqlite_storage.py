@@ -0,0 +1,565 @@
+"""SQLite storage backend
+
+Courses, students, enrollments and transactions live in indexed tables of
+one WAL-mode database. Each change published by EnrollmentSystem becomes a
+few row-level statements in a single transaction instead of a rewrite of
+the whole data set. Transaction histories, which make up most of the data,
+are only read from the database when a student's ledger is first used.
+
+Bounded memory is deliberately out of scope for this backend. Courses,
+students, enrollments and waitlists are all read at startup and stay in
+memory, because every query in app.py and the indexes in models.py work
+over those dicts. Startup still reads the whole catalog and every roster,
+and resident memory grows with the number of students and enrollments.
+Loading them on demand needs the queries to move into SQL first.
+
+In shared mode several processes work on one database. Every change is
+also appended to a change log, and each process keeps its in-memory copy
+current by replaying the changes other processes logged since it last
+looked. A change runs inside one BEGIN IMMEDIATE transaction that first
+catches up with the log, so capacity and balance checks always see the
+latest state of every process.
+
+Migrate the existing JSON files with:
+    python sqlite_storage.py migrate --data-dir data
+"""
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from data_persistence import apply_journal_record, journal_records
+from metrics import PERSISTENCE_SECONDS, replaying
+from models import Course, Student, EnrollmentSystem, Transaction
+from storage import Storage
+
+DB_FILE = 'enrollment.db'
+
+# Time spent per persistence stage, for the admin metrics endpoint
+_write_timer = PERSISTENCE_SECONDS.labels(stage='sqlite_write')
+_load_timer = PERSISTENCE_SECONDS.labels(stage='load')
+_sync_timer = PERSISTENCE_SECONDS.labels(stage='sqlite_sync')
+
+# Change log entries kept for processes that have fallen behind; one further
+# back reloads everything
+KEEP_CHANGES = 100000
+PRUNE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    instructor TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    fee NUMERIC NOT NULL DEFAULT 1000
+);
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    grade_level INTEGER NOT NULL,
+    password TEXT NOT NULL,
+    balance NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS enrollments (
+    course_id TEXT NOT NULL REFERENCES courses(course_id),
+    student_id TEXT NOT NULL REFERENCES students(student_id),
+    PRIMARY KEY (course_id, student_id)
+);
+CREATE INDEX IF NOT EXISTS enrollments_by_student ON enrollments(student_id);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL REFERENCES students(student_id),
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount NUMERIC NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_by_student ON transactions(student_id, id);
+CREATE TABLE IF NOT EXISTS waitlist (
+    course_id TEXT NOT NULL REFERENCES courses(course_id),
+    student_id TEXT NOT NULL REFERENCES students(student_id),
+    PRIMARY KEY (course_id, student_id)
+);
+CREATE TABLE IF NOT EXISTS admins (
+    admin_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+"""
+
+
+class LazyTransactions(list):
+    """Transaction list that is read from the database on first use"""
+    
+    _load_lock = threading.Lock()
+    
+    def __init__(self, loader):
+        super().__init__()
+        self._loader = loader
+    
+    @property
+    def loaded(self):
+        return self._loader is None
+    
+    def _load(self):
+        loader = self._loader
+        if loader is not None:
+            # Read outside the lock: the loader waits for the storage lock,
+            # which a change in progress holds while it appends here
+            transactions = loader()
+            with self._load_lock:
+                if self._loader is not None:
+                    super().extend(transactions)
+                    self._loader = None
+    
+    def __iter__(self):
+        self._load()
+        return super().__iter__()
+    
+    def __reversed__(self):
+        self._load()
+        return super().__reversed__()
+    
+    def __len__(self):
+        self._load()
+        return super().__len__()
+    
+    def __getitem__(self, index):
+        self._load()
+        return super().__getitem__(index)
+    
+    def append(self, transaction):
+        self._load()
+        super().append(transaction)
+
+
+class SqliteStorage(Storage):
+    """Row-level persistence in a WAL-mode SQLite database"""
+    
+    def __init__(self, data_dir='data', db_file=DB_FILE, shared=False):
+        """
+        Args:
+            data_dir (str): Directory holding the database
+            db_file (str): Database file name
+            shared (bool): Other processes use the database at the same time;
+                see the module docstring
+        """
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, db_file)
+        self.shared = shared
+        # One shared connection; the lock keeps each change in its own transaction
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        
+        # Shared mode: the last change log entry applied here, and the
+        # database's data_version when it was read
+        self.version = 0
+        self.replayed = 0
+        self._data_version = None
+        self._origin = uuid.uuid4().hex
+        self._depth = 0
+        self._replaying = False
+        self._writes = 0
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        return conn
+    
+    def reopen(self):
+        # Lazily loaded transaction lists keep working: they call back into this object
+        with self._lock:
+            self._conn = self._connect()
+            # Changes made by the parent process are not ours to skip
+            self._origin = uuid.uuid4().hex
+            self._data_version = None
+    
+    def _write(self, statements, records=()):
+        """Run (sql, params) pairs atomically
+        
+        In shared mode the journal-style records describing the change go
+        into the change log in the same transaction.
+        """
+        with self._lock, _write_timer.time():
+            if self._depth:
+                # Part of the transaction() already open around this change
+                self._execute(statements, records)
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._execute(statements, records)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def _execute(self, statements, records):
+        for sql, params in statements:
+            self._conn.execute(sql, params)
+        if not self.shared:
+            return
+        for record in records:
+            cursor = self._conn.execute("INSERT INTO changes (origin, record) VALUES (?, ?)",
+                                        (self._origin, json.dumps(record, separators=(',', ':'))))
+            self.version = cursor.lastrowid
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._conn.execute("DELETE FROM changes WHERE version <= ?", (self.version - KEEP_CHANGES,))
+    
+    @contextlib.contextmanager
+    def transaction(self, enrollment_system):
+        """Hold the database write lock for one change to the system
+        
+        Changes other processes logged are applied first, so the change is
+        checked against the latest state; the statements listeners write
+        for it join the same transaction. Installed as the system's
+        coordinator in shared mode, and entered before any course or
+        student lock.
+        """
+        with self._lock:
+            if self._depth or self._replaying:
+                # Nested change, or a logged change being replayed
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                self._catch_up(enrollment_system)
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+    
+    def sync(self, enrollment_system):
+        """Apply the changes other processes logged since the last sync
+        
+        Costs one PRAGMA when nothing changed. Called before each request
+        in shared mode.
+        
+        Returns:
+            int: Number of changes applied
+        """
+        with self._lock:
+            if self._depth:
+                return 0
+            return self._catch_up(enrollment_system)
+    
+    def _catch_up(self, enrollment_system):
+        # Called with the lock held
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return 0
+        self._data_version = data_version
+        
+        with _sync_timer.time():
+            rows = self._conn.execute(
+                "SELECT version, origin, record FROM changes WHERE version > ? ORDER BY version",
+                (self.version,)).fetchall()
+            if rows and rows[0][0] != self.version + 1 and self._conn.execute(
+                    "SELECT MIN(version) FROM changes").fetchone()[0] > self.version + 1:
+                # Fallen further behind than the log reaches
+                return self._reload(enrollment_system)
+            
+            applied = 0
+            self._replaying = True
+            try:
+                with replaying():
+                    for version, origin, record in rows:
+                        self.version = version
+                        if origin == self._origin:
+                            continue
+                        record = json.loads(record)
+                        if record['op'] == 'reload':
+                            return self._reload(enrollment_system)
+                        self._apply_change(enrollment_system, record)
+                        applied += 1
+            finally:
+                self._replaying = False
+            self.replayed += applied
+            return applied
+    
+    def _apply_change(self, enrollment_system, record):
+        if record['op'] in ('charge', 'payment'):
+            student = enrollment_system.get_student(record['student_id'])
+            if student is None:
+                return
+            transaction = Transaction.from_date(record['date'], record['description'], record['amount'],
+                                                record['op'])
+            # A history not read yet will pick the row up from the database
+            in_history = isinstance(student.transactions, LazyTransactions) and not student.transactions.loaded
+            enrollment_system.restore_transaction(student.student_id, transaction, in_history)
+        else:
+            apply_journal_record(enrollment_system, record)
+    
+    def _reload(self, enrollment_system):
+        print("Change log no longer covers this process's copy, reloading all data")
+        self._replaying = False
+        self.load(enrollment_system)
+        enrollment_system.reloaded(lambda: self.iter_transactions(enrollment_system))
+        self.replayed += 1
+        return 1
+    
+    def _load_transactions(self, student_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, description, amount, type FROM transactions "
+                "WHERE student_id = ? ORDER BY id", (student_id,)).fetchall()
+        return [Transaction.from_date(date, description, amount, type)
+                for date, description, amount, type in rows]
+    
+    def iter_transactions(self, enrollment_system):
+        # One indexed scan instead of loading every student's lazy history
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT student_id, date, description, amount, type FROM transactions ORDER BY id").fetchall()
+        for student_id, date, description, amount, type in rows:
+            student = enrollment_system.students.get(student_id)
+            if student:
+                yield student, Transaction.from_date(date, description, amount, type)
+    
+    def load(self, enrollment_system, stats=None):
+        """Read every course, student, enrollment and waitlist row into the system
+        
+        Transaction histories are left in the database until first used.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            conn = self._conn
+            if conn.in_transaction:
+                # Reloading inside transaction()
+                loaded = self._read_all(conn)
+            else:
+                # One read transaction, so the tables and the log position agree
+                conn.execute("BEGIN")
+                try:
+                    loaded = self._read_all(conn)
+                finally:
+                    conn.execute("COMMIT")
+            if loaded is None:
+                return False
+            courses, students, admins, transactions = loaded
+        
+        enrollment_system.courses = courses
+        enrollment_system.students = students
+        enrollment_system.admins = admins
+        enrollment_system.rebuild_indexes()
+        
+        seconds = time.perf_counter() - started
+        _load_timer.observe(seconds)
+        if stats is not None:
+            stats.update({
+                'courses': len(courses),
+                'students': len(students),
+                'transactions': transactions,
+                'journal_records': 0,
+                'seconds': seconds
+            })
+        return True
+    
+    def _read_all(self, conn):
+        if conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0] == 0 and \
+                conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 0:
+            return None
+        # Where this copy starts in the change log
+        self.version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        
+        courses = {}
+        for course_id, name, instructor, schedule, capacity, fee in conn.execute(
+                "SELECT course_id, name, instructor, schedule, capacity, fee FROM courses"):
+            courses[course_id] = Course(course_id, name, instructor, schedule, capacity, fee)
+        
+        students = {}
+        for student_id, name, grade_level, password, balance in conn.execute(
+                "SELECT student_id, name, grade_level, password, balance FROM students"):
+            student = Student(student_id, name, grade_level, password)
+            student.balance = balance
+            student.transactions = LazyTransactions(
+                lambda student_id=student_id: self._load_transactions(student_id))
+            students[student_id] = student
+        
+        # Enrollment rows come back in the order they were made
+        for course_id, student_id in conn.execute(
+                "SELECT course_id, student_id FROM enrollments ORDER BY rowid"):
+            course = courses.get(course_id)
+            student = students.get(student_id)
+            if course and student:
+                course.enrolled_students[student] = None
+                student.enrolled_courses[course] = None
+        
+        # Waitlist rows are also kept in the order students joined
+        for course_id, student_id in conn.execute(
+                "SELECT course_id, student_id FROM waitlist ORDER BY rowid"):
+            course = courses.get(course_id)
+            student = students.get(student_id)
+            if course and student:
+                course.waitlist.append(student)
+        
+        admins = {admin_id: {"name": name, "password": password}
+                  for admin_id, name, password in conn.execute(
+                      "SELECT admin_id, name, password FROM admins")}
+        transactions = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        return courses, students, admins, transactions
+    
+    def save(self, enrollment_system):
+        statements = [
+            ("DELETE FROM waitlist", ()),
+            ("DELETE FROM enrollments", ()),
+            ("DELETE FROM transactions", ()),
+            ("DELETE FROM students", ()),
+            ("DELETE FROM courses", ()),
+            ("DELETE FROM admins", ()),
+        ]
+        for course in enrollment_system.courses.values():
+            statements.append(self._course_row(course))
+        for student in enrollment_system.students.values():
+            statements.append(self._student_row(student))
+            for transaction in student.transactions:
+                statements.append(self._transaction_row(student, transaction))
+        for course in enrollment_system.courses.values():
+            for student in course.enrolled_students:
+                statements.append(("INSERT INTO enrollments (course_id, student_id) VALUES (?, ?)",
+                                   (course.course_id, student.student_id)))
+            for student in course.waitlist:
+                statements.append(("INSERT INTO waitlist (course_id, student_id) VALUES (?, ?)",
+                                   (course.course_id, student.student_id)))
+        for admin_id, admin in enrollment_system.admins.items():
+            statements.append(("INSERT INTO admins (admin_id, name, password) VALUES (?, ?, ?)",
+                               (admin_id, admin["name"], admin["password"])))
+        # Other processes cannot replay a full rewrite; they load it instead
+        self._write(statements, [{'op': 'reload'}])
+    
+    def _course_row(self, course):
+        return ("INSERT OR REPLACE INTO courses (course_id, name, instructor, schedule, capacity, fee) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (course.course_id, course.name, course.instructor, course.schedule,
+                 course.capacity, course.fee))
+    
+    def _student_row(self, student):
+        return ("INSERT OR REPLACE INTO students (student_id, name, grade_level, password, balance) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (student.student_id, student.name, student.grade_level, student.password,
+                 student.balance))
+    
+    def _transaction_row(self, student, transaction):
+        return ("INSERT INTO transactions (student_id, date, description, amount, type) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (student.student_id, transaction.date, transaction.description,
+                 transaction.amount, transaction.type))
+    
+    def _balance_row(self, student):
+        return ("UPDATE students SET balance = ? WHERE student_id = ?",
+                (student.balance, student.student_id))
+    
+    def record_event(self, event, **details):
+        if self._replaying:
+            # Another process already stored the change
+            return
+        if event == 'batch':
+            # Everything imported together goes into one database transaction
+            statements = [statement for name, event_details in details['events']
+                          for statement in self._statements(name, event_details)]
+        else:
+            statements = self._statements(event, details)
+        if statements:
+            self._write(statements, journal_records(event, details) if self.shared else ())
+    
+    def _statements(self, event, details):
+        student = details.get('student')
+        course = details.get('course')
+        
+        if event == 'enroll':
+            return [
+                ("INSERT INTO enrollments (course_id, student_id) VALUES (?, ?)",
+                 (course.course_id, student.student_id)),
+                self._transaction_row(student, details['transaction']),
+                self._balance_row(student),
+                ("DELETE FROM waitlist WHERE course_id = ? AND student_id = ?",
+                 (course.course_id, student.student_id)),
+            ]
+        elif event == 'drop':
+            return [
+                ("DELETE FROM enrollments WHERE course_id = ? AND student_id = ?",
+                 (course.course_id, student.student_id)),
+            ]
+        elif event == 'payment':
+            return [
+                self._transaction_row(student, details['transaction']),
+                self._balance_row(student),
+            ]
+        elif event == 'add_student':
+            return [self._student_row(student)]
+        elif event == 'add_course':
+            return [self._course_row(course)]
+        elif event == 'remove_course':
+            return [
+                ("DELETE FROM waitlist WHERE course_id = ?", (course.course_id,)),
+                ("DELETE FROM enrollments WHERE course_id = ?", (course.course_id,)),
+                ("DELETE FROM courses WHERE course_id = ?", (course.course_id,)),
+            ]
+        elif event == 'waitlist_join':
+            return [("INSERT OR IGNORE INTO waitlist (course_id, student_id) VALUES (?, ?)",
+                     (course.course_id, student.student_id))]
+        elif event == 'set_password':
+            return [("UPDATE students SET password = ? WHERE student_id = ?",
+                     (student.password, student.student_id))]
+        elif event == 'set_admin_password':
+            return [("UPDATE admins SET password = ? WHERE admin_id = ?",
+                     (details['password'], details['admin_id']))]
+        elif event == 'waitlist_leave':
+            return [("DELETE FROM waitlist WHERE course_id = ? AND student_id = ?",
+                     (course.course_id, student.student_id))]
+        return []
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate(data_dir='data', db_file=DB_FILE):
+    """Copy the JSON snapshot and journal in data_dir into the SQLite database"""
+    from data_persistence import load_data
+    
+    enrollment_system = EnrollmentSystem()
+    stats = {}
+    if not load_data(enrollment_system, data_dir, stats):
+        raise SystemExit(f"No JSON data found in {data_dir}")
+    
+    storage = SqliteStorage(data_dir, db_file)
+    storage.save(enrollment_system)
+    storage.close()
+    print(f"Migrated {stats['courses']} courses, {stats['students']} students and "
+          f"{stats['transactions']} transactions into {storage.path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SQLite storage backend tools")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subcommands.add_parser('migrate', help="Import data/*.json into SQLite")
+    migrate_parser.add_argument('--data-dir', default='data')
+    migrate_parser.add_argument('--db-file', default=DB_FILE)
+    args = parser.parse_args()
+    
+    if args.command == 'migrate':
+        migrate(args.data_dir, args.db_file)
@@ -0,0 +1,251 @@
+"""Pluggable persistence backends for the enrollment system
+
+A backend loads an EnrollmentSystem at startup, can write a full copy of
+it, and records every later change by subscribing to the system's change
+events. The JSON backend keeps the snapshot files plus the write-ahead
+journal; the SQLite backend (sqlite_storage.py) writes each change as a
+row-level update.
+
+Changes are normally written by the thread that made them. Attached with
+an AsyncWriter, they are queued instead and stored in batches by one
+writer thread, and asyncio code can await their durability.
+"""
+import asyncio
+import threading
+from data_persistence import save_data, load_data, Journal
+
+# Seconds the AsyncWriter waits before writing a failed batch again
+RETRY_DELAY = 1.0
+
+
+class Storage:
+    """Interface every persistence backend implements"""
+    
+    def load(self, enrollment_system, stats=None):
+        """Populate the system from storage
+        
+        Returns:
+            bool: False if there was nothing to load
+        
+        Raises:
+            Exception: If stored data exists but cannot be read; callers
+                must not treat that as an empty store
+        """
+        raise NotImplementedError
+    
+    def save(self, enrollment_system):
+        """Write the complete state of the system"""
+        raise NotImplementedError
+    
+    def record_event(self, event, **details):
+        """Persist a single change published by EnrollmentSystem"""
+        raise NotImplementedError
+    
+    def iter_transactions(self, enrollment_system):
+        """Yield (student, transaction) for every stored transaction"""
+        for student in enrollment_system.students.values():
+            for transaction in student.transactions:
+                yield student, transaction
+    
+    def attach(self, enrollment_system, writer=None):
+        """Start persisting every change made to the system
+        
+        Args:
+            enrollment_system (EnrollmentSystem): System to persist
+            writer (AsyncWriter, optional): Queue the changes on this writer
+                instead of storing them in the thread that made them
+        """
+        enrollment_system.subscribe(self.record_event if writer is None else writer.record_event)
+    
+    def stats(self):
+        """Return backend-specific persistence counters"""
+        return {}
+    
+    def reopen(self):
+        """Open fresh handles after close(), e.g. in a forked worker process"""
+    
+    def close(self):
+        """Flush and release the backend"""
+
+
+class JsonStorage(Storage):
+    """JSON snapshot files plus the append-only journal
+    
+    Snapshots are written by a background worker that coalesces up to
+    compact_every journal records or max_delay seconds of changes.
+    """
+    
+    def __init__(self, data_dir='data', compact_every=1000, max_delay=30.0):
+        self.data_dir = data_dir
+        self.compact_every = compact_every
+        self.max_delay = max_delay
+        self.journal = None
+    
+    def load(self, enrollment_system, stats=None):
+        return load_data(enrollment_system, self.data_dir, stats)
+    
+    def save(self, enrollment_system):
+        save_data(enrollment_system, self.data_dir)
+    
+    def attach(self, enrollment_system, writer=None):
+        self.journal = Journal(self.data_dir, self.compact_every, self.max_delay)
+        super().attach(enrollment_system, writer)
+    
+    def record_event(self, event, **details):
+        self.journal.record_event(event, **details)
+    
+    def stats(self):
+        return self.journal.stats() if self.journal else {}
+    
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+
+class AsyncWriter:
+    """Stores queued changes in batches from a single writer thread
+    
+    record_event() only queues the change, so it never blocks on disk.
+    The writer stores everything queued since its last write as one batch
+    event, which the JSON journal appends with a single fsync and SQLite
+    writes in one transaction. Callers that must not answer before their
+    change is durable await wait(), or call flush() from a thread.
+    
+    A batch that fails to write is kept, ahead of everything queued after
+    it, and written again every retry_delay seconds until it succeeds, so
+    no change is lost to a transient error and the changes are stored in
+    the order they were made.
+    """
+    
+    def __init__(self, write, retry_delay=RETRY_DELAY):
+        """
+        Args:
+            write (callable): Storage listener, e.g. Storage.record_event
+            retry_delay (float): Seconds to wait before retrying a failed batch
+        """
+        self.write = write
+        self.retry_delay = retry_delay
+        self.batches = 0
+        self._pending = []
+        self._queued = 0
+        self._written = 0
+        self._error = None
+        self._waiters = []  # (target, loop, future) for wait()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='storage-writer', daemon=True)
+        self._thread.start()
+    
+    def record_event(self, event, **details):
+        """EnrollmentSystem listener queueing each change in order"""
+        with self._cond:
+            if event == 'batch':
+                self._pending.extend(details['events'])
+                self._queued += len(details['events'])
+            else:
+                self._pending.append((event, details))
+                self._queued += 1
+            self._cond.notify_all()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                events, self._pending = self._pending, []
+                target = self._queued
+            try:
+                self.write('batch', events=events)
+                error = None
+            except Exception as exc:
+                # Report to everyone waiting rather than killing the writer
+                error = exc
+            with self._cond:
+                self._error = error
+                if error is None:
+                    self._written = target
+                    self.batches += 1
+                    ready = [waiter for waiter in self._waiters if waiter[0] <= target]
+                    self._waiters = [waiter for waiter in self._waiters if waiter[0] > target]
+                else:
+                    # Nothing queued since can be stored before the failed
+                    # batch, so every waiter hears of the failure
+                    self._pending[:0] = events
+                    ready, self._waiters = self._waiters, []
+                self._cond.notify_all()
+            for _, loop, future in ready:
+                loop.call_soon_threadsafe(_resolve, future, error)
+            
+            if error is not None:
+                with self._cond:
+                    if self._closed:
+                        print(f"Storage writer stopped with {len(self._pending)} changes not stored: {error}")
+                        return
+                    print(f"Storing {len(events)} changes failed, retrying: {error}")
+                    self._cond.wait_for(lambda: self._closed, self.retry_delay)
+    
+    async def wait(self):
+        """Wait, without blocking the event loop, until every change queued so far is stored
+        
+        Raises:
+            Exception: Whatever the write of the batch holding them raised
+        """
+        with self._cond:
+            if self._written >= self._queued:
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((self._queued, loop, future))
+        await future
+    
+    def flush(self, timeout=None):
+        """Block until every change queued so far is stored
+        
+        A failed batch is retried meanwhile, so this keeps waiting until
+        the retry succeeds.
+        
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self._cond:
+            target = self._queued
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+    
+    def stats(self):
+        with self._cond:
+            return {'queued': self._queued - self._written, 'batches': self.batches,
+                    'last_error': repr(self._error) if self._error else None}
+    
+    def close(self):
+        """Store what is still queued and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+def _resolve(future, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def get_storage(backend='json', data_dir='data', **options):
+    """Create the named storage backend
+    
+    Args:
+        backend (str): 'json' or 'sqlite'
+        data_dir (str): Directory holding the data files
+        **options: Backend settings, e.g. max_delay for the JSON backend
+    """
+    if backend == 'json':
+        return JsonStorage(data_dir, **options)
+    if backend == 'sqlite':
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(data_dir, **options)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import make_hash
+from data_persistence import Journal
+from models import Course, Student, EnrollmentSystem
+
+# Hashed once with a single iteration, so tests do not wait for the KDF
+PASSWORD = make_hash("pass123", iterations=1)
+
+
+def make_system():
+    """A small school: three courses, four students, one admin"""
+    system = EnrollmentSystem()
+    system.add_course(Course("CS101", "Introduction to Programming", "Jomar Leano", "MWF 9:00-10:30", 2))
+    system.add_course(Course("BIO201", "Biology I", "Stephanie Mores", "TTh 10:30-12:00", 25))
+    system.add_course(Course("ENG101", "English Composition", "Vince Fernandez", "MWF 13:00-14:30", 35))
+    for i in range(1, 5):
+        system.restore_student(Student(f"S100{i}", f"Student {i}", 12, PASSWORD))
+    system.restore_admin("admin", "Administrator", PASSWORD)
+    return system
+
+
+def open_journal(system, data_dir):
+    """Journal every change of the system; compacts only when asked to"""
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    return journal
+
+
+@pytest.fixture
+def system():
+    return make_system()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / 'data')
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from analytics import Analytics
+from benchmarks.synthetic import generate_institution
+
+# Counted only as they happen, so a fresh build cannot know them
+RUNNING_ONLY = ('refused', 'refused_full', 'waitlist_joins', 'drops')
+
+
+def comparable(value):
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items() if key not in RUNNING_ONLY}
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    return value
+
+
+def test_running_totals_match_a_fresh_build():
+    system = generate_institution(80, 12, transactions_per_student=2, capacity=6, seed=5)
+    analytics = Analytics.build(system)
+    system.subscribe(analytics.record_event)
+    rng = random.Random(5)
+    student_ids, course_ids = list(system.students), list(system.courses)
+    for _ in range(600):
+        student_id, course_id = rng.choice(student_ids), rng.choice(course_ids)
+        action = rng.random()
+        if action < 0.5:
+            system.enroll(student_id, course_id)
+        elif action < 0.8:
+            system.drop(student_id, course_id)
+        else:
+            system.make_payment(student_id, 10, "Cash")
+    system.remove_course(course_ids[0])
+    
+    running, fresh = analytics.report(limit=20), Analytics.build(system).report(limit=20)
+    for name in ('totals', 'instructors', 'fullest_courses', 'heatmap'):
+        assert comparable(running[name]) == comparable(fresh[name])
+    for name in ('charged', 'paid', 'outstanding'):
+        assert running['finance'][name] == pytest.approx(fresh['finance'][name])
+
+
+def test_refusals_are_counted_by_reason(system):
+    analytics = Analytics.build(system)
+    system.subscribe(analytics.record_event)
+    system.enroll('S1001', 'CS101')
+    system.enroll('S1002', 'CS101')
+    assert not system.enroll('S1003', 'CS101')
+    totals = analytics.report()['totals']
+    assert totals['enrolled'] == 2
+    assert totals['refused']['full'] == 1
+    assert [row['course_id'] for row in analytics.report()['most_refused_courses']] == ['CS101']
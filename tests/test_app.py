@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_loads_nothing(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, '-c', 'import app, asgi'], cwd=tmp_path, env=env, check=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_apps_share_the_state_of_their_data_dir(tmp_path):
+    first = app.create_app({'DATA_DIR': str(tmp_path / 'one')})
+    second = app.create_app({'DATA_DIR': str(tmp_path / 'one')})
+    other = app.create_app({'DATA_DIR': str(tmp_path / 'two')})
+    state = first.extensions['enrollment']
+    try:
+        assert second.extensions['enrollment'] is state
+        assert other.extensions['enrollment'] is not state
+        assert state.system.enroll('S1001', 'CS101')
+        assert 'S1001' not in [student.student_id
+                               for student in other.extensions['enrollment'].system.courses['CS101'].enrolled_students]
+    finally:
+        state.close()
+        other.extensions['enrollment'].close()
+
+
+def test_config_from_env_converts_types():
+    config = app.config_from_env({'ENROLLMENT_DATA_DIR': '/srv/data', 'ENROLLMENT_ASYNC_WRITES': 'no',
+                                  'ENROLLMENT_PRELOAD': '1', 'ENROLLMENT_REPLICA_MAX_AGE': '2.5',
+                                  'ENROLLMENT_LOGIN_ATTEMPTS': '9', 'OTHER': 'x'})
+    assert config == {'DATA_DIR': '/srv/data', 'ASYNC_WRITES': False, 'PRELOAD': True,
+                      'REPLICA_MAX_AGE': 2.5, 'LOGIN_ATTEMPTS': 9}
@@ -0,0 +1,114 @@
+import datetime
+import os
+
+import pytest
+
+import app
+from archive import LedgerArchive, archive_cutoff, term_of
+from data_persistence import Journal, load_data, save_data
+from models import EPOCH, EnrollmentSystem
+
+
+def timestamp(*date):
+    return int((datetime.datetime(*date) - EPOCH).total_seconds())
+
+
+def backdate(system, student_id, *dates):
+    # Move the student's oldest transactions into earlier terms
+    student = system.get_student(student_id)
+    for transaction, date in zip(student.transactions, dates):
+        transaction.timestamp = timestamp(*date)
+    return student
+
+
+def add_history(system):
+    """S1001: a charge and a payment in each of two old terms, then a payment now"""
+    system.enroll('S1001', 'CS101')
+    system.make_payment('S1001', 100, "Cash")
+    system.enroll('S1001', 'BIO201')
+    system.make_payment('S1001', 150, "Bank Transfer")
+    system.make_payment('S1001', 50, "Cash")
+    return backdate(system, 'S1001', (2024, 2, 1), (2024, 3, 1), (2024, 8, 1), (2024, 9, 1))
+
+
+def test_term_boundaries():
+    assert term_of(timestamp(2024, 6, 30, 23, 59)) == '2024-1'
+    assert term_of(timestamp(2024, 7, 1)) == '2024-2'
+    # The term running 30 days before 2025-07-15 began on 2025-01-01
+    assert archive_cutoff(timestamp(2025, 7, 15), 30) == timestamp(2025, 1, 1)
+
+
+def test_archive_keeps_the_balance_as_opening_balance(system, tmp_path):
+    student = add_history(system)
+    balance = student.balance
+    archive = LedgerArchive(str(tmp_path / 'archive'))
+    assert archive.archive(system, timestamp(2025, 1, 1)) == 4
+    
+    assert student.balance == balance
+    assert (student.archived_charged, student.archived_paid) == (1000, 250)
+    assert student.opening_balance == 750
+    assert [transaction.amount for transaction in student.transactions] == [50]
+    assert student.opening_balance + sum(-t.amount if t.type == 'payment' else t.amount
+                                         for t in student.transactions) == balance
+    
+    # Each term is read back on its own
+    assert sorted({entry[0] for entry in student.archive}) == ['2024-1', '2024-2']
+    first = archive.read(entry for entry in student.archive if entry[0] == '2024-1')
+    assert [(t.type, t.amount) for t in first] == [('charge', 500), ('payment', 100)]
+    second = archive.read(entry for entry in student.archive if entry[0] == '2024-2')
+    assert [t.description for t in second] == ["Enrollment fee for Biology I", "Payment via Bank Transfer"]
+    
+    # Nothing is left to archive before the same cutoff
+    assert archive.archive(system, timestamp(2025, 1, 1)) == 0
+
+
+def test_archive_survives_snapshot_and_journal(system, data_dir):
+    # Backdated in the snapshot, since the journal holds the original dates
+    student = add_history(system)
+    save_data(system, data_dir)
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    LedgerArchive(os.path.join(data_dir, 'archive')).archive(system, timestamp(2025, 1, 1))
+    journal.close(compact=False)
+    
+    # Replayed from the journal, then read from the next snapshot
+    for _ in range(2):
+        loaded = EnrollmentSystem()
+        assert load_data(loaded, data_dir)
+        copy = loaded.get_student('S1001')
+        assert (copy.balance, copy.opening_balance, copy.archive) == \
+            (student.balance, student.opening_balance, student.archive)
+        assert len(copy.transactions) == 1
+        save_data(loaded, data_dir)
+
+
+def test_ledger_counts_the_opening_balance(system, tmp_path):
+    ledger = pytest.importorskip('ledger')
+    add_history(system)
+    LedgerArchive(str(tmp_path / 'archive')).archive(system, timestamp(2025, 1, 1))
+    finance = ledger.Ledger.build(system)
+    balances = dict(zip(finance.student_ids, finance.balances()))
+    assert balances['S1001'] == system.get_student('S1001').balance
+    assert finance.total_outstanding() == sum(student.balance for student in system.students.values())
+
+
+def test_finances_page_shows_one_archived_term(data_dir):
+    flask_app = app.create_app({'DATA_DIR': data_dir})
+    state = flask_app.extensions['enrollment']
+    try:
+        add_history(state.system)
+        state.archive.archive(state.system, timestamp(2025, 1, 1))
+        client = flask_app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'], session['user_type'], session['name'] = 'S1001', 'student', "Marlon Pabroa"
+        
+        recent = client.get('/student/finances').get_data(as_text=True)
+        assert "Balance brought forward" in recent and "750 pesos" in recent
+        assert "Enrollment fee" not in recent
+        assert "term=2024-1" in recent and "term=2024-2" in recent
+        
+        term = client.get('/student/finances?term=2024-2').get_data(as_text=True)
+        assert "Enrollment fee for Biology I" in term and "Introduction to Programming" not in term
+        assert "Balance brought forward" not in term
+    finally:
+        state.close()
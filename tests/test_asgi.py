@@ -0,0 +1,76 @@
+import asyncio
+
+from flask import Response
+
+from asgi import create_asgi_app
+from models import EnrollmentSystem
+from storage import AsyncWriter, get_storage
+
+
+def call(asgi_app, method, path, cookie=None):
+    headers = [(b'cookie', cookie.encode('latin-1'))] if cookie else []
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers}
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    sent = []
+    
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+    
+    async def send(message):
+        sent.append(message)
+    
+    asyncio.run(asgi_app(scope, receive, send))
+    return sent
+
+
+def student_cookie(flask_app, student_id):
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    value = serializer.dumps({'user_id': student_id, 'user_type': 'student', 'name': student_id})
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def test_enroll_is_stored_before_the_response(data_dir):
+    asgi_app = create_asgi_app({'DATA_DIR': data_dir})
+    state = asgi_app.state
+    try:
+        sent = call(asgi_app, 'GET', '/student/enroll/CS101', student_cookie(asgi_app.app, 'S1001'))
+        assert sent[0]['status'] == 302
+        # Read back from disk while the app is still running
+        stored = EnrollmentSystem()
+        get_storage('json', data_dir).load(stored)
+        assert [course.course_id for course in stored.students['S1001'].enrolled_courses] == ['CS101']
+    finally:
+        state.close()
+
+
+def test_wsgi_routes_stream_their_body(data_dir):
+    asgi_app = create_asgi_app({'DATA_DIR': data_dir})
+    asgi_app.app.add_url_rule('/stream', 'stream', lambda: Response(iter([b'one', b'', b'two', b'three'])))
+    try:
+        sent = call(asgi_app, 'GET', '/stream')
+    finally:
+        asgi_app.state.close()
+    assert sent[0]['status'] == 200
+    assert [(message['body'], message.get('more_body', False)) for message in sent[1:]] == \
+        [(b'one', True), (b'two', True), (b'three', False)]
+
+
+def test_writer_retries_a_failed_batch_in_order():
+    stored = []
+    failures = [OSError("disk full")]
+    
+    def write(event, events):
+        if failures:
+            raise failures.pop()
+        stored.extend(name for name, _ in events)
+    
+    writer = AsyncWriter(write, retry_delay=0.01)
+    try:
+        writer.record_event('first')
+        writer.record_event('second')
+        assert writer.flush(timeout=5)
+        writer.record_event('third')
+        assert writer.flush(timeout=5)
+    finally:
+        writer.close()
+    assert stored == ['first', 'second', 'third']
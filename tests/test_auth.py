@@ -0,0 +1,30 @@
+from auth import ITERATIONS, MAX_ITERATIONS, check_hash, make_hash
+from conftest import PASSWORD
+from models import Student
+
+CRAFTED = f"pbkdf2_sha256${MAX_ITERATIONS * 1000}$c2FsdA$aGFzaA"
+
+
+def test_add_student_hashes_a_password_that_looks_hashed(system):
+    system.add_student(Student("S2001", "New Student", 11, CRAFTED))
+    stored = system.get_student("S2001").password
+    assert stored != CRAFTED
+    assert check_hash(CRAFTED, stored)
+
+
+def test_add_admin_hashes_a_password_that_looks_hashed(system):
+    system.add_admin("root", "Root", CRAFTED)
+    assert check_hash(CRAFTED, system.admins["root"]["password"])
+
+
+def test_restore_student_keeps_the_stored_hash(system):
+    system.restore_student(Student("S2001", "New Student", 11, PASSWORD))
+    assert system.get_student("S2001").password == PASSWORD
+
+
+def test_check_hash_rejects_iteration_counts_out_of_range():
+    assert check_hash("pass123", make_hash("pass123"))
+    assert not check_hash("pass123", PASSWORD)
+    # Refused before deriving anything, or this would take hours
+    assert not check_hash("pass123", CRAFTED)
+    assert not check_hash("pass123", make_hash("pass123", iterations=ITERATIONS - 1))
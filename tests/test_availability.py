@@ -0,0 +1,39 @@
+import random
+
+from models import Course
+
+
+def expected(system, student):
+    return [(course, course.get_available_seats(), course.is_full())
+            for course in system.courses.values() if course not in student.enrolled_courses]
+
+
+def test_availability_follows_every_change(system):
+    rng = random.Random(3)
+    for i in range(8):
+        system.add_course(Course(f"X{i}", f"Elective {i}", "Staff", f"Sa {8 + i}:00-{8 + i}:50", rng.randrange(1, 3)))
+    student_ids = list(system.students)
+    for step in range(300):
+        student_id = rng.choice(student_ids)
+        course_id = rng.choice(list(system.courses))
+        action = rng.random()
+        if action < 0.5:
+            system.enroll(student_id, course_id)
+        elif action < 0.9:
+            system.drop(student_id, course_id)
+        elif action < 0.95:
+            system.remove_course(course_id)
+        else:
+            system.add_course(Course(f"N{step}", "New", "Staff", "Su 8:00-9:00", 1))
+        for student in system.students.values():
+            assert system.course_availability(student) == expected(system, student)
+
+
+def test_rebuilt_index_matches_the_maintained_one(system):
+    system.enroll('S1001', 'CS101')
+    system.enroll('S1002', 'CS101')
+    student = system.students['S1003']
+    maintained = system.course_availability(student)
+    system.rebuild_indexes()
+    assert system.course_availability(student) == maintained
+    assert ('CS101', 0, True) in [(course.course_id, seats, full) for course, seats, full in maintained]
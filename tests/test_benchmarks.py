@@ -0,0 +1,45 @@
+import json
+import sys
+
+import pytest
+
+from benchmarks import suite
+from benchmarks.synthetic import generate_institution
+
+
+def test_generated_institution_has_the_requested_shape():
+    system = generate_institution(60, 8, transactions_per_student=4, seed=3)
+    assert len(system.students) == 60 and len(system.courses) == 8
+    for student in system.students.values():
+        # Three enrollment fees on top of the history
+        assert len(student.enrolled_courses) == 3
+        assert len(student.transactions) == 7
+    for course in system.courses.values():
+        assert len(course.enrolled_students) <= course.capacity
+    assert not system.conflict_report()
+    
+    again = generate_institution(60, 8, transactions_per_student=4, seed=3)
+    assert {student_id: [course.course_id for course in student.enrolled_courses]
+            for student_id, student in again.students.items()} == \
+        {student_id: [course.course_id for course in student.enrolled_courses]
+         for student_id, student in system.students.items()}
+
+
+def test_summarize_reports_percentiles_and_throughput():
+    stats = suite.summarize([i / 1000 for i in range(100, 0, -1)], elapsed=2.0)
+    assert stats['count'] == 100
+    assert (stats['p50_ms'], stats['p99_ms'], stats['max_ms']) == pytest.approx((51.0, 100.0, 100.0))
+    assert stats['ops_per_s'] == 50.0
+    assert suite.summarize([]) == {'count': 0}
+
+
+def test_suite_writes_a_json_report(tmp_path, monkeypatch):
+    output = tmp_path / 'results.json'
+    monkeypatch.setattr(sys, 'argv', ['suite', '--students', '30', '--courses', '6', '--transactions', '2',
+                                      '--repeat', '1', '--operations', '10', '--requests', '4', '--threads', '2',
+                                      '--output', str(output)])
+    suite.main()
+    report = json.loads(output.read_text())
+    assert report['parameters']['students'] == 30
+    for name in ('load_data', 'save_data', 'model.enroll', 'route.GET /student/dashboard', 'concurrent.all'):
+        assert report['results'][name]['count'] > 0
@@ -0,0 +1,45 @@
+import threading
+
+from conftest import PASSWORD
+from models import Course, EnrollmentSystem, Student
+
+THREADS = 16
+
+
+def race(target, args):
+    """Run target once per args tuple, all released at the same moment"""
+    barrier = threading.Barrier(len(args))
+    results = [None] * len(args)
+    
+    def run(index):
+        barrier.wait()
+        results[index] = target(*args[index])
+    
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(args))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_enrolls_never_overbook_the_last_seat():
+    for _ in range(20):
+        system = EnrollmentSystem()
+        system.add_course(Course("HOT", "Popular", "Staff", "MWF 9:00-10:00", 1))
+        for i in range(THREADS):
+            system.restore_student(Student(f"S{i}", f"Student {i}", 12, PASSWORD))
+        results = race(system.enroll, [(f"S{i}", "HOT") for i in range(THREADS)])
+        
+        course = system.courses["HOT"]
+        assert results.count(True) == 1 and len(course.enrolled_students) == 1
+        assert [student.balance > 0 for student in system.students.values()].count(True) == 1
+
+
+def test_concurrent_payments_never_overdraw(system):
+    assert system.enroll('S1001', 'CS101')
+    balance = system.students['S1001'].balance
+    amount = balance / 4
+    results = race(system.make_payment, [('S1001', amount, "Cash")] * THREADS)
+    assert results.count(True) == 4
+    assert system.students['S1001'].balance == 0
@@ -0,0 +1,75 @@
+import pytest
+
+import app
+from fragments import FragmentCache
+
+
+@pytest.fixture
+def flask_app(data_dir):
+    flask_app = app.create_app({'DATA_DIR': data_dir})
+    yield flask_app
+    flask_app.extensions['enrollment'].close()
+
+
+def client_for(flask_app, user_id, user_type):
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'], session['user_type'], session['name'] = user_id, user_type, user_id
+    return client
+
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={'If-None-Match': etag})
+
+
+def test_dashboard_answers_304_until_another_student_enrolls(flask_app):
+    client = client_for(flask_app, 'S1001', 'student')
+    page = client.get('/student/dashboard')
+    assert page.status_code == 200 and page.headers['ETag'].startswith('W/')
+    assert revalidate(client, '/student/dashboard', page.headers['ETag']).status_code == 304
+    
+    # Another student's enrollment changes the seats shown on this page
+    assert flask_app.extensions['enrollment'].system.enroll('S1002', 'CS101')
+    changed = revalidate(client, '/student/dashboard', page.headers['ETag'])
+    assert changed.status_code == 200 and changed.headers['ETag'] != page.headers['ETag']
+    assert changed.data != page.data
+
+
+def test_etags_differ_per_user_and_url(flask_app):
+    first = client_for(flask_app, 'S1001', 'student').get('/student/dashboard').headers['ETag']
+    second = client_for(flask_app, 'S1002', 'student').get('/student/dashboard').headers['ETag']
+    assert first != second
+    admin = client_for(flask_app, 'admin', 'admin')
+    etag = admin.get('/admin/dashboard').headers['ETag']
+    assert revalidate(admin, '/admin/dashboard?course_sort=id', etag).status_code == 200
+
+
+def test_roster_is_rendered_again_after_a_drop(flask_app):
+    system = flask_app.extensions['enrollment'].system
+    system.enroll('S1001', 'CS101')
+    admin = client_for(flask_app, 'admin', 'admin')
+    page = admin.get('/admin/course/CS101/roster')
+    assert revalidate(admin, '/admin/course/CS101/roster', page.headers['ETag']).status_code == 304
+    system.drop('S1001', 'CS101')
+    changed = revalidate(admin, '/admin/course/CS101/roster', page.headers['ETag'])
+    assert changed.status_code == 200
+    assert system.students['S1001'].name.encode() in page.data
+    assert system.students['S1001'].name.encode() not in changed.data
+
+
+def test_fragment_cache_renders_once_and_evicts_the_oldest():
+    cache = FragmentCache(max_entries=2)
+    renders = []
+    
+    def render(text):
+        return lambda: renders.append(text) or text
+    
+    assert cache.get(('row', 'A', 1), render('a1')) == 'a1'
+    assert cache.get(('row', 'A', 1), render('again')) == 'a1'
+    cache.get(('row', 'B', 1), render('b1'))
+    cache.get(('row', 'A', 1), render('again'))
+    cache.get(('row', 'C', 1), render('c1'))
+    assert len(cache) == 2
+    # B was the least recently used
+    assert cache.get(('row', 'B', 1), render('b1 again')) == 'b1 again'
+    assert renders == ['a1', 'b1', 'c1', 'b1 again']
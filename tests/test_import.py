@@ -0,0 +1,60 @@
+import threading
+
+from auth import PasswordHasher, check_hash, is_hashed
+
+
+class ProbingHasher(PasswordHasher):
+    """Enrolls a student of the batch from another thread while hashing"""
+    
+    def __init__(self, system):
+        super().__init__(workers=1)
+        self.system = system
+        self.enrolled = None
+    
+    def hash_many(self, passwords):
+        if passwords:
+            thread = threading.Thread(target=self._enroll)
+            thread.start()
+            thread.join(timeout=5)
+        return [f"pbkdf2_sha256$1$x${password}" for password in passwords]
+    
+    def _enroll(self):
+        self.enrolled = self.system.enroll('S1001', 'BIO201')
+
+
+ROWS = [
+    {'type': 'student', 'student_id': 'S2001', 'name': "Juan Reyes", 'grade_level': '11', 'password': 'changeme'},
+    {'type': 'student', 'student_id': 'S1001', 'name': "Duplicate", 'grade_level': '11', 'password': 'other'},
+    {'type': 'enroll', 'student_id': 'S2001', 'course_id': 'CS101'},
+    {'type': 'enroll', 'student_id': 'S1001', 'course_id': 'CS101'},
+]
+
+
+def rows():
+    return iter(enumerate(ROWS, 2))
+
+
+def test_import_applies_rows_in_order(system):
+    results = []
+    counts = system.import_batch(rows, lambda *result: results.append(result))
+    assert counts == {'applied': 3, 'failed': 1}
+    assert results[1] == (3, 'student', "student already exists")
+    student = system.get_student('S2001')
+    assert check_hash('changeme', student.password)
+    assert [course.course_id for course in student.enrolled_courses] == ['CS101']
+
+
+def test_import_hashes_passwords_before_locking(system):
+    system.hasher = ProbingHasher(system)
+    system.import_batch(rows)
+    # The enroll ran while the batch was hashing, so it did not wait for the batch's locks
+    assert system.hasher.enrolled is True
+    assert system.get_student('S2001').password == "pbkdf2_sha256$1$x$changeme"
+    assert is_hashed(system.get_student('S1001').password)
+
+
+def test_import_hashes_passwords_that_look_hashed(system):
+    crafted = [dict(ROWS[0], password="pbkdf2_sha256$999999999$c2FsdA$aGFzaA")]
+    counts = system.import_batch(lambda: iter(enumerate(crafted, 2)))
+    assert counts == {'applied': 1, 'failed': 0}
+    assert check_hash(crafted[0]['password'], system.get_student('S2001').password)
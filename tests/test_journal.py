@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from data_persistence import JOURNAL_FILE, SnapshotError, _read_journal, load_data, save_data
+from conftest import PASSWORD, open_journal
+from models import Course, EnrollmentSystem, Student
+
+
+def test_replay_restores_changes_after_snapshot(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    assert system.enroll('S1001', 'CS101')
+    assert system.make_payment('S1001', 200, "Cash")
+    journal.close(compact=False)
+    
+    loaded = EnrollmentSystem()
+    assert load_data(loaded, data_dir)
+    student = loaded.get_student('S1001')
+    assert [course.course_id for course in student.enrolled_courses] == ['CS101']
+    assert student.balance == system.get_student('S1001').balance
+    assert len(student.transactions) == 2
+
+
+def test_torn_record_is_trimmed_before_appending(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S1001', 'CS101')
+    journal.close(compact=False)
+    path = os.path.join(data_dir, JOURNAL_FILE)
+    # A crash mid-append leaves half a record behind
+    with open(path, 'a') as f:
+        f.write('{"op":"payment","student_id":"S1001","da')
+    
+    system._listeners.clear()
+    journal = open_journal(system, data_dir)
+    system.make_payment('S1001', 100, "Cash")
+    journal.close(compact=False)
+    
+    with open(path) as f:
+        assert all(line.startswith('{"op"') and line.endswith('}\n') for line in f)
+    loaded = EnrollmentSystem()
+    assert load_data(loaded, data_dir)
+    assert loaded.get_student('S1001').balance == system.get_student('S1001').balance
+
+
+def test_torn_last_record_is_skipped_on_read(tmp_path):
+    path = tmp_path / JOURNAL_FILE
+    path.write_text('{"op":"drop","seq":1}\n{"op":"pay')
+    assert [record['seq'] for record in _read_journal(str(path))] == [1]
+
+
+def test_corrupt_record_before_the_last_raises(tmp_path):
+    path = tmp_path / JOURNAL_FILE
+    path.write_text('{"op":"drop","seq":1}\n{"op":"payment","da{"op":"drop","seq":3}\n{"op":"drop","seq":4}\n')
+    with pytest.raises(SnapshotError):
+        list(_read_journal(str(path)))
+
+
+def test_load_stats_count_replayed_records(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.add_course(Course("PHYS101", "Physics I", "Marylou Bacordio", "TTh 14:00-15:30", 20))
+    system.restore_student(Student("S2001", "New Student", 11, PASSWORD))
+    system.enroll('S2001', 'PHYS101')
+    journal.close(compact=False)
+    
+    stats = {}
+    assert load_data(EnrollmentSystem(), data_dir, stats)
+    assert (stats['courses'], stats['students'], stats['transactions']) == (4, 5, 1)
+    assert stats['journal_records'] == 4
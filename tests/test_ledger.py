@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from conftest import PASSWORD
+from models import Student, Transaction
+
+ledger = pytest.importorskip('ledger')
+
+DAY = 86400
+
+
+def history(system, now):
+    """Random backdated charges and payments for every student"""
+    rng = random.Random(7)
+    system.restore_student(Student("S2001", "Junior", 11, PASSWORD))
+    for student_id in system.students:
+        for _ in range(rng.randrange(1, 8)):
+            kind = rng.choice(['charge', 'charge', 'payment'])
+            description = "Lab fee" if kind == 'charge' else f"Payment via {rng.choice(['Cash', 'Card'])}"
+            transaction = Transaction(now - rng.randrange(120) * DAY, description, rng.randrange(50, 500), kind)
+            system.restore_transaction(student_id, transaction)
+
+
+def expected_aging(system, now, bounds=(30, 60, 90)):
+    """Payments settle each student's oldest charges first"""
+    labels = ['0-30', '30-60', '60-90', '90+']
+    buckets = dict.fromkeys(labels, 0.0)
+    for student in system.students.values():
+        paid = sum(t.amount for t in student.transactions if t.type == 'payment')
+        for charge in sorted((t for t in student.transactions if t.type == 'charge'), key=lambda t: t.timestamp):
+            settled = min(paid, charge.amount)
+            paid -= settled
+            age = (now - charge.timestamp) / DAY
+            buckets[labels[sum(age >= bound for bound in bounds)]] += charge.amount - settled
+    return buckets
+
+
+def test_reports_match_per_student_sums(system):
+    now = Transaction.from_date('2025-03-01 12:00:00', '', 0, 'charge').timestamp
+    history(system, now)
+    book = ledger.Ledger.build(system)
+    system.subscribe(book.record_event)
+    # Live changes reach the ledger through the listener
+    system.enroll('S1001', 'CS101')
+    system.make_payment('S1001', 100, "Card")
+    
+    balances = dict(zip(book.student_ids, book.balances()))
+    assert balances == pytest.approx({student_id: student.balance for student_id, student in system.students.items()})
+    assert book.total_outstanding() == pytest.approx(
+        sum(student.balance for student in system.students.values() if student.balance > 0))
+    by_grade = {}
+    for student in system.students.values():
+        by_grade[student.grade_level] = by_grade.get(student.grade_level, 0) + student.balance
+    assert book.balances_by_grade() == pytest.approx(by_grade)
+    
+    payments = {}
+    for student in system.students.values():
+        for transaction in student.transactions:
+            if transaction.type == 'payment':
+                key = (transaction.date[:10], transaction.description.split('Payment via ')[1])
+                payments[key] = payments.get(key, 0) + transaction.amount
+    assert book.payments_by_method_per_day() == pytest.approx(payments)
+
+
+def test_aging_buckets_settle_the_oldest_charges_first(system):
+    now = Transaction.from_date('2025-03-01 12:00:00', '', 0, 'charge').timestamp
+    history(system, now)
+    book = ledger.Ledger.build(system)
+    assert book.aging_buckets(now) == pytest.approx(expected_aging(system, now))
@@ -0,0 +1,59 @@
+from conftest import PASSWORD
+from models import Student
+
+
+def add_students(system, count):
+    for i in range(count):
+        system.restore_student(Student(f"S3{i:03d}", f"Pupil {i:03d}", 7 + i % 6, PASSWORD))
+
+
+def all_pages(system, limit, **options):
+    ids, cursor = [], None
+    while True:
+        students, cursor = system.list_students(after=cursor, limit=limit, **options)
+        ids += [student.student_id for student in students]
+        if cursor is None:
+            return ids
+
+
+def test_pages_cover_the_sorted_listing(system):
+    add_students(system, 40)
+    expected = sorted(system.students, key=lambda student_id: (system.students[student_id].name.casefold(), student_id))
+    assert all_pages(system, 7) == expected
+    assert all_pages(system, 7, descending=True) == expected[::-1]
+    by_grade = sorted(system.students, key=lambda student_id: (system.students[student_id].grade_level, student_id))
+    assert all_pages(system, 9, sort='grade') == by_grade
+    assert all_pages(system, 5, query='pupil 01') == [f"S30{i:02d}" for i in range(10, 20)]
+
+
+def test_pages_stay_stable_across_inserts(system):
+    add_students(system, 20)
+    first, cursor = system.list_students(limit=10)
+    # New students sorting before the cursor do not shift the next page
+    system.restore_student(Student("S4000", "Aaron Early", 9, PASSWORD))
+    system.restore_student(Student("S4001", "Pupil 015a", 9, PASSWORD))
+    second, _ = system.list_students(after=cursor, limit=10)
+    assert [student.name for student in first][-1] < second[0].name
+    assert "Aaron Early" not in [student.name for student in second]
+    assert [student.name for student in second][:6] == ["Pupil 010", "Pupil 011", "Pupil 012", "Pupil 013",
+                                                       "Pupil 014", "Pupil 015"]
+    assert second[6].name == "Pupil 015a"
+
+
+def test_a_malformed_cursor_starts_over(system):
+    add_students(system, 5)
+    first, _ = system.list_students(limit=3)
+    for cursor in ("not-a-cursor", "e30=", "!!!"):
+        page, _ = system.list_students(after=cursor, limit=3)
+        assert page == first
+
+
+def test_roster_pages_by_name(system):
+    add_students(system, 12)
+    for i in range(12):
+        system.restore_enrollment(f"S3{i:03d}", 'BIO201')
+    course = system.courses['BIO201']
+    first, cursor = system.roster_page(course, limit=8)
+    rest, last = system.roster_page(course, after=cursor, limit=8)
+    assert [student.name for student in first + rest] == [f"Pupil {i:03d}" for i in range(12)]
+    assert last is None
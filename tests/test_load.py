@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+import app
+from data_persistence import JOURNAL_FILE, MANIFEST_FILE, Journal, SnapshotError, load_data, save_data
+from models import EnrollmentSystem
+
+
+def app_state(data_dir):
+    return app.AppState(dict(app.DEFAULT_CONFIG, DATA_DIR=data_dir))
+
+
+def read_manifest(data_dir):
+    with open(os.path.join(data_dir, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def corrupt_journal(data_dir):
+    # A damaged record followed by a good one
+    with open(os.path.join(data_dir, JOURNAL_FILE), 'a') as f:
+        f.write('{"op":"payment","student_id":"S1001","da\n')
+        f.write('{"op":"drop","student_id":"S1001","course_id":"CS101","seq":99}\n')
+
+
+def test_empty_directory_has_no_data(data_dir):
+    assert not load_data(EnrollmentSystem(), data_dir)
+    os.makedirs(data_dir)
+    assert not load_data(EnrollmentSystem(), data_dir)
+
+
+def test_journal_without_snapshot_is_replayed(system, data_dir):
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    fresh = EnrollmentSystem()
+    fresh.subscribe(journal.record_event)
+    fresh.add_course(system.get_course('CS101'))
+    journal.close(compact=False)
+    
+    loaded = EnrollmentSystem()
+    assert load_data(loaded, data_dir)
+    assert list(loaded.courses) == ['CS101']
+
+
+def test_corrupt_journal_raises(system, data_dir):
+    save_data(system, data_dir)
+    corrupt_journal(data_dir)
+    with pytest.raises(SnapshotError):
+        load_data(EnrollmentSystem(), data_dir)
+
+
+def test_unreadable_legacy_snapshot_raises(data_dir):
+    os.makedirs(data_dir)
+    for name in ('courses', 'students', 'admins'):
+        with open(os.path.join(data_dir, f'{name}.json'), 'w') as f:
+            f.write('[{"course_id": ')
+    with pytest.raises(SnapshotError):
+        load_data(EnrollmentSystem(), data_dir)
+
+
+def test_snapshot_files_without_manifest_raise(system, data_dir):
+    save_data(system, data_dir)
+    os.remove(os.path.join(data_dir, MANIFEST_FILE))
+    with pytest.raises(SnapshotError):
+        load_data(EnrollmentSystem(), data_dir)
+
+
+def test_app_does_not_seed_over_corrupt_data(system, data_dir):
+    save_data(system, data_dir)
+    corrupt_journal(data_dir)
+    manifest = read_manifest(data_dir)
+    
+    state = app_state(data_dir)
+    with pytest.raises(SnapshotError):
+        state.load()
+    assert read_manifest(data_dir) == manifest
+    assert state.system.get_course('PHYS101') is None
+
+
+def test_app_seeds_an_empty_directory(data_dir):
+    state = app_state(data_dir)
+    state.load()
+    state.storage.close()
+    assert 'CS101' in state.system.courses
+    assert load_data(EnrollmentSystem(), data_dir)
+
+
+def test_restart_after_torn_append_keeps_data(system, data_dir):
+    save_data(system, data_dir)
+    state = app_state(data_dir)
+    state.load()
+    state.start()
+    state.system.enroll('S1001', 'CS101')
+    state.storage.journal.close(compact=False)
+    with open(os.path.join(data_dir, JOURNAL_FILE), 'a') as f:
+        f.write('{"op":"payment","student_id":"S1001","da')
+    
+    for _ in range(2):
+        state = app_state(data_dir)
+        state.load()
+        state.start()
+        state.system.make_payment('S1001', 100, "Cash")
+        state.close()
+    
+    student = state.system.get_student('S1001')
+    assert [course.course_id for course in student.enrolled_courses] == ['CS101']
+    assert len(student.transactions) == 3
+    assert 'PHYS101' not in state.system.courses
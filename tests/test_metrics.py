@@ -0,0 +1,39 @@
+import app
+import metrics
+from data_persistence import Journal, load_data, save_data
+from models import Course, EnrollmentSystem
+
+
+def test_admin_metrics_show_persistence_stats(data_dir):
+    flask_app = app.create_app({'DATA_DIR': data_dir, 'ASYNC_WRITES': True})
+    state = flask_app.extensions['enrollment']
+    try:
+        assert state.system.enroll('S1001', 'CS101')
+        state.writer.flush()
+        client = flask_app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'], session['user_type'] = 'admin', 'admin'
+        text = client.get('/admin/metrics').get_data(as_text=True)
+    finally:
+        state.close()
+    
+    values = dict(line.split(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+    assert int(values['enrollment_persistence_queue_depth']) > 0
+    assert int(values['enrollment_persistence_bytes_appended']) > 0
+    assert values['enrollment_writer_queued'] == '0'
+    assert 'enrollment_persistence_last_flush_seconds' in values
+    assert 'enrollment_persistence_bytes_written' in values
+
+
+def test_replaying_the_journal_is_not_counted(system, data_dir):
+    save_data(system, data_dir)
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    system.add_course(Course("PHYS101", "Physics I", "Marylou Bacordio", "TTh 14:00-15:30", 20))
+    added = metrics.OPERATION_SECONDS.labels(operation='add_course')
+    count = added.count
+    
+    journal.compact()
+    journal.close(compact=False)
+    assert load_data(EnrollmentSystem(), data_dir)
+    assert added.count == count
@@ -0,0 +1,54 @@
+from conftest import PASSWORD
+from models import Course, Student, Transaction
+
+
+def test_rosters_keep_enrollment_order(system):
+    system.add_course(Course("BIG101", "Lecture", "Staff", "Sa 8:00-9:00", 10))
+    for student_id in ('S1003', 'S1001', 'S1004', 'S1002'):
+        assert system.enroll(student_id, 'BIG101')
+    course = system.courses['BIG101']
+    assert [student.student_id for student in course.enrolled_students] == ['S1003', 'S1001', 'S1004', 'S1002']
+    assert course.get_available_seats() == 6
+    
+    assert system.drop('S1001', 'BIG101')
+    assert not system.drop('S1001', 'BIG101')
+    assert [student.student_id for student in course.enrolled_students] == ['S1003', 'S1004', 'S1002']
+
+
+def test_enroll_and_drop_update_both_sides():
+    course = Course("CS101", "Programming", "Staff", "MWF 9:00-10:30", 1)
+    first = Student("S1", "First", 12, PASSWORD)
+    second = Student("S2", "Second", 12, PASSWORD)
+    assert first.enroll(course)
+    assert not first.enroll(course)
+    assert course.is_full() and not second.enroll(course)
+    assert list(course.enrolled_students) == [first] and list(first.enrolled_courses) == [course]
+    
+    assert first.drop(course)
+    assert not course.enrolled_students and not first.enrolled_courses
+    assert second.enroll(course)
+
+
+def test_remove_course_drops_every_student(system):
+    for student_id in ('S1001', 'S1002'):
+        system.enroll(student_id, 'CS101')
+        system.enroll(student_id, 'BIO201')
+    assert system.remove_course('CS101')
+    for student_id in ('S1001', 'S1002'):
+        assert [course.course_id for course in system.students[student_id].enrolled_courses] == ['BIO201']
+
+
+def test_models_have_no_instance_dict(system):
+    system.enroll('S1001', 'CS101')
+    student = system.students['S1001']
+    for record in (student, system.courses['CS101'], student.transactions[0]):
+        assert not hasattr(record, '__dict__')
+
+
+def test_transactions_round_trip_and_share_descriptions():
+    data = {'date': '2024-06-01 08:30:00', 'description': "Payment via Cash", 'amount': 250, 'type': 'payment'}
+    first = Transaction.from_dict(data)
+    second = Transaction.from_dict(dict(data, amount=100))
+    assert first.to_dict() == data
+    assert first.description_id == second.description_id
+    assert first.type is second.type
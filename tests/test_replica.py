@@ -0,0 +1,62 @@
+import pytest
+
+import replica
+from data_persistence import Journal, save_data
+
+
+@pytest.fixture
+def worker_state(monkeypatch):
+    # _run_report keeps its data in module state; start each test afresh
+    monkeypatch.setattr(replica, '_loaded', dict.fromkeys(replica._loaded))
+    return replica._loaded
+
+
+def roster(data_dir, max_age=0):
+    rows = replica._run_report('json', data_dir, max_age, 'roster_rows', ('CS101',))
+    return [row[0] for row in rows[1:]]
+
+
+def test_report_sees_journaled_changes_without_reloading(system, data_dir, worker_state):
+    save_data(system, data_dir)
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    assert roster(data_dir) == []
+    loaded = worker_state['system']
+    
+    system.enroll('S1001', 'CS101')
+    assert roster(data_dir) == ['S1001']
+    assert worker_state['system'] is loaded
+    assert worker_state['journal_seq'] == journal.seq
+    
+    # Compaction may remove records the worker has not seen yet
+    system.enroll('S1002', 'CS101')
+    journal.compact()
+    system.drop('S1001', 'CS101')
+    journal.compact()
+    assert roster(data_dir) == ['S1002']
+    assert worker_state['system'] is not loaded
+    journal.close(compact=False)
+
+
+def test_report_reuses_a_recent_replica(system, data_dir, worker_state):
+    save_data(system, data_dir)
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    assert roster(data_dir, max_age=3600) == []
+    system.enroll('S1001', 'CS101')
+    assert roster(data_dir, max_age=3600) == []
+    assert roster(data_dir) == ['S1001']
+    journal.close(compact=False)
+
+
+def test_app_reports_share_a_replica(system):
+    import app
+    state = app.AppState(dict(app.DEFAULT_CONFIG, REPLICA_MAX_AGE=3600))
+    state.system = system
+    first = state.replica()
+    system.enroll('S1001', 'CS101')
+    assert state.replica() is first
+    assert state.report('roster_rows', 'CS101') == [['student_id', 'name', 'grade_level']]
+    
+    state.config['REPLICA_MAX_AGE'] = 0
+    assert state.report('roster_rows', 'CS101')[1][0] == 'S1001'
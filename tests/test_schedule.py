@@ -0,0 +1,51 @@
+from models import Course
+from schedule import Timetable, parse_schedule
+
+
+def add_courses(system):
+    system.add_course(Course("LONG", "Long Lab", "Staff", "M 8:00-12:00", 10))
+    system.add_course(Course("SHORT", "Short Seminar", "Staff", "M 9:00-10:00", 10))
+    system.add_course(Course("LATE", "Late Tutorial", "Staff", "M 11:00-11:30", 10))
+
+
+def test_parse_schedule_reads_days_and_rejects_free_form_text():
+    assert parse_schedule("TTh 10:30-12:00") == ((2070, 2160), (4950, 5040))
+    assert parse_schedule("By arrangement") == ()
+
+
+def test_enroll_refuses_a_clashing_course(system):
+    system.add_course(Course("MATH101", "Algebra", "Staff", "MWF 10:00-11:00", 10))
+    assert system.enroll("S1001", "CS101")
+    assert not system.enroll("S1001", "MATH101")
+    assert [course.course_id for course in system.schedule_conflicts("S1001", "MATH101")] == ["CS101"]
+    # Back to back is not a clash
+    system.add_course(Course("ART101", "Drawing", "Staff", "MWF 10:30-11:30", 10))
+    assert system.enroll("S1001", "ART101")
+
+
+def test_conflicts_see_a_long_meeting_behind_an_overlapping_one():
+    timetable = Timetable()
+    timetable.add("LONG", parse_schedule("M 8:00-12:00"))
+    timetable.add("SHORT", parse_schedule("M 9:00-10:00"))
+    assert timetable.conflicts(parse_schedule("M 11:00-11:30")) == {"LONG"}
+    assert timetable.conflicts(parse_schedule("M 7:00-9:30")) == {"LONG", "SHORT"}
+    assert timetable.conflicts(parse_schedule("M 12:00-13:00")) == set()
+
+
+def test_enroll_checks_legacy_overlapping_enrollments(system):
+    add_courses(system)
+    # Enrolled before conflicts were checked, as a loaded data file may be
+    assert system.restore_enrollment("S1001", "LONG")
+    assert system.restore_enrollment("S1001", "SHORT")
+    assert not system.enroll("S1001", "LATE")
+    assert [course.course_id for course in system.schedule_conflicts("S1001", "LATE")] == ["LONG"]
+
+
+def test_conflict_report_lists_each_clashing_pair(system):
+    add_courses(system)
+    for course_id in ("LONG", "SHORT", "LATE"):
+        system.restore_enrollment("S1002", course_id)
+    system.restore_enrollment("S1001", "LONG")
+    rows = [(student.student_id, first.course_id, second.course_id)
+            for student, first, second in system.conflict_report()]
+    assert rows == [("S1002", "LATE", "LONG"), ("S1002", "LONG", "SHORT")]
@@ -0,0 +1,35 @@
+import pytest
+
+from analytics import Analytics
+from models import EnrollmentSystem
+from sqlite_storage import SqliteStorage
+
+ledger = pytest.importorskip('ledger')
+
+
+def test_reload_rebuilds_derived_copies(system, data_dir):
+    storage = SqliteStorage(data_dir, shared=True)
+    storage.save(system)
+    live = EnrollmentSystem()
+    storage.load(live)
+    finance = ledger.Ledger.build(live, storage.iter_transactions(live))
+    analytics = Analytics.build(live, storage.iter_transactions(live))
+    live.subscribe(finance.record_event)
+    live.subscribe(analytics.record_event)
+    storage.attach(live)
+    live.coordinator = storage
+    assert live.snapshot().get_student('S1001').balance == 0
+    
+    # Another process rewrites everything, which this one can only reload
+    assert system.enroll('S1001', 'CS101')
+    assert system.make_payment('S1001', 400, "Cash")
+    SqliteStorage(data_dir, shared=True).save(system)
+    storage.sync(live)
+    
+    balance = system.get_student('S1001').balance
+    assert live.get_student('S1001').balance == balance
+    assert finance.total_outstanding() == balance
+    assert analytics.report()['finance']['outstanding'] == balance
+    assert live.snapshot().get_student('S1001').balance == balance
+    assert [student.student_id for student in live.snapshot().roster('CS101')] == ['S1001']
+    storage.close()
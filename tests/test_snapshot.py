@@ -0,0 +1,126 @@
+import json
+import os
+
+import pytest
+
+import data_persistence
+from data_persistence import MANIFEST_FILE, SnapshotError, _sealed_segments, load_data, save_data
+from conftest import PASSWORD, open_journal
+from models import Course, EnrollmentSystem, Student
+
+
+def state_of(system):
+    return {student_id: (student.balance, sorted(course.course_id for course in student.enrolled_courses))
+            for student_id, student in system.students.items()}
+
+
+def loaded(data_dir):
+    system = EnrollmentSystem()
+    assert load_data(system, data_dir)
+    return system
+
+
+def test_compaction_folds_the_journal(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S1001', 'CS101')
+    assert journal.compact() > 0
+    system.enroll('S1002', 'BIO201')
+    system.make_payment('S1001', 100, "Cash")
+    assert journal.compact() > 0
+    journal.close(compact=False)
+    
+    with open(os.path.join(data_dir, MANIFEST_FILE)) as f:
+        assert json.load(f)['journal_seq'] == journal.seq
+    assert state_of(loaded(data_dir)) == state_of(system)
+
+
+def test_compaction_reads_only_the_shards_it_rewrites(system, data_dir, monkeypatch):
+    for i in range(300):
+        system.restore_student(Student(f"S{i:04d}", f"Student {i}", 10, PASSWORD))
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S0007', 'ENG101')
+    reads = []
+    iter_json_array = data_persistence._iter_json_array
+    monkeypatch.setattr(data_persistence, '_iter_json_array',
+                        lambda path, **kwargs: reads.append(os.path.basename(path)) or iter_json_array(path, **kwargs))
+    assert journal.compact() > 0
+    journal.close(compact=False)
+    
+    with open(os.path.join(data_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    rewritten = [shard['file'] for kind in ('courses', 'students') for shard in manifest['files'][kind]
+                 if shard['file'].endswith(f".{manifest['generation']:06d}.json")]
+    assert len(manifest['files']['students']) > 1 and len(rewritten) == 2
+    # Read from the previous generation, rewritten in the new one
+    assert sorted(name.rsplit('.', 2)[0] for name in reads) == sorted(name.rsplit('.', 2)[0] for name in rewritten)
+    assert state_of(loaded(data_dir)) == state_of(system)
+
+
+def test_compaction_folds_added_and_removed_courses(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S1001', 'CS101')
+    system.enroll('S1002', 'CS101')
+    journal.compact()
+    system.add_course(Course("ART101", "Drawing", "Staff", "S 8:00-11:00", 10))
+    system.enroll('S1003', 'ART101')
+    system.remove_course('CS101')
+    journal.compact()
+    journal.close(compact=False)
+    
+    restored = loaded(data_dir)
+    assert list(restored.courses) == list(system.courses)
+    assert state_of(restored) == state_of(system)
+
+
+def test_crash_while_compacting_keeps_every_record(system, data_dir, monkeypatch):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S1001', 'CS101')
+    journal.compact()
+    system.enroll('S1002', 'CS101')
+    
+    def crash(path, data):
+        raise OSError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(data_persistence, '_atomic_write', crash)
+        with pytest.raises(OSError):
+            journal.compact()
+    assert _sealed_segments(data_dir)
+    assert state_of(loaded(data_dir)) == state_of(system)
+    
+    # The next compaction starts over from the files on disk
+    system.make_payment('S1002', 50, "Cash")
+    assert journal.compact() > 0
+    journal.close(compact=False)
+    assert state_of(loaded(data_dir)) == state_of(system)
+
+
+def test_damaged_generation_falls_back_to_the_previous_one(system, data_dir):
+    save_data(system, data_dir)
+    journal = open_journal(system, data_dir)
+    system.enroll('S1001', 'CS101')
+    journal.compact()
+    system.enroll('S1003', 'BIO201')
+    journal.close(compact=False)
+    
+    with open(os.path.join(data_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    for shard in manifest['files']['students']:
+        if shard['file'].endswith(f".{manifest['generation']:06d}.json"):
+            with open(os.path.join(data_dir, shard['file']), 'a') as f:
+                f.write('garbage')
+    assert state_of(loaded(data_dir)) == state_of(system)
+
+
+def test_no_usable_generation_raises(system, data_dir):
+    save_data(system, data_dir)
+    with open(os.path.join(data_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    for shard in manifest['files']['courses']:
+        with open(os.path.join(data_dir, shard['file']), 'w') as f:
+            f.write('[')
+    with pytest.raises(SnapshotError):
+        load_data(EnrollmentSystem(), data_dir)
@@ -0,0 +1,94 @@
+from data_persistence import Journal, load_data, save_data
+from models import Course, EnrollmentSystem
+from sqlite_storage import SqliteStorage
+
+
+def fill_cs101(system):
+    # CS101 has two seats
+    assert system.enroll('S1001', 'CS101')
+    assert system.enroll('S1002', 'CS101')
+    assert system.join_waitlist('S1003', 'CS101') == 1
+    assert system.join_waitlist('S1004', 'CS101') == 2
+
+
+def roster(system, course_id):
+    return [student.student_id for student in system.get_course(course_id).enrolled_students]
+
+
+def waitlist(system, course_id):
+    return [student.student_id for student in system.get_course(course_id).waitlist]
+
+
+def test_join_only_a_full_course(system):
+    assert system.join_waitlist('S1003', 'CS101') is None
+    fill_cs101(system)
+    assert system.join_waitlist('S1001', 'CS101') is None
+    assert system.join_waitlist('S1003', 'CS101') == 1
+    assert system.join_waitlist('S1003', 'NOPE') is None
+
+
+def test_drop_promotes_the_first_in_line(system):
+    fill_cs101(system)
+    assert system.drop('S1001', 'CS101')
+    assert roster(system, 'CS101') == ['S1002', 'S1003']
+    assert waitlist(system, 'CS101') == ['S1004']
+    assert system.waitlist_position('S1004', 'CS101') == 1
+    promoted = system.get_student('S1003')
+    assert promoted.balance == 500
+    assert promoted.transactions[-1].description == "Enrollment fee for Introduction to Programming"
+    assert system.waitlist_positions(promoted) == {}
+
+
+def test_promotion_skips_a_student_who_can_no_longer_take_the_seat(system):
+    system.add_course(Course("MATH101", "Algebra", "Ana Cruz", "MWF 9:00-10:30", 5))
+    fill_cs101(system)
+    assert system.enroll('S1003', 'MATH101')
+    assert system.drop('S1001', 'CS101')
+    assert roster(system, 'CS101') == ['S1002', 'S1004']
+    assert waitlist(system, 'CS101') == []
+    assert system.get_student('S1003').balance == 500
+
+
+def test_leave_waitlist(system):
+    fill_cs101(system)
+    assert system.leave_waitlist('S1003', 'CS101')
+    assert not system.leave_waitlist('S1003', 'CS101')
+    assert system.waitlist_position('S1004', 'CS101') == 1
+    system.drop('S1002', 'CS101')
+    assert roster(system, 'CS101') == ['S1001', 'S1004']
+
+
+def test_promotion_is_replayed_once(system, data_dir):
+    save_data(system, data_dir)
+    journal = Journal(data_dir, compact_every=10_000, max_delay=3600)
+    system.subscribe(journal.record_event)
+    fill_cs101(system)
+    system.drop('S1001', 'CS101')
+    journal.close(compact=False)
+    
+    loaded = EnrollmentSystem()
+    assert load_data(loaded, data_dir)
+    assert roster(loaded, 'CS101') == roster(system, 'CS101')
+    assert waitlist(loaded, 'CS101') == ['S1004']
+    for student_id in ('S1001', 'S1003', 'S1004'):
+        assert loaded.get_student(student_id).balance == system.get_student(student_id).balance
+    
+    # The restored waitlist keeps promoting
+    loaded.drop('S1002', 'CS101')
+    assert roster(loaded, 'CS101') == ['S1003', 'S1004']
+
+
+def test_waitlist_survives_sqlite(system, data_dir):
+    storage = SqliteStorage(data_dir)
+    storage.save(system)
+    storage.attach(system)
+    fill_cs101(system)
+    system.drop('S1002', 'CS101')
+    storage.close()
+    
+    loaded = EnrollmentSystem()
+    storage = SqliteStorage(data_dir)
+    assert storage.load(loaded)
+    storage.close()
+    assert roster(loaded, 'CS101') == ['S1001', 'S1003']
+    assert waitlist(loaded, 'CS101') == ['S1004']